@@ -0,0 +1,117 @@
+"""Fail when a hot-path query is not served by an index.
+
+Creates the declared indexes in a scratch database on a local mongod,
+seeds a few documents per collection, runs explain() for every hot-path
+query and exits with status 1 if any winning plan contains a COLLSCAN.
+
+    MONGO_URL=mongodb://localhost:27017 python check_indexes.py
+"""
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ["DB_NAME"] = os.environ.get("INDEX_CHECK_DB", "index_check")
+
+import server  # noqa: E402
+
+db = server.db
+now = datetime.now(timezone.utc)
+
+# (collection, filter, sort) as issued by the endpoints
+HOT_QUERIES = [
+    ("users", {"email": "user0@check.az"}, None),
+    ("users", {"id": "user-0"}, None),
+    ("users", {}, [("created_at", -1), ("_id", -1)]),
+    ("questions", {"id": "question-0"}, None),
+    ("questions", {"category": "c"}, [("_id", 1)]),
+    ("test_sessions", {"id": "session-0", "user_id": "user-0"}, None),
+    ("test_sessions", {"user_id": "user-0"}, None),
+    ("test_results", {"user_id": "user-0"}, [("completed_at", -1)]),
+    ("test_results", {"session_id": "session-0", "user_id": "user-0"}, None),
+    ("test_results", {"user_id": "user-0", "completed_at": {"$gte": now - timedelta(days=7)}}, None),
+    ("user_notifications", {"user_id": "user-0"}, [("created_at", -1)]),
+    ("user_notifications", {"id": "notification-0", "user_id": "user-0"}, None),
+    ("broadcast_notifications", {"id": "broadcast-0"}, None),
+    ("broadcast_notifications", {
+        "audience": {"$in": ["all", "notify_new_questions"]},
+        "exclude_user_ids": {"$ne": "user-0"},
+        "created_at": {"$gte": now - timedelta(days=30)},
+    }, [("created_at", -1)]),
+    ("notification_read_state", {"user_id": "user-0"}, None),
+    ("leaderboard", {"user_id": "user-0"}, None),
+    ("leaderboard", {"seq": {"$gt": 5}}, None),
+    ("user_question_submissions", {"id": "submission-0"}, None),
+    ("user_question_submissions", {}, [("submitted_at", -1), ("_id", -1)]),
+    ("user_question_submissions", {"status": "pending"}, [("submitted_at", -1), ("_id", -1)]),
+    ("user_quizzes", {"share_code": "code0"}, None),
+    ("user_quizzes", {"creator_id": "user-0"}, [("created_at", -1), ("id", -1)]),
+    ("user_quizzes", {"id": "quiz-0", "creator_id": "user-0"}, None),
+    ("shared_quiz_attempts", {"quiz_id": "quiz-0"}, [("completed_at", -1), ("id", -1)]),
+]
+
+
+async def seed(count: int = 50):
+    def docs(make):
+        return [make(i) for i in range(count)]
+
+    await db.users.insert_many(docs(lambda i: {"id": f"user-{i}", "email": f"user{i}@check.az", "created_at": now}))
+    await db.questions.insert_many(docs(lambda i: {"id": f"question-{i}", "category": "c"}))
+    await db.test_sessions.insert_many(docs(lambda i: {"id": f"session-{i}", "user_id": f"user-{i % 5}"}))
+    await db.test_results.insert_many(docs(lambda i: {"session_id": f"session-{i}", "user_id": f"user-{i % 5}", "completed_at": now}))
+    await db.user_notifications.insert_many(docs(lambda i: {"id": f"notification-{i}", "user_id": f"user-{i % 5}", "created_at": now}))
+    await db.broadcast_notifications.insert_many(docs(lambda i: {"id": f"broadcast-{i}", "audience": "all", "exclude_user_ids": [], "created_at": now}))
+    await db.notification_read_state.insert_many(docs(lambda i: {"user_id": f"user-{i}", "read_ids": []}))
+    await db.leaderboard.insert_many(docs(lambda i: {"user_id": f"user-{i}", "seq": i}))
+    await db.user_question_submissions.insert_many(docs(lambda i: {"id": f"submission-{i}", "submitted_at": now}))
+    await db.user_quizzes.insert_many(docs(lambda i: {"id": f"quiz-{i}", "share_code": f"code{i}", "creator_id": f"user-{i % 5}", "created_at": now.isoformat()}))
+    await db.shared_quiz_attempts.insert_many(docs(lambda i: {"id": str(uuid.uuid4()), "quiz_id": f"quiz-{i % 5}"}))
+
+
+def stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from stages(value)
+
+
+async def main() -> int:
+    await server.client.drop_database(db.name)
+    report = await server.ensure_indexes()
+    failed = {name: {**entry["failed"], **entry["conflicting"]}
+              for name, entry in report.items() if entry["failed"] or entry["conflicting"]}
+    await seed()
+
+    problems = []
+    for collection, query, sort in HOT_QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = (await cursor.explain())["queryPlanner"]["winningPlan"]
+        plan_stages = set(stages(plan))
+        status = "COLLSCAN" if "COLLSCAN" in plan_stages else "ok"
+        print(f"{status:<9} {collection}.find({query}){f'.sort({sort})' if sort else ''}")
+        if status != "ok":
+            problems.append(collection)
+
+    await server.client.drop_database(db.name)
+    if failed:
+        print(f"Index creation failed: {failed}")
+    if problems or failed:
+        print(f"{len(problems)} hot-path quer{'y' if len(problems) == 1 else 'ies'} without an index")
+        return 1
+    print("All hot-path queries use an index")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(main()))
+    finally:
+        server.client.close()
@@ -0,0 +1,102 @@
+"""Move inline profile images (base64 data URLs on users) to the image store.
+
+For every user that still has a `profile_image` data URL, the image is
+decoded, stored with all size variants through store_image, and the user
+gets `profile_image_hash` while the inline field is removed. Users are
+walked in `_id` order in batches; already migrated users no longer match
+the query, so the command can be stopped and re-run at any time.
+Running API workers keep their cached principals (with the old inline
+image) until PRINCIPAL_CACHE_TTL_SECONDS (default 60s) expires them.
+
+    cd backend
+    python migrate_profile_images.py --batch-size 200
+    python migrate_profile_images.py --dry-run
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+
+from pymongo import UpdateOne
+
+from server import client, db, rebuild_leaderboard, store_image
+
+
+def decode_data_url(value: str):
+    """bytes of a `data:image/...;base64,...` URL, or None."""
+    header, _, payload = value.partition(",")
+    if not header.startswith("data:image/") or not header.endswith(";base64"):
+        return None
+    try:
+        return base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+async def migrate(batch_size: int, dry_run: bool):
+    pending_query = {"profile_image": {"$regex": "^data:image/"}}
+    total = await db.users.count_documents(pending_query)
+    print(f"{total} user(s) with inline profile images")
+
+    migrated = 0
+    skipped = []
+    last_id = None
+    while True:
+        query = dict(pending_query)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db.users.find(query, {"_id": 1, "id": 1, "profile_image": 1}) \
+            .sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        operations = []
+        for user in batch:
+            image_data = decode_data_url(user["profile_image"])
+            if image_data is None:
+                skipped.append(user.get("id") or str(user["_id"]))
+                continue
+            if dry_run:
+                operations.append(None)
+                continue
+            try:
+                image_hash = await store_image(image_data)
+            except Exception as exc:  # corrupt image data
+                print(f"  {user.get('id')}: {exc}")
+                skipped.append(user.get("id") or str(user["_id"]))
+                continue
+            # an upload during the migration unsets profile_image, so this
+            # update then matches nothing instead of overwriting the new image
+            operations.append(UpdateOne(
+                {"_id": user["_id"], "profile_image": user["profile_image"]},
+                {"$set": {"profile_image_hash": image_hash}, "$unset": {"profile_image": ""}},
+            ))
+
+        if operations and not dry_run:
+            await db.users.bulk_write(operations, ordered=False)
+        migrated += len(operations)
+        print(f"  ... {migrated}/{total} migrated, {len(skipped)} skipped")
+
+    if migrated and not dry_run:
+        # leaderboard rows carry profile_image_hash
+        await rebuild_leaderboard()
+
+    print(f"Done: {migrated} migrated{' (dry run)' if dry_run else ''}, {len(skipped)} skipped")
+    if skipped:
+        print("Skipped (not a decodable image data URL): " + ", ".join(skipped))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move inline profile images to the image store")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    args = parser.parse_args()
+    try:
+        asyncio.run(migrate(args.batch_size, args.dry_run))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""One-time migration of `questions` to the canonical schema.
+
+Rewrites every question that is not yet at QUESTION_SCHEMA_VERSION:
+  - options list instead of option_a..option_d
+  - int correct_answer instead of "1" / "B"
+  - string `id` on every document (str(_id) when it never had one)
+  - bool is_premium and schema_version
+  - text_hash (question_text_hash), which the bulk import deduplicates on
+
+Documents are walked in `_id` order in batches and each batch is written
+with one bulk_write, so the command can be stopped and re-run at any time:
+already migrated documents are skipped by the query itself.
+
+    cd backend
+    python migrate_questions.py --batch-size 500
+    python migrate_questions.py --dry-run
+"""
+import argparse
+import asyncio
+
+from pymongo import UpdateOne
+
+from server import (
+    QUESTION_SCHEMA_VERSION,
+    canonical_question_fields,
+    client,
+    db,
+    question_bank,
+    question_text_hash,
+)
+
+LEGACY_FIELDS = ["option_a", "option_b", "option_c", "option_d"]
+
+
+async def migrate(batch_size: int, dry_run: bool):
+    pending_query = {"schema_version": {"$ne": QUESTION_SCHEMA_VERSION}}
+    total = await db.questions.count_documents(pending_query)
+    print(f"{total} question(s) to migrate (schema_version -> {QUESTION_SCHEMA_VERSION})")
+
+    migrated = 0
+    skipped = []
+    last_id = None
+    while True:
+        query = dict(pending_query)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db.questions.find(query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        operations = []
+        for doc in batch:
+            fields = canonical_question_fields(doc)
+            correct = fields["correct_answer"]
+            if not fields["options"] or not isinstance(correct, int) or not 0 <= correct < len(fields["options"]):
+                # Leave broken documents for a human; they keep the legacy read path
+                skipped.append(str(doc["_id"]))
+                continue
+            update = {"$set": fields}
+            legacy = {name: "" for name in LEGACY_FIELDS if name in doc}
+            if legacy:
+                update["$unset"] = legacy
+            operations.append(UpdateOne({"_id": doc["_id"]}, update))
+
+        if operations and not dry_run:
+            result = await db.questions.bulk_write(operations, ordered=False)
+            migrated += result.modified_count
+        else:
+            migrated += len(operations)
+        print(f"  ... {migrated}/{total} migrated, {len(skipped)} skipped")
+
+    if migrated and not dry_run:
+        await question_bank.invalidate()
+
+    print(f"Done: {migrated} migrated{' (dry run)' if dry_run else ''}, {len(skipped)} skipped")
+    if skipped:
+        print("Skipped (invalid options/correct_answer): " + ", ".join(skipped))
+
+
+async def backfill_text_hashes(batch_size: int, dry_run: bool):
+    query = {"schema_version": QUESTION_SCHEMA_VERSION, "text_hash": {"$exists": False}}
+    total = await db.questions.count_documents(query)
+    print(f"{total} question(s) without text_hash")
+
+    hashed = 0
+    last_id = None
+    while True:
+        page = dict(query)
+        if last_id is not None:
+            page["_id"] = {"$gt": last_id}
+        batch = await db.questions.find(page, {"_id": 1, "question_text": 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        operations = [
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"text_hash": question_text_hash(doc.get("question_text"))}})
+            for doc in batch
+        ]
+        if not dry_run:
+            await db.questions.bulk_write(operations, ordered=False)
+        hashed += len(operations)
+
+    print(f"Done: {hashed} hashed{' (dry run)' if dry_run else ''}")
+
+
+async def run(batch_size: int, dry_run: bool):
+    await migrate(batch_size, dry_run)
+    await backfill_text_hashes(batch_size, dry_run)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate questions to the canonical schema")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.batch_size, args.dry_run))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Recompute user stats (total_tests, average_score, xp, level, streaks,
+daily/weekly activity counters) from test_results history using the same rules as complete_test.
+
+Useful after a scoring bug or a manual data fix. Results are replayed in
+completed_at order through apply_test_to_stats and written back in
+bulk_write batches; the leaderboard is rebuilt afterwards. Running API
+workers keep serving their cached principals (stats included) until
+PRINCIPAL_CACHE_TTL_SECONDS (default 60s) expires them.
+
+    cd backend
+    python recompute_user_stats.py --dry-run
+    python recompute_user_stats.py --user <user_id>
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from server import (
+    apply_test_to_stats,
+    client,
+    db,
+    rebuild_leaderboard,
+)
+
+STAT_FIELDS = [
+    "total_tests", "average_score", "xp", "level", "streak_current", "streak_best", "last_active",
+    "activity_day", "activity_day_count", "activity_week", "activity_week_count",
+]
+
+
+def _completed_at(result):
+    value = result.get("completed_at")
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value
+
+
+async def recompute_user(user_id: str):
+    stats = {}
+    cursor = db.test_results.find(
+        {"user_id": user_id},
+        {"_id": 0, "percentage": 1, "correct_answers": 1, "completed_at": 1},
+    ).sort("completed_at", 1)
+    async for result in cursor:
+        completed_at = _completed_at(result)
+        if not isinstance(completed_at, datetime):
+            continue
+        stats = apply_test_to_stats(stats, result.get("percentage", 0), result.get("correct_answers", 0), completed_at)
+    if not stats:
+        stats = {"total_tests": 0, "average_score": 0.0, "xp": 0, "level": 1,
+                 "streak_current": 0, "streak_best": 0, "last_active": None,
+                 "activity_day": None, "activity_day_count": 0, "activity_week": None, "activity_week_count": 0}
+    return stats
+
+
+async def recompute(user_id, batch_size: int, dry_run: bool):
+    query = {"id": user_id} if user_id else {}
+    projection = {"_id": 0, "id": 1, **{field: 1 for field in STAT_FIELDS}}
+    operations = []
+    changed = 0
+    async for user in db.users.find(query, projection):
+        stats = await recompute_user(user["id"])
+        diff = {field: (user.get(field), stats[field]) for field in STAT_FIELDS if user.get(field) != stats[field]}
+        if not diff:
+            continue
+        changed += 1
+        if dry_run:
+            print(f"{user['id']}: " + ", ".join(f"{k}: {old!r} -> {new!r}" for k, (old, new) in diff.items()))
+            continue
+        operations.append(UpdateOne({"id": user["id"]}, {"$set": stats}))
+        if len(operations) >= batch_size:
+            await db.users.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        await db.users.bulk_write(operations, ordered=False)
+    if changed and not dry_run:
+        await rebuild_leaderboard()
+    print(f"{changed} user(s) {'would change' if dry_run else 'updated'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute user stats from test_results")
+    parser.add_argument("--user", help="only this user id")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="print differences without writing")
+    args = parser.parse_args()
+    try:
+        asyncio.run(recompute(args.user, args.batch_size, args.dry_run))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Repair user_quizzes.total_attempts from shared_quiz_attempts.
+
+submit_shared_quiz stores the attempt and $inc's the counter in two writes,
+so a crash between them (or manual data fixes) can leave the counter off.
+The real counts come from one $group over shared_quiz_attempts; quizzes
+whose counter differs are fixed with bulk_write batches.
+
+    cd backend
+    python reconcile_quiz_attempts.py --dry-run
+    python reconcile_quiz_attempts.py
+"""
+import argparse
+import asyncio
+
+from pymongo import UpdateOne
+
+from server import client, db
+
+
+async def reconcile(batch_size: int, dry_run: bool):
+    counts = {
+        row["_id"]: row["count"]
+        async for row in db.shared_quiz_attempts.aggregate([
+            {"$group": {"_id": "$quiz_id", "count": {"$sum": 1}}},
+        ])
+    }
+
+    operations = []
+    fixed = 0
+    async for quiz in db.user_quizzes.find({}, {"_id": 0, "id": 1, "total_attempts": 1}):
+        actual = counts.get(quiz["id"], 0)
+        if quiz.get("total_attempts") == actual:
+            continue
+        fixed += 1
+        print(f"  {quiz['id']}: {quiz.get('total_attempts')!r} -> {actual}")
+        if dry_run:
+            continue
+        operations.append(UpdateOne({"id": quiz["id"]}, {"$set": {"total_attempts": actual}}))
+        if len(operations) >= batch_size:
+            await db.user_quizzes.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        await db.user_quizzes.bulk_write(operations, ordered=False)
+
+    print(f"Done: {fixed} quiz counter(s) {'would be ' if dry_run else ''}fixed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile quiz attempt counters")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="only report drifted counters")
+    args = parser.parse_args()
+    try:
+        asyncio.run(reconcile(args.batch_size, args.dry_run))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
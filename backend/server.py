@@ -1,22 +1,46 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, UploadFile, File, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, EmailStr, ValidationError
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta, timezone
 import jwt
 from passlib.context import CryptContext
 import random
+import time
+import asyncio
+import threading
+import socket
+from contextvars import ContextVar
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
 import base64
-from io import BytesIO
-from PIL import Image
+import json
+from bisect import bisect_left, bisect_right, insort
+import math
+import csv
+import io
+import hashlib
+import hmac
+import re
 from bson import ObjectId
+import gridfs
+try:
+    import orjson
+except ImportError:  # stdlib fallback, same output
+    orjson = None
+from image_processing import ImageRejected, render_image_variants
 
 
 
@@ -32,18 +56,175 @@ origins = [
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics
+# Counters and histograms live in each worker's memory. Every worker writes
+# its cumulative series to `metrics_snapshots` (one document per worker) and
+# /metrics sums all of them, so scraping any worker covers the deployment.
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", "15"))  # 0: this worker only
+METRICS_RETENTION_SECONDS = int(os.environ.get("METRICS_RETENTION_SECONDS", str(24 * 3600)))
+# /metrics requires "Authorization: Bearer <token>"; without a token it is not served
+# (route and command labels describe the internals)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+HTTP_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+DB_COMMAND_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    "http_requests_total": ("counter", "HTTP requests by route and status", None),
+    "http_request_duration_seconds": ("histogram", "HTTP request latency by route", HTTP_LATENCY_BUCKETS),
+    "http_request_db_commands": ("histogram", "Mongo commands issued per HTTP request", DB_COMMAND_BUCKETS),
+    "mongo_commands_total": ("counter", "Mongo commands by route, command and outcome", None),
+    "mongo_command_duration_seconds": ("histogram", "Mongo command latency by route and command", MONGO_LATENCY_BUCKETS),
+}
+
+class MetricsRegistry:
+    """Process-local series keyed by (name, labels). Thread-safe, because Mongo
+    command events arrive on Motor's executor threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+        # histogram entry: per-bucket counts, then the +Inf bucket, then the sum
+        self._histograms: Dict[Tuple[str, tuple], list] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            entry[bisect_left(buckets, value)] += 1
+            entry[-1] += value
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Series as plain lists/dicts, ready to be stored in Mongo."""
+        with self._lock:
+            series = [{"name": name, "labels": [list(pair) for pair in labels], "value": value}
+                      for (name, labels), value in self._counters.items()]
+            series += [{"name": name, "labels": [list(pair) for pair in labels], "buckets": entry[:-1], "sum": entry[-1]}
+                       for (name, labels), entry in self._histograms.items()]
+        return series
+
+def merge_metric_series(snapshots: List[List[Dict[str, Any]]]) -> Dict[Tuple[str, tuple], Any]:
+    """Sum snapshots from several workers series by series."""
+    merged: Dict[Tuple[str, tuple], Any] = {}
+    for series_list in snapshots:
+        for series in series_list:
+            key = (series["name"], tuple(tuple(pair) for pair in series["labels"]))
+            if "buckets" in series:
+                entry = merged.setdefault(key, [[0] * len(series["buckets"]), 0.0])
+                if len(entry[0]) != len(series["buckets"]):
+                    continue  # bucket layout changed between deploys
+                entry[0] = [a + b for a, b in zip(entry[0], series["buckets"])]
+                entry[1] += series["sum"]
+            else:
+                merged[key] = merged.get(key, 0.0) + series["value"]
+    return merged
+
+def _prometheus_labels(labels, extra: Tuple = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+def _prometheus_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def render_prometheus(merged: Dict[Tuple[str, tuple], Any], gauges: Dict[str, Tuple[str, float]]) -> str:
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = sorted((labels, value) for (series_name, labels), value in merged.items() if series_name == name)
+        if not series:
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for labels, value in series:
+            if kind == "counter":
+                lines.append(f"{name}{_prometheus_labels(labels)} {_prometheus_number(value)}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else _prometheus_number(bound)
+                lines.append(f"{name}_bucket{_prometheus_labels(labels, (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_prometheus_labels(labels)} {_prometheus_number(total)}")
+            lines.append(f"{name}_count{_prometheus_labels(labels)} {cumulative}")
+    for name, (help_text, value) in gauges.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {_prometheus_number(value)}"]
+    return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+# Mongo commands of the current request: (command, outcome, seconds). Motor
+# copies the context into its executor threads, so the listener sees it too.
+current_request_commands: ContextVar[Optional[list]] = ContextVar("current_request_commands", default=None)
+
+def record_mongo_command(route: str, command: str, outcome: str, seconds: float):
+    metrics.inc("mongo_commands_total", route=route, command=command, outcome=outcome)
+    metrics.observe("mongo_command_duration_seconds", seconds, route=route, command=command)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every Mongo command. During a request the event is parked on the
+    request and recorded by MetricsMiddleware once the route is known; anything
+    else (start-up, background tasks, scripts) is recorded as route="background"."""
+
+    IGNORED = {"hello", "isMaster", "ismaster", "ping", "endSessions", "saslStart", "saslContinue"}
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, "ok")
+
+    def failed(self, event):
+        self._record(event, "error")
+
+    def _record(self, event, outcome: str):
+        if event.command_name in self.IGNORED:
+            return
+        seconds = event.duration_micros / 1_000_000
+        pending = current_request_commands.get()
+        if pending is not None:
+            pending.append((event.command_name, outcome, seconds))
+        else:
+            record_mongo_command("background", event.command_name, outcome, seconds)
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics()])
 db = client[os.environ['DB_NAME']]
 
 # Security
 security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost factor; hashes with a different cost are rehashed on next login
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 SECRET_KEY = "python_test_secret_key_2024"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 120  # 2 hours for better UX
 
+# Questions written with this version are already canonical:
+#   string `id` (public identifier), `options` list, int `correct_answer`,
+#   bool `is_premium`. Older documents are fixed by migrate_questions.py.
+QUESTION_SCHEMA_VERSION = 1
+
 
 api_router = APIRouter(prefix="/api")
 
@@ -53,7 +234,8 @@ class User(BaseModel):
     email: EmailStr
     full_name: str
     bio: Optional[str] = ""
-    profile_image: Optional[str] = None
+    profile_image: Optional[str] = None  # URL in responses; stored documents keep profile_image_hash
+    profile_image_hash: Optional[str] = None
     is_admin: bool = False
     total_tests: int = 0
     average_score: float = 0.0
@@ -130,6 +312,8 @@ class Question(BaseModel):
     options: List[str]  # A, B, C, D options
     correct_answer: int  # Index of correct answer (0-3)
     explanation: str
+    is_premium: bool = False
+    schema_version: int = QUESTION_SCHEMA_VERSION
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class QuestionCreate(BaseModel):
@@ -150,6 +334,8 @@ class TestSession(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
     questions: List[str]  # List of question IDs
+    # "Frozen paper": normalized question payloads copied at start time
+    snapshot: Optional[List[Dict[str, Any]]] = None
     answers: Dict[str, int] = {}  # question_id -> selected_option_index
     current_question: int = 0
     score: Optional[int] = None
@@ -204,7 +390,7 @@ class SharedQuizAttempt(BaseModel):
     quiz_creator_id: str
     solver_id: Optional[str] = None
     solver_name: str
-    answers: Dict[int, int]  # question_index -> answer_index
+    answers: Dict[str, int]  # str(question_index) -> answer_index (BSON keys must be strings)
     score: int
     percentage: float
     total_questions: int
@@ -216,11 +402,86 @@ class SharedQuizSubmission(BaseModel):
     user_name: str
 
 # Helper functions
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+class PasswordHasher:
+    """Runs bcrypt in a dedicated thread pool instead of on the event loop.
+
+    At most `max_pending` calls may be queued or running; beyond that the
+    request fails fast with 503 so a login burst cannot pile up unbounded.
+    Keeps simple latency counters (time spent hashing and time spent
+    waiting for a free worker).
+    """
+
+    def __init__(self, workers: int = 4, max_pending: int = 64):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pending = 0
+        self.calls = 0
+        self.rejected = 0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Server hazırda məşğuldur, bir az sonra yenidən cəhd edin",
+                headers={"Retry-After": "1"},
+            )
+        self._pending += 1
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            result = fn(*args)
+            return result, started - submitted, time.perf_counter() - started
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+        try:
+            result, waited, took = await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self._pending -= 1
+        self.calls += 1
+        self.hash_seconds_total += took
+        self.hash_seconds_max = max(self.hash_seconds_max, took)
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed: str):
+        """(valid, new_hash); new_hash is set when the stored cost is outdated."""
+        return await self._run(pwd_context.verify_and_update, password, hashed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "calls": self.calls,
+            "rejected": self.rejected,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "hash_ms_avg": round(self.hash_seconds_total / self.calls * 1000, 2) if self.calls else 0.0,
+            "hash_ms_max": round(self.hash_seconds_max * 1000, 2),
+            "queue_wait_ms_avg": round(self.wait_seconds_total / self.calls * 1000, 2) if self.calls else 0.0,
+            "queue_wait_ms_max": round(self.wait_seconds_max * 1000, 2),
+        }
+
+password_hasher = PasswordHasher(
+    workers=int(os.environ.get("PASSWORD_HASH_WORKERS", "4")),
+    max_pending=int(os.environ.get("PASSWORD_HASH_MAX_PENDING", "64")),
+)
+
+async def verify_password(plain_password, hashed_password):
+    valid, _ = await password_hasher.verify_and_update(plain_password, hashed_password)
+    return valid
+
+async def get_password_hash(password):
+    return await password_hasher.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -232,6 +493,68 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+class PrincipalCache:
+    """Bounded TTL + LRU cache of authenticated users, keyed by token subject.
+
+    Holds `User` objects built without password and any legacy inline
+    profile_image (not yet moved to the image store). Entries expire after
+    `ttl` seconds, so changes made by another worker show up within that
+    window; writes in this worker call `invalidate_user` right away.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._subjects_by_user_id: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, subject: str) -> Optional[User]:
+        entry = self._entries.get(subject)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._drop(subject)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(subject)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, subject: str, user: User):
+        self._entries[subject] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(subject)
+        self._subjects_by_user_id[user.id] = subject
+        while len(self._entries) > self.maxsize:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+
+    def invalidate_user(self, user_id: str):
+        subject = self._subjects_by_user_id.get(user_id)
+        if subject is not None:
+            self._drop(subject)
+
+    def _drop(self, subject: str):
+        entry = self._entries.pop(subject, None)
+        if entry is not None and self._subjects_by_user_id.get(entry[1].id) == subject:
+            del self._subjects_by_user_id[entry[1].id]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+principal_cache = PrincipalCache(
+    maxsize=int(os.environ.get("PRINCIPAL_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("PRINCIPAL_CACHE_TTL_SECONDS", "60")),
+)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
@@ -241,10 +564,16 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    user = await db.users.find_one({"email": email})
+    cached = principal_cache.get(email)
+    if cached is not None:
+        return cached
+
+    user = await db.users.find_one({"email": email}, {"password": 0, "profile_image": 0, "applied_sessions": 0})
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
-    return User(**user)
+    current_user = User(**user)
+    principal_cache.put(email, current_user)
+    return current_user
 
 async def get_admin_user(current_user: User = Depends(get_current_user)):
     if not current_user.is_admin:
@@ -261,6 +590,45 @@ def prepare_for_mongo(data):
                 data[key] = value.isoformat()
     return data
 
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.dict()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by orjson (stdlib json when it is missing).
+
+    ObjectId and datetime are handled by the encoder itself, so raw Motor
+    documents can be returned without parse_from_mongo. It is the default
+    response class of api_router; endpoints on hot paths return it directly via
+    fast_json() so FastAPI's jsonable_encoder pass is skipped as well.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# Fraction of hot-path calls that write a debug line (0 disables them)
+DEBUG_LOG_SAMPLE_RATE = float(os.environ.get("DEBUG_LOG_SAMPLE_RATE", "0.01"))
+
+def log_sampled(event: str, **fields):
+    """One JSON log line for a random DEBUG_LOG_SAMPLE_RATE share of calls.
+    Inside a request it also carries how many Mongo commands ran so far."""
+    if DEBUG_LOG_SAMPLE_RATE <= 0 or random.random() >= DEBUG_LOG_SAMPLE_RATE:
+        return
+    pending = current_request_commands.get()
+    if pending is not None:
+        fields["db_commands"] = len(pending)
+    logger.info(json.dumps({"event": event, **fields}, default=_json_default, ensure_ascii=False))
+
+def fast_json(content: Any, headers: Optional[Dict[str, str]] = None, status_code: int = 200) -> FastJSONResponse:
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
+
 def parse_from_mongo(item):
     """Normalize Mongo documents for JSON response.
     - Remove top-level _id
@@ -278,6 +646,370 @@ def parse_from_mongo(item):
 
     return convert(item)
 
+LETTER_TO_INDEX = {"A": 0, "B": 1, "C": 2, "D": 3}
+
+def question_text_hash(text) -> str:
+    """Duplicate key for questions: case and whitespace insensitive."""
+    normalized = " ".join(str(text or "").split()).casefold()
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+def canonical_question_fields(question):
+    """Canonical fields for a legacy question document (used by the migration
+    and as the per-request fallback for unmigrated documents)."""
+    options = question.get("options")
+    if not options:
+        options = [
+            question.get("option_a"),
+            question.get("option_b"),
+            question.get("option_c"),
+            question.get("option_d"),
+        ]
+        options = [opt for opt in options if opt is not None]
+
+    correct = question.get("correct_answer")
+    if isinstance(correct, str):
+        if correct.isdigit():
+            correct = int(correct)
+        else:
+            correct = LETTER_TO_INDEX.get(correct.upper(), None)
+
+    return {
+        "id": str(question.get("id") or question["_id"]),
+        "category": question.get("category", ""),
+        "question_text": question.get("question_text"),
+        "options": options,
+        "correct_answer": correct,
+        "explanation": question.get("explanation", ""),
+        "is_premium": bool(question.get("is_premium", False)),
+        "schema_version": QUESTION_SCHEMA_VERSION,
+    }
+
+def normalize_question(question):
+    """Build the question shape used by the test endpoints.
+    Migrated documents are read as-is; legacy ones (option_a..option_d,
+    "1"/"B" answers) go through canonical_question_fields. Legacy ids
+    stay str(_id) so sessions started before the migration still match.
+    """
+    if question.get("schema_version") == QUESTION_SCHEMA_VERSION:
+        return {
+            "id": question["id"],
+            "question_text": question["question_text"],
+            "options": question["options"],
+            "correct_answer": question["correct_answer"],
+            "explanation": question.get("explanation", ""),
+            "category": question["category"],
+            "is_premium": question.get("is_premium", False),
+        }
+
+    fields = canonical_question_fields(question)
+    return {
+        "id": str(question["_id"]),
+        "question_text": fields["question_text"],
+        "options": fields["options"],
+        "correct_answer": fields["correct_answer"],
+        "explanation": fields["explanation"],
+        "category": fields["category"],
+        "is_premium": fields["is_premium"],
+    }
+
+def question_to_response(question):
+    """Public question payload returned by start_test / get_question."""
+    return {
+        "id": question["id"],
+        "question_text": question["question_text"],
+        "options": question["options"],
+        "correct_answer": question["correct_answer"],
+        "explanation": question["explanation"],
+        "category": question["category"],
+    }
+
+class QuestionBank:
+    """Process-local index of normalized questions.
+
+    Questions are kept by id (both Mongo _id and the string `id` field),
+    by category and by premium flag, so test endpoints never have to pull
+    the questions collection. Every write to `questions` bumps a version
+    counter in `collection_versions`; each worker re-reads that counter at
+    most every `refresh_interval` seconds and reloads when it changed.
+    """
+
+    VERSION_KEY = "questions"
+
+    def __init__(self, refresh_interval: float = 5.0):
+        self.refresh_interval = refresh_interval
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._aliases: Dict[str, str] = {}
+        self._by_category: Dict[str, List[str]] = {}
+        self._free_ids: List[str] = []
+        self._premium_ids: List[str] = []
+        self._text_hashes: set = set()
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _current_version(self) -> int:
+        doc = await db.collection_versions.find_one({"_id": self.VERSION_KEY})
+        return int(doc.get("version", 0)) if doc else 0
+
+    async def _load(self, version: int):
+        by_id, aliases, by_category = {}, {}, {}
+        free_ids, premium_ids, text_hashes = [], [], set()
+        async for doc in db.questions.find({}):
+            question = normalize_question(doc)
+            qid = question["id"]
+            by_id[qid] = question
+            text_hashes.add(question_text_hash(question["question_text"]))
+            for alias in (str(doc["_id"]), doc.get("id")):
+                if alias and alias != qid:
+                    aliases[str(alias)] = qid
+            by_category.setdefault(question["category"], []).append(qid)
+            (premium_ids if question["is_premium"] else free_ids).append(qid)
+        self._by_id, self._aliases, self._by_category = by_id, aliases, by_category
+        self._free_ids, self._premium_ids = free_ids, premium_ids
+        self._text_hashes = text_hashes
+        self._version = version
+        logger.info("QuestionBank loaded %d questions (version %d)", len(by_id), version)
+
+    def has_text(self, text_hash: str) -> bool:
+        """Whether a question with this question_text_hash exists."""
+        return text_hash in self._text_hashes
+
+    async def ensure_fresh(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self.refresh_interval:
+            return
+        async with self._lock:
+            if self._version is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return
+            version = await self._current_version()
+            if version != self._version:
+                await self._load(version)
+            self._checked_at = time.monotonic()
+
+    async def invalidate(self):
+        """Call after any write to `questions` (all workers reload on next check)."""
+        await db.collection_versions.update_one(
+            {"_id": self.VERSION_KEY}, {"$inc": {"version": 1}}, upsert=True
+        )
+        self._checked_at = 0.0
+
+    async def get(self, question_id: str) -> Optional[Dict[str, Any]]:
+        await self.ensure_fresh()
+        key = str(question_id)
+        question = self._by_id.get(key)
+        if question is None and key in self._aliases:
+            question = self._by_id.get(self._aliases[key])
+        return question
+
+    async def get_many(self, question_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Lookup several ids at once; unknown ids are simply left out."""
+        await self.ensure_fresh()
+        found = {}
+        for qid in question_ids:
+            key = str(qid)
+            question = self._by_id.get(key) or self._by_id.get(self._aliases.get(key, ""))
+            if question is not None:
+                found[key] = question
+        return found
+
+    async def sample(self, k: int, premium: Optional[bool] = None, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Random sample of up to k questions.
+        premium=None -> all, True -> only premium, False -> only non-premium.
+        """
+        await self.ensure_fresh()
+        if premium is None:
+            pool = self._free_ids + self._premium_ids
+        else:
+            pool = self._premium_ids if premium else self._free_ids
+        if category:
+            in_category = set(self._by_category.get(category, []))
+            pool = [qid for qid in pool if qid in in_category]
+        k = min(k, len(pool))
+        return [self._by_id[qid] for qid in random.sample(pool, k)]
+
+# Frozen paper mode: start_test copies each question into the session so
+# get_question/scoring need no question lookup and ignore later edits
+FROZEN_PAPER_SESSIONS = os.environ.get("FROZEN_PAPER_SESSIONS", "false").lower() in ("1", "true", "yes")
+
+question_bank = QuestionBank(refresh_interval=float(os.environ.get("QUESTION_BANK_REFRESH_SECONDS", "5")))
+
+async def hydrate_questions(question_ids: List[str]):
+    """Resolve session question ids to normalized questions, keeping order.
+
+    The QuestionBank answers most ids; whatever it does not know (e.g. a
+    question inserted since the last refresh) is fetched in a single `$in`
+    query matching both ObjectId `_id`s and string `id`s.
+    Returns (questions, missing_ids) where questions[i] is None when missing.
+    """
+    keys = [str(qid) for qid in question_ids]
+    found = await question_bank.get_many(keys)
+
+    unresolved = [key for key in dict.fromkeys(keys) if key not in found]
+    if unresolved:
+        object_ids = [ObjectId(key) for key in unresolved if ObjectId.is_valid(key)]
+        query = {"$or": [
+            {"_id": {"$in": object_ids + unresolved}},
+            {"id": {"$in": unresolved}},
+        ]}
+        async for doc in db.questions.find(query):
+            question = normalize_question(doc)
+            for alias in (question["id"], str(doc["_id"]), doc.get("id")):
+                if alias:
+                    found[str(alias)] = question
+
+    questions = [found.get(key) for key in keys]
+    missing = [key for key, question in zip(keys, questions) if question is None]
+    if missing:
+        logger.warning("hydrate_questions: %d question(s) not found: %s", len(missing), missing)
+    return questions, missing
+
+# User stats / gamification rules. apply_test_to_stats is the reference
+# implementation (used by recompute_user_stats.py); user_stats_pipeline
+# expresses the same rules as an update pipeline so complete_test can apply
+# them atomically in one round trip.
+def xp_for_result(percentage, correct_count) -> int:
+    # XP gain: base = correct answers, bonus for high score
+    return correct_count + (10 if percentage >= 80 else 0) + (5 if 60 <= percentage < 80 else 0)
+
+def _utc_day_start(now_dt: datetime) -> datetime:
+    now_dt = now_dt.astimezone(timezone.utc) if now_dt.tzinfo else now_dt.replace(tzinfo=timezone.utc)
+    return datetime(now_dt.year, now_dt.month, now_dt.day, tzinfo=timezone.utc)
+
+def _utc_week_start(now_dt: datetime) -> datetime:
+    day_start = _utc_day_start(now_dt)
+    return day_start - timedelta(days=day_start.weekday())
+
+# Daily/weekly activity counters live on the user document next to the period
+# they belong to (activity_day / activity_week = UTC period start). They are
+# reset lazily: a write in a new period starts the counter at 1, a read in a
+# new period treats the stored count as 0.
+def activity_count(stored_period, stored_count, current_period: datetime) -> int:
+    if stored_period is None or _as_utc(stored_period) != current_period:
+        return 0
+    return int(stored_count or 0)
+
+def apply_test_to_stats(stats: Dict[str, Any], percentage, correct_count, now_dt: datetime) -> Dict[str, Any]:
+    """Pure stats update for one completed test; returns the new fields."""
+    prev_total = int(stats.get("total_tests") or 0)
+    prev_avg = float(stats.get("average_score") or 0.0)
+    new_total = prev_total + 1
+    # weighted average by number of tests
+    new_avg = ((prev_avg * prev_total) + percentage) / new_total
+    new_xp = int(stats.get("xp") or 0) + xp_for_result(percentage, correct_count)
+
+    # Streak logic: if last_active is yesterday (UTC), increment; if today, keep; else reset
+    today_start = _utc_day_start(now_dt)
+    week_start = _utc_week_start(now_dt)
+    last_active = stats.get("last_active")
+    if isinstance(last_active, datetime) and last_active.tzinfo is None:
+        last_active = last_active.replace(tzinfo=timezone.utc)
+    streak_current = int(stats.get("streak_current") or 0)
+    if isinstance(last_active, datetime) and today_start <= last_active < today_start + timedelta(days=1):
+        pass
+    elif isinstance(last_active, datetime) and today_start - timedelta(days=1) <= last_active < today_start:
+        streak_current += 1
+    else:
+        streak_current = 1
+
+    return {
+        "total_tests": new_total,
+        "average_score": new_avg,
+        "xp": new_xp,
+        # Simple level curve: level up every 100 xp
+        "level": max(1, new_xp // 100 + 1),
+        "streak_current": streak_current,
+        "streak_best": max(int(stats.get("streak_best") or 0), streak_current),
+        "last_active": now_dt,
+        "activity_day": today_start,
+        "activity_day_count": activity_count(stats.get("activity_day"), stats.get("activity_day_count"), today_start) + 1,
+        "activity_week": week_start,
+        "activity_week_count": activity_count(stats.get("activity_week"), stats.get("activity_week_count"), week_start) + 1,
+    }
+
+def user_stats_pipeline(percentage, correct_count, now_dt: datetime) -> List[Dict[str, Any]]:
+    """Update pipeline equivalent of apply_test_to_stats."""
+    today_start = _utc_day_start(now_dt)
+    tomorrow_start = today_start + timedelta(days=1)
+    yesterday_start = today_start - timedelta(days=1)
+    week_start = _utc_week_start(now_dt)
+    total = {"$ifNull": ["$total_tests", 0]}
+    streak = {"$ifNull": ["$streak_current", 0]}
+    # Non-date last_active (missing, null, legacy string) sorts below any date
+    # in BSON order, so it falls through to a reset like the Python version
+    return [
+        {"$set": {
+            "total_tests": {"$add": [total, 1]},
+            "average_score": {"$divide": [
+                {"$add": [{"$multiply": [{"$ifNull": ["$average_score", 0.0]}, total]}, percentage]},
+                {"$add": [total, 1]},
+            ]},
+            "xp": {"$add": [{"$ifNull": ["$xp", 0]}, xp_for_result(percentage, correct_count)]},
+            "streak_current": {"$switch": {
+                "branches": [
+                    {"case": {"$and": [{"$gte": ["$last_active", today_start]}, {"$lt": ["$last_active", tomorrow_start]}]},
+                     "then": streak},
+                    {"case": {"$and": [{"$gte": ["$last_active", yesterday_start]}, {"$lt": ["$last_active", today_start]}]},
+                     "then": {"$add": [streak, 1]}},
+                ],
+                "default": 1,
+            }},
+            "last_active": now_dt,
+            "activity_day": today_start,
+            "activity_day_count": {"$cond": [
+                {"$eq": ["$activity_day", today_start]}, {"$add": [{"$ifNull": ["$activity_day_count", 0]}, 1]}, 1,
+            ]},
+            "activity_week": week_start,
+            "activity_week_count": {"$cond": [
+                {"$eq": ["$activity_week", week_start]}, {"$add": [{"$ifNull": ["$activity_week_count", 0]}, 1]}, 1,
+            ]},
+        }},
+        {"$set": {
+            "level": {"$max": [1, {"$toInt": {"$add": [{"$floor": {"$divide": ["$xp", 100]}}, 1]}}]},
+            "streak_best": {"$max": [{"$ifNull": ["$streak_best", 0]}, "$streak_current"]},
+        }},
+    ]
+
+async def session_questions(session: Dict[str, Any], question_ids: List[str]):
+    """Questions for scoring: the frozen snapshot when present, else hydrated."""
+    snapshot = session.get("snapshot")
+    if snapshot and len(snapshot) == len(question_ids):
+        return snapshot, []
+    return await hydrate_questions(question_ids)
+
+def score_answers(questions: List[Optional[Dict[str, Any]]], question_ids: List[str], user_answers: Dict[str, Any]):
+    """Score hydrated questions against the session answers.
+    Missing questions are skipped but still count towards the total.
+    Returns (questions_with_answers, correct_count).
+    """
+    questions_with_answers = []
+    correct_count = 0
+    for qid, question in zip(question_ids, questions):
+        if not question:
+            continue
+
+        correct_index = question["correct_answer"]
+        # user's answer for this question (may be None)
+        raw_user_answer = user_answers.get(str(qid))
+        if raw_user_answer is None:
+            user_index = None
+            is_correct = False
+        else:
+            user_index = int(raw_user_answer) if isinstance(raw_user_answer, str) else raw_user_answer
+            is_correct = (user_index == correct_index)
+            if is_correct:
+                correct_count += 1
+
+        questions_with_answers.append({
+            "question": question["question_text"],
+            "options": question["options"],
+            "user_answer": user_index,
+            "correct_answer": correct_index,
+            "is_correct": is_correct,
+            "explanation": question["explanation"],
+            "category": question["category"]
+        })
+    return questions_with_answers, correct_count
+
 # Sample questions data
 sample_questions = [
     # python_syntax (10 questions)
@@ -572,16 +1304,13 @@ sample_questions = [
 # Sualı silmək üçün admin endpoint-i
 @api_router.delete("/admin/questions/{question_id}")
 async def delete_question(question_id: str, admin: User = Depends(get_admin_user)):
-    conditions = [{"id": question_id}]
-    # try as ObjectId too
-    try:
-        conditions.append({"_id": str(ObjectId(question_id))})
-    except Exception:
-        pass
-
-    result = await db.questions.delete_one({"$or": conditions})
+    result = await db.questions.delete_one({"id": question_id})
+    if result.deleted_count == 0 and ObjectId.is_valid(question_id):
+        # Köhnə (miqrasiya olunmamış) sənədlər yalnız _id ilə tapıla bilər
+        result = await db.questions.delete_one({"_id": ObjectId(question_id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Sual tapılmadı")
+    await question_bank.invalidate()
     return {"message": "Sual uğurla silindi"}
 
 
@@ -594,7 +1323,7 @@ async def register(user_data: UserCreate):
         raise HTTPException(status_code=400, detail="Email artıq istifadə olunur")
     
     # Hash password
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash(user_data.password)
     
     # Create user
     user = User(
@@ -622,115 +1351,354 @@ async def register(user_data: UserCreate):
 @api_router.post("/auth/login")
 async def login(user_data: UserLogin):
     user = await db.users.find_one({"email": user_data.email})
-    if not user or not verify_password(user_data.password, user["password"]):
+    if not user:
+        raise HTTPException(status_code=401, detail="Email və ya şifrə yanlışdır")
+    valid, new_hash = await password_hasher.verify_and_update(user_data.password, user["password"])
+    if not valid:
         raise HTTPException(status_code=401, detail="Email və ya şifrə yanlışdır")
+    if new_hash:
+        # BCRYPT_ROUNDS dəyişibsə, hash-i yeni cost ilə yenilə
+        await db.users.update_one({"id": user["id"]}, {"$set": {"password": new_hash}})
     
     access_token = create_access_token(data={"sub": user["email"]})
     
     return {
         "access_token": access_token,
         "token_type": "bearer",
-        "user": UserProfile(**user)
+        "user": UserProfile(**with_profile_image(user))
     }
 
 @api_router.get("/auth/me", response_model=UserProfile)
 async def get_me(current_user: User = Depends(get_current_user)):
-    return UserProfile(**current_user.dict())
+    user = current_user.dict()
+    if not user.get("profile_image_hash"):
+        # keşdəki principal inline şəkli saxlamır
+        user["profile_image"] = (await legacy_profile_images([current_user.id])).get(current_user.id)
+    return UserProfile(**with_profile_image(user))
 
 # Test routes
 from bson import ObjectId
 
+# Test sessions
+# Every answer click reads/writes the running session. SESSION_STORE picks where:
+#   mongo  - each call is a Mongo read/update (default; any routing works)
+#   memory - write-behind: running sessions live in this worker's memory,
+#            answers reach Mongo in batches every SESSION_FLUSH_SECONDS and
+#            synchronously before complete. A worker that does not hold the
+#            session (restart, eviction) reloads it from Mongo, so a crash loses
+#            at most one flush interval of answers. With several workers the
+#            proxy must route a session's requests to one worker (hash on the
+#            session id in the path) - otherwise reads on another worker miss
+#            answers that are still pending.
+SESSION_STORE = os.environ.get("SESSION_STORE", "mongo").lower()
+SESSION_FLUSH_SECONDS = float(os.environ.get("SESSION_FLUSH_SECONDS", "1"))
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "10000"))
+SESSION_IDLE_SECONDS = float(os.environ.get("SESSION_IDLE_SECONDS", "1800"))
+
+class MongoSessionStore:
+    """Write-through store: every call goes to `test_sessions`.
+
+    Also the interface for other backends. save_answers returns None when
+    the session does not exist and False when an answer is for a question
+    outside the session; answers to a completed test are a 400.
+    """
+    backend = "mongo"
+
+    async def create(self, session: Dict[str, Any]):
+        await db.test_sessions.insert_one(session)
+
+    async def get(self, session_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        return await db.test_sessions.find_one({"id": session_id, "user_id": user_id}, {"_id": 0})
+
+    async def view(self, session_id: str, user_id: str, start: int, count: int) -> Optional[Dict[str, Any]]:
+        """questions + answers, and for frozen sessions only snapshot[start:start+count]."""
+        return await db.test_sessions.find_one(
+            {"id": session_id, "user_id": user_id},
+            {"_id": 0, "questions": 1, "answers": 1, "snapshot": {"$slice": [start, count]}}
+        )
+
+    async def save_answers(self, session_id: str, user_id: str, answers: Dict[str, int]) -> Optional[bool]:
+        # Tək $set; filter sualların bu sessiyaya aid olduğunu da yoxlayır
+        result = await db.test_sessions.update_one(
+            {"id": session_id, "user_id": user_id, "completed": {"$ne": True}, "questions": {"$all": list(answers)}},
+            {"$set": {f"answers.{question_id}": option for question_id, option in answers.items()}}
+        )
+        if result.matched_count:
+            return True
+        # Nadir yol: səbəbi ayırd etmək üçün ikinci sorğu
+        session = await db.test_sessions.find_one({"id": session_id, "user_id": user_id}, {"_id": 0, "completed": 1})
+        if not session:
+            return None
+        if session.get("completed"):
+            raise HTTPException(status_code=400, detail="Test artıq tamamlanıb")
+        return False
+
+    async def flush(self, session_id: Optional[str] = None):
+        pass
+
+    def forget(self, session_id: str):
+        pass
+
+    def forget_user(self, user_id: str):
+        pass
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend}
+
+
+class MemorySessionStore(MongoSessionStore):
+    """Write-behind store for running sessions (SESSION_STORE=memory).
+
+    Sessions are created in Mongo as before and cached here; answers are a
+    dict write plus a pending entry that the flush loop turns into one
+    `$set answers.<id>` per session. Field-level sets mean a flush never
+    overwrites answers written elsewhere. Completed sessions are not cached.
+    """
+    backend = "memory"
+
+    def __init__(self, maxsize: int = 10000, idle_seconds: float = 1800.0, flush_interval: float = 1.0):
+        self.maxsize = maxsize
+        self.idle_seconds = idle_seconds
+        self.flush_interval = flush_interval
+        # session_id -> [session doc, question id set, last access]
+        self._sessions: "OrderedDict[str, list]" = OrderedDict()
+        self._pending: Dict[str, Dict[str, int]] = {}  # session_id -> answers not yet in Mongo
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.loads = 0
+        self.flushes = 0
+        self.flushed_answers = 0
+        self.flush_errors = 0
+
+    def _put(self, session: Dict[str, Any]) -> list:
+        entry = [session, set(session.get("questions") or []), time.monotonic()]
+        self._sessions[session["id"]] = entry
+        # Evicting is safe: pending answers stay in _pending and are laid
+        # back over the Mongo copy if the session is loaded again
+        while len(self._sessions) > self.maxsize:
+            self._sessions.popitem(last=False)
+        return entry
+
+    async def _entry(self, session_id: str, user_id: str) -> Tuple[Optional[list], Optional[Dict[str, Any]]]:
+        """(cache entry, None) for a running session; (None, Mongo doc or None) otherwise."""
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            session = await super().get(session_id, user_id)
+            if not session or session.get("completed"):
+                return None, session
+            self.loads += 1
+            # başqa sorğu bu arada yükləyibsə, onunku qalır (cavabları itməsin)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                session.setdefault("answers", {}).update(self._pending.get(session_id, {}))
+                entry = self._put(session)
+        else:
+            self.hits += 1
+        if entry[0].get("user_id") != user_id:
+            return None, None
+        entry[2] = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return entry, None
+
+    async def create(self, session: Dict[str, Any]):
+        await super().create(session)
+        session.pop("_id", None)
+        self._put(session)
+
+    async def get(self, session_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        entry, session = await self._entry(session_id, user_id)
+        if entry is None:
+            return session
+        return {**entry[0], "answers": dict(entry[0].get("answers", {}))}
+
+    async def view(self, session_id: str, user_id: str, start: int, count: int) -> Optional[Dict[str, Any]]:
+        entry, session = await self._entry(session_id, user_id)
+        if entry is None and session is None:
+            return None
+        if entry is not None:
+            session = entry[0]
+        snapshot = session.get("snapshot")
+        return {
+            "questions": session["questions"],
+            "answers": session.get("answers", {}),
+            "snapshot": snapshot[start:start + count] if snapshot else None,
+        }
+
+    async def save_answers(self, session_id: str, user_id: str, answers: Dict[str, int]) -> Optional[bool]:
+        entry, session = await self._entry(session_id, user_id)
+        if entry is None:
+            if session is None:
+                return None
+            raise HTTPException(status_code=400, detail="Test artıq tamamlanıb")
+        if not entry[1].issuperset(answers):
+            return False
+        entry[0].setdefault("answers", {}).update(answers)
+        self._pending.setdefault(session_id, {}).update(answers)
+        return True
+
+    async def flush(self, session_id: Optional[str] = None):
+        """Write pending answers (one session, or all) to Mongo; on error they stay pending."""
+        async with self._flush_lock:
+            if session_id is None:
+                batch, self._pending = self._pending, {}
+            else:
+                batch = {session_id: self._pending.pop(session_id)} if session_id in self._pending else {}
+            if not batch:
+                return
+            operations = [
+                # tamamlanmış sessiyaya gec gələn cavab yazılmır
+                UpdateOne({"id": sid, "completed": {"$ne": True}},
+                          {"$set": {f"answers.{qid}": option for qid, option in answers.items()}})
+                for sid, answers in batch.items()
+            ]
+            try:
+                await db.test_sessions.bulk_write(operations, ordered=False)
+            except BaseException as exc:
+                # xəta və ya ləğv (CancelledError): cavablar itməsin, yenə gözləyir
+                if not isinstance(exc, asyncio.CancelledError):
+                    self.flush_errors += 1
+                for sid, answers in batch.items():
+                    # bu arada gələn cavablar daha yenidir
+                    self._pending[sid] = {**answers, **self._pending.get(sid, {})}
+                raise
+            self.flushes += 1
+            self.flushed_answers += sum(len(answers) for answers in batch.values())
+
+    def forget(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        self._pending.pop(session_id, None)
+
+    def forget_user(self, user_id: str):
+        for session_id in [sid for sid, entry in self._sessions.items() if entry[0].get("user_id") == user_id]:
+            del self._sessions[session_id]
+            self._pending.pop(session_id, None)
+
+    def _evict_idle(self):
+        idle_before = time.monotonic() - self.idle_seconds
+        while self._sessions:
+            session_id, entry = next(iter(self._sessions.items()))
+            if entry[2] >= idle_before:
+                break
+            del self._sessions[session_id]
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self._evict_idle()
+            try:
+                await self.flush()
+            except PyMongoError as exc:
+                logger.warning("Session answer flush failed, will retry: %s", exc)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            # ləğv edilən flush öz partiyasını _pending-ə qaytarana qədər gözlə
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except PyMongoError as exc:
+            logger.warning("Final session flush failed, %d sessions not saved: %s", len(self._pending), exc)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.loads
+        return {
+            "backend": self.backend,
+            "size": len(self._sessions),
+            "maxsize": self.maxsize,
+            "idle_seconds": self.idle_seconds,
+            "flush_interval_seconds": self.flush_interval,
+            "pending_sessions": len(self._pending),
+            "pending_answers": sum(len(answers) for answers in self._pending.values()),
+            "hits": self.hits,
+            "loads": self.loads,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "flushes": self.flushes,
+            "flushed_answers": self.flushed_answers,
+            "flush_errors": self.flush_errors,
+        }
+
+if SESSION_STORE == "memory":
+    session_store: MongoSessionStore = MemorySessionStore(
+        maxsize=SESSION_CACHE_SIZE, idle_seconds=SESSION_IDLE_SECONDS, flush_interval=SESSION_FLUSH_SECONDS,
+    )
+else:
+    session_store = MongoSessionStore()
+
 # Test routes
 class StartOptions(BaseModel):
     limit: Optional[int] = None
     premium_only: Optional[bool] = False
     specific_question_id: Optional[str] = None  # For single question tests
+    category: Optional[str] = None
+    frozen: Optional[bool] = None  # None -> FROZEN_PAPER_SESSIONS default
 
 @api_router.post("/tests/start")
 async def start_test(opts: Optional[StartOptions] = None, current_user: User = Depends(get_current_user)):
-    print("Current user:", current_user)
-    
     # Check if this is a single question test
     if opts and opts.specific_question_id:
-        # Find the specific question
-        try:
-            specific_question = await db.questions.find_one({"_id": ObjectId(opts.specific_question_id)})
-        except Exception:
-            # Try with string id
-            specific_question = await db.questions.find_one({"id": opts.specific_question_id})
-        
+        # Find the specific question (ObjectId və ya string id ilə)
+        specific_question = await question_bank.get(opts.specific_question_id)
         if not specific_question:
             raise HTTPException(status_code=404, detail="Sual tapılmadı")
         
         selected_questions = [specific_question]
     else:
-        # Original logic for multiple questions
         # Mövcud bazadan təsadüfi suallar seç (limit verilə bilər)
         # Premium rejim: premium istifadəçi üçün yalnız premium suallar; adi istifadəçi üçün premium suallar daxil edilməsin
-        query = {}
+        premium = None
         if not current_user.is_premium:
-            query = {"is_premium": {"$ne": True}}
+            premium = False
         elif opts and opts.premium_only:
-            query = {"is_premium": True}
-        all_questions = await db.questions.find(query).to_list(1000)
-        if not all_questions:
-            raise HTTPException(status_code=400, detail="Kifayət qədər sual yoxdur")
+            premium = True
         requested = 8
         if opts and opts.limit:
             try:
                 requested = max(1, int(opts.limit))
             except Exception:
                 requested = 8
-        if len(all_questions) < requested:
-            requested = len(all_questions)
-        selected_questions = random.sample(all_questions, requested)
+        selected_questions = await question_bank.sample(
+            requested, premium=premium, category=opts.category if opts else None
+        )
+        if not selected_questions:
+            raise HTTPException(status_code=400, detail="Kifayət qədər sual yoxdur")
     
-    # Create test session (save only question ids as string)
+    # Create test session (question ids as string; frozen rejimdə sualların surəti də)
+    frozen = FROZEN_PAPER_SESSIONS if not opts or opts.frozen is None else opts.frozen
     test_session = TestSession(
         user_id=current_user.id,
-        questions=[str(q["_id"]) for q in selected_questions]
+        questions=[q["id"] for q in selected_questions],
+        snapshot=[question_to_response(q) for q in selected_questions] if frozen else None
     )
 
     session_dict = prepare_for_mongo(test_session.dict())
-    await db.test_sessions.insert_one(session_dict)
-    
-    # Return first question (fix here!)
-    first_question = selected_questions[0]  # artıq sənəddən gəlir, ayrıca query lazım deyil
-    
-    # Build options consistently
-    fq_options = first_question.get("options")
-    if not fq_options:
-        fq_options = [
-            first_question.get("option_a"),
-            first_question.get("option_b"),
-            first_question.get("option_c"),
-            first_question.get("option_d"),
-        ]
-        fq_options = [opt for opt in fq_options if opt is not None]
-
-    # Normalize correct answer to int index
-    fq_correct = first_question.get("correct_answer")
-    if isinstance(fq_correct, str):
-        if fq_correct.isdigit():
-            fq_correct = int(fq_correct)
-        else:
-            letter_map = {"A": 0, "B": 1, "C": 2, "D": 3}
-            fq_correct = letter_map.get(fq_correct.upper(), None)
-
-    question_data = {
-        "id": str(first_question["_id"]),  # <<< düzəldildi
-        "question_text": first_question["question_text"],
-        "options": fq_options,
-        "correct_answer": fq_correct,
-        "explanation": first_question.get("explanation", ""),
-        "category": first_question["category"]
-    }
-
+    if not frozen:
+        del session_dict["snapshot"]
+    await session_store.create(session_dict)
+    log_sampled("test_started", user_id=current_user.id, session_id=test_session.id,
+                questions=len(selected_questions), frozen=frozen)
+    
+    # Return first question (bankdan gəlir, ayrıca query lazım deyil)
     return {
         "session_id": test_session.id,
         "total_questions": len(selected_questions),
         "current_question": 0,
-        "question": question_data
+        "question": question_to_response(selected_questions[0])
     }
 
 # New endpoint for starting single question tests
@@ -747,24 +1715,29 @@ class AnswerData(BaseModel):
     question_id: str
     selected_option: int
 
+class AnswerBatch(BaseModel):
+    answers: List[AnswerData]
+
+# Test runner: answers are flushed in batches and questions prefetched in pages
+MAX_ANSWER_BATCH = 200
+MAX_QUESTION_PREFETCH = 50
+
 @api_router.post("/tests/{session_id}/answer")
 async def submit_answer(
     session_id: str,
     answer_data: AnswerData,   # dict əvəzinə Pydantic model
     current_user: User = Depends(get_current_user)
 ):
-    print("Gələn data:", answer_data.dict())
-    session = await db.test_sessions.find_one(
-        {"id": session_id, "user_id": current_user.id}
-    )
-    if not session:
-        raise HTTPException(status_code=404, detail="Test sessiyası tapılmadı")
-    
     # Update answer (store as integer index 0-3)
-    await db.test_sessions.update_one(
-        {"id": session_id},
-        {"$set": {f"answers.{answer_data.question_id}": int(answer_data.selected_option)}}
+    saved = await session_store.save_answers(
+        session_id, current_user.id, {answer_data.question_id: int(answer_data.selected_option)}
     )
+    if saved is None:
+        raise HTTPException(status_code=404, detail="Test sessiyası tapılmadı")
+    if not saved:
+        raise HTTPException(status_code=400, detail="Sual bu testə aid deyil")
+    log_sampled("answer_submitted", user_id=current_user.id, session_id=session_id,
+                question_id=answer_data.question_id, selected_option=answer_data.selected_option)
     
     return {"status": "success"}
 
@@ -776,83 +1749,237 @@ async def get_question(
     question_index: int,
     current_user: User = Depends(get_current_user)
 ):
-    # DEBUG log
-    print("===== DEBUG get_question =====")
-    print("Gələn session_id:", session_id)
-    print("Gələn question_index:", question_index)
-    print("Current user id:", current_user.id)
+    if question_index < 0:
+        raise HTTPException(status_code=400, detail="Yanlış sual indexi")
 
     # session axtarışı (bizdə session `id` string-dir, ObjectId yox)
-    session = await db.test_sessions.find_one({"id": session_id, "user_id": current_user.id})
-    print("Tapılan session:", session)
+    # Frozen sessiyada yalnız lazım olan sualın surəti gəlir
+    session = await session_store.view(session_id, current_user.id, question_index, 1)
 
     if not session:
         raise HTTPException(status_code=404, detail="Test sessiyası tapılmadı")
     
-    if question_index < 0 or question_index >= len(session["questions"]):
+    if question_index >= len(session["questions"]):
         raise HTTPException(status_code=400, detail="Yanlış sual indexi")
     
     question_id = session["questions"][question_index]
-    print("Tapılan question_id:", question_id)
 
-    # Question üçün ObjectId yoxlaması
-    try:
-        qid = ObjectId(question_id)
-    except Exception:
-        qid = question_id
-
-    # ✅ DÜZƏLİŞ BURADA → `_id` ilə axtar
-    question = await db.questions.find_one({"_id": qid})
-    print("Tapılan question:", question)
+    if session.get("snapshot"):
+        question = session["snapshot"][0]
+    else:
+        question = await question_bank.get(question_id)
+    log_sampled("question_served", user_id=current_user.id, session_id=session_id,
+                question_index=question_index, question_id=question_id,
+                frozen=bool(session.get("snapshot")), found=question is not None)
 
     if not question:
         raise HTTPException(status_code=404, detail="Sual tapılmadı")
 
-    # Cavabı frontend üçün hazırlayaq
-    q_options = question.get("options")
-    if not q_options:
-        q_options = [
-            question.get("option_a"),
-            question.get("option_b"),
-            question.get("option_c"),
-            question.get("option_d"),
-        ]
-        q_options = [opt for opt in q_options if opt is not None]
-
-    q_correct = question.get("correct_answer")
-    if isinstance(q_correct, str):
-        if q_correct.isdigit():
-            q_correct = int(q_correct)
-        else:
-            letter_map = {"A": 0, "B": 1, "C": 2, "D": 3}
-            q_correct = letter_map.get(q_correct.upper(), None)
-
-    question_data = {
-        "id": str(question["_id"]),
-        "question_text": question["question_text"],
-        "options": q_options,
-        "correct_answer": q_correct,
-        "explanation": question.get("explanation", ""),
-        "category": question["category"]
-    }
+    # Cavabı frontend üçün hazırlayaq. id sessiyadakı kimi qalır: miqrasiyadan
+    # əvvəl başlamış sessiyada str(_id)-dir, bank isə artıq uuid qaytarır
+    question_data = {**question_to_response(question), "id": question_id}
 
-    return {
+    return fast_json({
         "session_id": session_id,
         "total_questions": len(session["questions"]),
         "current_question": question_index,
         "question": question_data,
         "user_answer": session["answers"].get(str(question_id))
-    } 
+    })
+
+@api_router.post("/tests/{session_id}/answers")
+async def submit_answers(
+    session_id: str,
+    batch: AnswerBatch,
+    current_user: User = Depends(get_current_user)
+):
+    """Save several answers at once; a later entry for the same question wins.
+    Every question must belong to the session."""
+    if len(batch.answers) > MAX_ANSWER_BATCH:
+        raise HTTPException(status_code=400, detail=f"Bir sorğuda ən çox {MAX_ANSWER_BATCH} cavab göndərilə bilər")
+    if not batch.answers:
+        return {"status": "success", "saved": 0}
+    updates = {}
+    for answer in batch.answers:
+        if answer.selected_option < 0:
+            raise HTTPException(status_code=400, detail="Yanlış cavab variantı")
+        updates[answer.question_id] = int(answer.selected_option)
+
+    saved = await session_store.save_answers(session_id, current_user.id, updates)
+    if saved is None:
+        raise HTTPException(status_code=404, detail="Test sessiyası tapılmadı")
+    if not saved:
+        raise HTTPException(status_code=400, detail="Cavablardan bəziləri bu testin suallarına aid deyil")
+    log_sampled("answers_submitted", user_id=current_user.id, session_id=session_id, answers=len(updates))
+    return {"status": "success", "saved": len(updates)}
+
+@api_router.get("/tests/{session_id}/questions")
+async def get_questions(
+    session_id: str,
+    start: int = 0,
+    count: int = 10,
+    current_user: User = Depends(get_current_user)
+):
+    """Questions start .. start+count-1 in one response, each with the saved
+    answer, so the runner can prefetch ahead instead of one request per question."""
+    if start < 0:
+        raise HTTPException(status_code=400, detail="Yanlış sual indexi")
+    count = max(1, min(count, MAX_QUESTION_PREFETCH))
+
+    session = await session_store.view(session_id, current_user.id, start, count)
+    if not session:
+        raise HTTPException(status_code=404, detail="Test sessiyası tapılmadı")
+    total = len(session["questions"])
+    if start >= total:
+        raise HTTPException(status_code=400, detail="Yanlış sual indexi")
+
+    question_ids = session["questions"][start:start + count]
+    if session.get("snapshot"):
+        questions = session["snapshot"]
+    else:
+        # Bank + lazım olsa tək $in sorğusu
+        questions, _ = await hydrate_questions(question_ids)
+    answers = session.get("answers", {})
+    items = [
+        {
+            "index": start + offset,
+            "question": {**question_to_response(question), "id": question_id} if question else None,
+            "user_answer": answers.get(str(question_id)),
+        }
+        for offset, (question_id, question) in enumerate(zip(question_ids, questions))
+    ]
+    log_sampled("questions_served", user_id=current_user.id, session_id=session_id,
+                start=start, count=len(items), frozen=bool(session.get("snapshot")))
+    return fast_json({
+        "session_id": session_id,
+        "total_questions": total,
+        "start": start,
+        "questions": items,
+    })
 from datetime import datetime
 
+RESULT_PROJECTION = {
+    "_id": 0, "id": 1, "score": 1, "total_questions": 1, "correct_answers": 1,
+    "percentage": 1, "questions_with_answers": 1, "missing_questions": 1,
+}
+
+async def load_test_result(session_id: str, user_id: str, session: Optional[Dict[str, Any]] = None):
+    """(result, etag) of a session. A completed test is its test_results record
+    (one read on the session_id index, etag from the record id); sessions
+    completed before records had session_id and running ones have etag None.
+    A running session is scored on demand and nothing is stored."""
+    record = await db.test_results.find_one({"session_id": session_id, "user_id": user_id}, RESULT_PROJECTION)
+    if record and record.get("id"):
+        return record, f'"{record.pop("id")}"'
+
+    if session is None:
+        session = await session_store.get(session_id, user_id)
+    if not session or not isinstance(session, dict):
+        raise HTTPException(status_code=404, detail="Test sessiyası tapılmadı")
+
+    # Köhnə sessiyalarda nəticə sessiyanın özündə saxlanılıb
+    if "result" in session:
+        return session["result"], None
+    if session.get("completed") and "questions_with_answers" in session:
+        return {
+            "score": session.get("score", 0),
+            "total_questions": session.get("total_questions", 0),
+            "correct_answers": session.get("correct_answers", 0),
+            "percentage": session.get("percentage", 0),
+            "questions_with_answers": session["questions_with_answers"],
+        }, None
+
+    # Yoxdursa, bütün suallar üzrə nəticəni hesabla (cavablanmayanlar da daxil)
+    user_answers = session.get("answers", {})
+    questions_list = session.get("questions", [])
+    if not isinstance(questions_list, list):
+        questions_list = []
+    total = len(questions_list)
+
+    questions, missing = await session_questions(session, questions_list)
+    questions_with_answers, correct_count = score_answers(questions, questions_list, user_answers)
+
+    result = {
+        "score": correct_count,
+        "total_questions": total,
+        "correct_answers": correct_count,
+        "percentage": round((correct_count / total) * 100) if total > 0 else 0,
+        "questions_with_answers": questions_with_answers
+    }
+    if missing:
+        result["missing_questions"] = missing
+    return result, None
+
+# complete_test writes the result record (stats_applied: False) first, then
+# marks the session completed and applies stats. If the process dies in
+# between, the next complete finishes the record. The users update only
+# matches while the session_id is not in the user's applied_sessions, so a
+# repeated or concurrent finish never counts a test twice.
+APPLIED_SESSIONS_KEEP = 50
+COMPLETION_FIELDS = {
+    "_id": 0, "session_id": 1, "user_id": 1, "score": 1, "total_questions": 1,
+    "correct_answers": 1, "percentage": 1, "completed_at": 1,
+}
+
+async def apply_completed_test(record: Dict[str, Any]):
+    """Session, user stats and leaderboard side of a stored result; safe to repeat."""
+    session_id, user_id = record["session_id"], record["user_id"]
+    await db.test_sessions.update_one(
+        {"id": session_id, "user_id": user_id},
+        {"$set": {
+            "score": record["score"],
+            "total_questions": record["total_questions"],
+            "correct_answers": record["correct_answers"],
+            "percentage": record["percentage"],
+            "completed": True,
+            "completed_at": record["completed_at"],
+        }}
+    )
+    session_store.forget(session_id)
+
+    # Update user aggregate stats + gamification (single atomic server-side update)
+    pipeline = user_stats_pipeline(record["percentage"], record["correct_answers"], _as_utc(record["completed_at"]))
+    pipeline.append({"$set": {"applied_sessions": {"$slice": [
+        {"$concatArrays": [{"$ifNull": ["$applied_sessions", []]}, {"$literal": [session_id]}]},
+        -APPLIED_SESSIONS_KEEP,
+    ]}}})
+    projection = {"_id": 0, "full_name": 1, "bio": 1, "total_tests": 1, "average_score": 1, "is_premium": 1, "profile_image_hash": 1}
+    user_doc = await db.users.find_one_and_update(
+        {"id": user_id, "applied_sessions": {"$ne": session_id}},
+        pipeline,
+        projection=projection,
+        return_document=ReturnDocument.AFTER,
+    )
+    if user_doc is None:
+        # artıq tətbiq olunub; leaderboard sətri yenə də yazılır
+        user_doc = await db.users.find_one({"id": user_id}, projection)
+    if user_doc:
+        principal_cache.invalidate_user(user_id)
+        await record_leaderboard(user_id, {
+            "full_name": user_doc.get("full_name", ""),
+            "bio": user_doc.get("bio", ""),
+            "total_tests": user_doc.get("total_tests", 0),
+            "average_score": user_doc.get("average_score", 0.0),
+            "is_premium": bool(user_doc.get("is_premium", False)),
+            "profile_image_hash": user_doc.get("profile_image_hash"),
+            "deleted": False,
+        })
+    await db.test_results.update_one({"session_id": session_id}, {"$set": {"stats_applied": True}})
+
+async def finish_pending_completion(session_id: str, user_id: str):
+    """Complete the side effects of a record whose complete did not finish."""
+    record = await db.test_results.find_one(
+        {"session_id": session_id, "user_id": user_id, "stats_applied": False}, COMPLETION_FIELDS
+    )
+    if record:
+        await apply_completed_test(record)
+
 @api_router.post("/tests/{session_id}/complete")
 async def complete_test(
     session_id: str,
     current_user: User = Depends(get_current_user)
 ):
-    session = await db.test_sessions.find_one(
-        {"id": session_id, "user_id": current_user.id}
-    )
+    session = await session_store.get(session_id, current_user.id)
     if not session:
         raise HTTPException(status_code=404, detail="Test sessiyası tapılmadı")
 
@@ -860,11 +1987,14 @@ async def complete_test(
     if not isinstance(session, dict):
         raise HTTPException(status_code=404, detail="Test sessiyası düzgün formatda deyil")
 
+    # Təkrar complete: saxlanmış nəticə qaytarılır, yarımçıq qalıbsa tamamlanır
+    if session.get("completed"):
+        await finish_pending_completion(session_id, current_user.id)
+        result, _ = await load_test_result(session_id, current_user.id, session)
+        return result
+
     user_answers = session.get("answers", {})
 
-    questions_with_answers = []
-    correct_count = 0
-    
     # Safely get questions list with proper type checking
     questions_data = session.get("questions", [])
     if not isinstance(questions_data, list):
@@ -872,73 +2002,16 @@ async def complete_test(
     
     total = len(questions_data)
 
-    # Iterate through questions with proper type checking
-    for qid in questions_data:
-        # Normalize qid to ObjectId if possible
-        try:
-            q_obj_id = ObjectId(qid)
-        except Exception:
-            q_obj_id = qid
+    # Bütün suallar bir dəfəyə (bank + lazım olsa tək $in sorğusu)
+    questions, missing = await session_questions(session, questions_data)
+    questions_with_answers, correct_count = score_answers(questions, questions_data, user_answers)
 
-        question = await db.questions.find_one({"_id": q_obj_id})
-        if not question:
-            continue
+    percentage = round((correct_count / total) * 100) if total > 0 else 0
 
-        options = question.get("options")
-        if not options:
-            options = [
-                question.get("option_a"),
-                question.get("option_b"),
-                question.get("option_c"),
-                question.get("option_d"),
-            ]
-            options = [opt for opt in options if opt is not None]
-
-        correct_index = question.get("correct_answer")
-        if isinstance(correct_index, str):
-            if correct_index.isdigit():
-                correct_index = int(correct_index)
-            else:
-                letter_map = {"A": 0, "B": 1, "C": 2, "D": 3}
-                correct_index = letter_map.get(correct_index.upper(), None)
-
-        # user's answer for this question (may be None)
-        raw_user_answer = user_answers.get(str(qid))
-        if raw_user_answer is None:
-            user_index = None
-            is_correct = False
-        else:
-            user_index = int(raw_user_answer) if isinstance(raw_user_answer, str) else raw_user_answer
-            is_correct = (user_index == correct_index)
-            if is_correct:
-                correct_count += 1
-
-        questions_with_answers.append({
-            "question": question.get("question_text"),
-            "options": options,
-            "user_answer": user_index,
-            "correct_answer": correct_index,
-            "is_correct": is_correct,
-            "explanation": question.get("explanation", ""),
-            "category": question.get("category", "")
-        })
-
-    percentage = round((correct_count / total) * 100) if total > 0 else 0
-
-    # 🟢 Burada DB-də sessiyanı update edirik
-    await db.test_sessions.update_one(
-        {"id": session_id, "user_id": current_user.id},
-        {"$set": {
-            "score": correct_count,
-            "total_questions": total,
-            "correct_answers": correct_count,
-            "percentage": percentage,
-            "completed": True,
-            "completed_at": datetime.utcnow(),
-            "questions_with_answers": questions_with_answers
-        }}
-    )
+    # Gözləyən cavablar tamamlanmadan əvvəl Mongo-ya yazılmalıdır
+    await session_store.flush(session_id)
 
+    completed_at = datetime.utcnow()
     result = {
         "score": correct_count,
         "total_questions": total,
@@ -946,68 +2019,29 @@ async def complete_test(
         "percentage": percentage,
         "questions_with_answers": questions_with_answers
     }
-
-    # Update user aggregate stats + gamification
-    user_doc = await db.users.find_one({"id": current_user.id})
-    if user_doc:
-        prev_total = int(user_doc.get("total_tests", 0))
-        prev_avg = float(user_doc.get("average_score", 0.0))
-        new_total = prev_total + 1
-        # weighted average by number of tests
-        new_avg = ((prev_avg * prev_total) + percentage) / new_total if new_total > 0 else percentage
-        # XP gain: base = correct answers, bonus for high score
-        xp_gain = correct_count + (10 if percentage >= 80 else 0) + (5 if percentage >= 60 and percentage < 80 else 0)
-        now_dt = datetime.now(timezone.utc)
-        last_active = user_doc.get("last_active")
-        streak_current = int(user_doc.get("streak_current", 0))
-        streak_best = int(user_doc.get("streak_best", 0))
-        # Streak logic: if last_active is yesterday (UTC), increment; if today, keep; else reset
-        def date_only(dt):
-            return dt.astimezone(timezone.utc).date() if isinstance(dt, datetime) else None
-        today = now_dt.date()
-        if last_active:
-            last_date = date_only(last_active)
-            if last_date and last_date == today:
-                pass
-            elif last_date and (today - last_date).days == 1:
-                streak_current += 1
-            else:
-                streak_current = 1
-        else:
-            streak_current = 1
-        streak_best = max(streak_best, streak_current)
-        new_xp = int(user_doc.get("xp", 0)) + xp_gain
-        # Simple level curve: level up every 100 xp
-        new_level = max(1, int(new_xp // 100) + 1)
-        await db.users.update_one(
-            {"id": current_user.id},
-            {"$set": {
-                "total_tests": new_total,
-                "average_score": new_avg,
-                "xp": new_xp,
-                "level": new_level,
-                "streak_current": streak_current,
-                "streak_best": streak_best,
-                "last_active": now_dt
-            }}
-        )
-
-    # Store a test result document for history
+    if missing:
+        result["missing_questions"] = missing
+
+    # The canonical result record: history, profile and GET /tests/{id}/result
+    # all read it. Written first - session_id is unique, so exactly one complete
+    # gets past this insert; the others finish whatever it left undone.
+    record = {
+        "id": str(uuid.uuid4()),
+        "session_id": session_id,
+        "user_id": current_user.id,
+        "user_name": current_user.full_name,
+        **result,
+        "completed_at": completed_at,
+        "stats_applied": False,
+    }
     try:
-        test_result_doc = {
-            "user_id": current_user.id,
-            "user_name": current_user.full_name,
-            "score": correct_count,
-            "percentage": percentage,
-            "total_questions": total,
-            "correct_answers": correct_count,
-            "questions_with_answers": questions_with_answers,
-            "completed_at": datetime.utcnow(),
-        }
-        await db.test_results.insert_one(test_result_doc)
-    except Exception:
-        pass
+        await db.test_results.insert_one(record)
+    except DuplicateKeyError:
+        await finish_pending_completion(session_id, current_user.id)
+        result, _ = await load_test_result(session_id, current_user.id, session)
+        return result
 
+    await apply_completed_test(record)
     return result
 
 
@@ -1015,27 +2049,20 @@ async def complete_test(
 @api_router.get("/gamification/summary")
 async def gamification_summary(current_user: User = Depends(get_current_user)):
     now_dt = datetime.now(timezone.utc)
-    start_of_day = datetime(now_dt.year, now_dt.month, now_dt.day, tzinfo=timezone.utc)
-    start_of_week = start_of_day - timedelta(days=start_of_day.weekday())
-
-    # Aggregate test counts today and this week
-    daily_count = await db.test_results.count_documents({
-        "user_id": current_user.id,
-        "completed_at": {"$gte": start_of_day}
-    })
-    weekly_count = await db.test_results.count_documents({
-        "user_id": current_user.id,
-        "completed_at": {"$gte": start_of_week}
-    })
 
     # Targets
     daily_target = 1
     weekly_target = 5
 
-    # Load fresh user doc for xp/level/streak
-    user_doc = await db.users.find_one({"id": current_user.id})
+    # One point read: xp/level/streak plus the counters complete_test maintains
+    user_doc = await db.users.find_one({"id": current_user.id}, {
+        "_id": 0, "xp": 1, "level": 1, "streak_current": 1, "streak_best": 1,
+        "activity_day": 1, "activity_day_count": 1, "activity_week": 1, "activity_week_count": 1,
+    })
     if not user_doc:
         raise HTTPException(status_code=404, detail="İstifadəçi tapılmadı")
+    daily_count = activity_count(user_doc.get("activity_day"), user_doc.get("activity_day_count"), _utc_day_start(now_dt))
+    weekly_count = activity_count(user_doc.get("activity_week"), user_doc.get("activity_week_count"), _utc_week_start(now_dt))
     xp = int(user_doc.get("xp", 0))
     level = int(user_doc.get("level", 1))
     streak_current = int(user_doc.get("streak_current", 0))
@@ -1059,167 +2086,575 @@ async def gamification_summary(current_user: User = Depends(get_current_user)):
 @api_router.get("/tests/{session_id}/result")
 async def get_test_result(
     session_id: str,
+    request: Request,
     current_user: User = Depends(get_current_user)
 ):
-    session = await db.test_sessions.find_one(
-        {"id": session_id, "user_id": current_user.id}
-    )
-    if not session:
-        raise HTTPException(status_code=404, detail="Test sessiyası tapılmadı")
+    result, etag = await load_test_result(session_id, current_user.id)
+    if etag is None:
+        return fast_json(result)
+    # Qeyd dəyişmir, ona görə ETag onun id-sidir
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return fast_json(result, headers=headers)
 
-    # Əgər artıq nəticə hesablanıbsa onu qaytar
-    if "result" in session:
-        return session["result"]
 
-    # Yoxdursa, bütün suallar üzrə nəticəni hesabla (cavablanmayanlar da daxil)
-    # Check if session is a valid dict
-    if not isinstance(session, dict):
-        raise HTTPException(status_code=404, detail="Test sessiyası düzgün formatda deyil")
-        
-    user_answers = session.get("answers", {})
 
-    questions_with_answers = []
-    correct_count = 0
-    # Safely get questions list
-    questions_list = session.get("questions", [])
-    if not isinstance(questions_list, list):
-        questions_list = []
-    total = len(questions_list)
+# Leaderboard
+# complete_test (and profile edits) upsert a compact row per ranked user in
+# the `leaderboard` collection, stamped with a global sequence number from
+# collection_versions. Each worker keeps the rows in a sorted in-memory
+# index and pulls only rows with a recent seq, so page and rank lookups are
+# bisects instead of a users sort.
+LEADERBOARD_FIELDS = ["full_name", "bio", "total_tests", "average_score", "is_premium", "profile_image_hash"]
+
+class LeaderboardIndex:
+    VERSION_KEY = "leaderboard"
+
+    def __init__(self, refresh_interval: float = 2.0, write_grace: float = 10.0):
+        """A seq is taken before its row is written, so a row can land after a
+        sync has already read a newer version. Assuming a row write finishes
+        within `write_grace` seconds of taking its seq, every sync re-reads
+        all seqs taken since `write_grace` before the previous sync started;
+        a late row is picked up by the next sync, however many seqs passed.
+        """
+        self.refresh_interval = refresh_interval
+        self.write_grace = write_grace
+        self._keys: List[tuple] = []  # sorted (-average_score, -total_tests, user_id)
+        self._rows: Dict[str, Dict[str, Any]] = {}  # user_id -> row (tombstones too)
+        self._seq: Optional[int] = None
+        self._syncs: deque = deque()  # (monotonic start, version read)
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _key(row: Dict[str, Any]) -> tuple:
+        return (-float(row.get("average_score") or 0.0), -int(row.get("total_tests") or 0), row["user_id"])
+
+    @staticmethod
+    def _ranked(row: Dict[str, Any]) -> bool:
+        return not row.get("deleted") and int(row.get("total_tests") or 0) > 0
+
+    def apply(self, row: Dict[str, Any]):
+        user_id = row["user_id"]
+        current = self._rows.get(user_id)
+        if current is not None:
+            if current.get("seq", 0) > row.get("seq", 0):
+                return
+            if self._ranked(current):
+                key = self._key(current)
+                i = bisect_left(self._keys, key)
+                if i < len(self._keys) and self._keys[i] == key:
+                    del self._keys[i]
+        self._rows[user_id] = row
+        if self._ranked(row):
+            insort(self._keys, self._key(row))
+
+    async def _version(self) -> Optional[int]:
+        """Current seq, or None until rebuild_leaderboard has completed once."""
+        doc = await db.collection_versions.find_one({"_id": self.VERSION_KEY})
+        # record_leaderboard də bu sənədi yaradır - backfill yalnız `built` ilə bilinir
+        return int(doc["version"]) if doc and doc.get("built") else None
+
+    async def ensure_fresh(self):
+        if self._seq is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        async with self._lock:
+            if self._seq is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return
+            started = time.monotonic()
+            version = await self._version()
+            if version is None:
+                version = await rebuild_leaderboard()
+            since = self._settled_seq()
+            if self._seq is None:
+                self._keys, self._rows = [], {}
+                async for row in db.leaderboard.find({"deleted": {"$ne": True}}, {"_id": 0}):
+                    self.apply(row)
+            elif since is None or since < version:
+                # startdan sonrakı ilk write_grace saniyədə hamısı yenidən oxunur
+                query = {} if since is None else {"seq": {"$gt": since}}
+                async for row in db.leaderboard.find(query, {"_id": 0}):
+                    self.apply(row)
+            self._seq = version
+            self._syncs.append((started, version))
+            self._checked_at = time.monotonic()
+
+    def _settled_seq(self) -> Optional[int]:
+        """Version read at least write_grace before the previous sync started.
+        Every row with that seq or lower had been written before the previous
+        sync read, so only higher seqs can still be new. None if unknown."""
+        if not self._syncs:
+            return None
+        cutoff = self._syncs[-1][0] - self.write_grace
+        while len(self._syncs) > 1 and self._syncs[1][0] <= cutoff:
+            self._syncs.popleft()
+        started, version = self._syncs[0]
+        return version if started <= cutoff else None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def page(self, after: Optional[tuple], limit: int):
+        start = bisect_right(self._keys, after) if after else 0
+        keys = self._keys[start:start + limit]
+        rows = [(start + i + 1, self._rows[key[2]]) for i, key in enumerate(keys)]
+        next_key = keys[-1] if keys and start + limit < len(self._keys) else None
+        return rows, next_key
+
+    def rank(self, user_id: str):
+        row = self._rows.get(user_id)
+        if row is None or not self._ranked(row):
+            return None, None
+        return bisect_left(self._keys, self._key(row)) + 1, row
+
+leaderboard_index = LeaderboardIndex(
+    refresh_interval=float(os.environ.get("LEADERBOARD_REFRESH_SECONDS", "2")),
+    write_grace=float(os.environ.get("LEADERBOARD_WRITE_GRACE_SECONDS", "10")),
+)
 
-    for qid in questions_list:
-        try:
-            q_obj_id = ObjectId(qid)
-        except Exception:
-            q_obj_id = qid
+async def _next_leaderboard_seq() -> int:
+    doc = await db.collection_versions.find_one_and_update(
+        {"_id": LeaderboardIndex.VERSION_KEY},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return int(doc["version"])
 
-        question = await db.questions.find_one({"_id": q_obj_id})
-        if not question:
-            continue
+async def _write_rebuild_rows(operations: List[UpdateOne]):
+    try:
+        await db.leaderboard.bulk_write(operations, ordered=False)
+    except BulkWriteError as exc:
+        # 11000: the row already has a newer seq (record_leaderboard won), keep it
+        if any(error.get("code") != 11000 for error in exc.details.get("writeErrors", [])):
+            raise
+
+async def rebuild_leaderboard() -> int:
+    """(Re)build leaderboard rows from users; used on first start-up.
+
+    Rows written by record_leaderboard after this seq was taken are newer
+    and are left alone. Rows this rebuild did not rank (no tests any more,
+    user gone) are tombstoned with its seq so every worker drops them.
+    Marks the version document `built` when done.
+    """
+    seq = await _next_leaderboard_seq()
+    operations = []
+    projection = {"_id": 0, "id": 1, **{field: 1 for field in LEADERBOARD_FIELDS}}
+    async for user in db.users.find({"total_tests": {"$gt": 0}}, projection):
+        row = {field: user.get(field) for field in LEADERBOARD_FIELDS}
+        row.update({"user_id": user["id"], "seq": seq, "deleted": False})
+        operations.append(UpdateOne({"user_id": user["id"], "seq": {"$lt": seq}}, {"$set": row}, upsert=True))
+        if len(operations) >= 1000:
+            await _write_rebuild_rows(operations)
+            operations = []
+    if operations:
+        await _write_rebuild_rows(operations)
+    # seq-i bundan kiçik olan sətirləri nə bu rebuild, nə də sonrakı yazı yeniləyib
+    await db.leaderboard.update_many(
+        {"seq": {"$lt": seq}, "deleted": {"$ne": True}},
+        {"$set": {"deleted": True, "seq": seq}},
+    )
+    doc = await db.collection_versions.find_one_and_update(
+        {"_id": LeaderboardIndex.VERSION_KEY},
+        {"$set": {"built": True}},
+        return_document=ReturnDocument.AFTER,
+    )
+    return int(doc["version"])
+
+async def record_leaderboard(user_id: str, fields: Dict[str, Any], upsert: bool = True):
+    """Write the user's leaderboard row (only existing rows when upsert=False)."""
+    seq = await _next_leaderboard_seq()
+    row = await db.leaderboard.find_one_and_update(
+        {"user_id": user_id},
+        {"$set": {**fields, "seq": seq}},
+        upsert=upsert,
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    if row:
+        leaderboard_index.apply(row)
 
-        options = question.get("options")
-        if not options:
-            options = [
-                question.get("option_a"),
-                question.get("option_b"),
-                question.get("option_c"),
-                question.get("option_d"),
-            ]
-            options = [opt for opt in options if opt is not None]
+# Opaque page cursors: the sort key of the last row, base64 encoded JSON
+def _encode_cursor(key) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
 
-        correct_index = question.get("correct_answer")
-        if isinstance(correct_index, str):
-            if correct_index.isdigit():
-                correct_index = int(correct_index)
-            else:
-                letter_map = {"A": 0, "B": 1, "C": 2, "D": 3}
-                correct_index = letter_map.get(correct_index.upper(), None)
+def _decode_cursor(cursor: str, size: int) -> list:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        key = None
+    if not isinstance(key, list) or len(key) != size:
+        raise HTTPException(status_code=400, detail="Yanlış cursor")
+    return key
 
-        raw_user_answer = user_answers.get(str(qid))
-        if raw_user_answer is None:
-            user_index = None
-            is_correct = False
-        else:
-            user_index = int(raw_user_answer) if isinstance(raw_user_answer, str) else raw_user_answer
-            is_correct = (user_index == correct_index)
-            if is_correct:
-                correct_count += 1
+def _encode_leaderboard_cursor(key: tuple) -> str:
+    return _encode_cursor(key)
 
-        questions_with_answers.append({
-            "question": question.get("question_text"),
-            "options": options,
-            "user_answer": user_index,
-            "correct_answer": correct_index,
-            "is_correct": is_correct,
-            "explanation": question.get("explanation", ""),
-            "category": question.get("category", "")
-        })
+def _decode_leaderboard_cursor(cursor: str) -> tuple:
+    neg_avg, neg_tests, user_id = _decode_cursor(cursor, 3)
+    try:
+        return (float(neg_avg), int(neg_tests), str(user_id))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Yanlış cursor")
 
-    result = {
-        "score": correct_count,
-        "total_questions": total,
-        "correct_answers": correct_count,
-        "percentage": round((correct_count / total) * 100) if total > 0 else 0,
-        "questions_with_answers": questions_with_answers
+def _leaderboard_entry(rank: int, row: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        avg_score = float(row.get("average_score") or 0.0)
+    except (ValueError, TypeError):
+        avg_score = 0.0
+    return {
+        "rank": rank,
+        "id": row["user_id"],
+        "full_name": row.get("full_name", ""),
+        "bio": row.get("bio", ""),
+        "total_tests": row.get("total_tests", 0),
+        "average_score": round(avg_score, 1),
+        "is_premium": row.get("is_premium", False)
     }
 
-    # istəyirsən databazada da saxla:
-    await db.test_sessions.update_one(
-        {"id": session_id},
-        {"$set": {"result": result}}
-    )
-
-    return result
-
-
-
-# Leaderboard
 @api_router.get("/leaderboard")
-async def get_leaderboard():
-    users_cursor = db.users.find(
-        {"total_tests": {"$gt": 0}},
-        {"password": 0}
-    ).sort("average_score", -1).limit(50)
-    users_raw = await users_cursor.to_list(1000)
-    users = [parse_from_mongo(user) for user in users_raw]
-    
-    leaderboard = []
-    for i, user in enumerate(users):
-        # Ensure user is a dictionary before accessing keys
-        if isinstance(user, dict):
-            # Safely convert average_score to float
-            avg_score_raw = user.get("average_score", 0.0)
-            try:
-                # Check if it's a valid type for float conversion
-                if isinstance(avg_score_raw, (int, float, str)):
-                    avg_score = float(avg_score_raw)
-                else:
-                    avg_score = 0.0
-            except (ValueError, TypeError):
-                avg_score = 0.0
-                
-            leaderboard.append({
-                "rank": i + 1,
-                "id": user.get("id", ""),
-                "full_name": user.get("full_name", ""),
-                "bio": user.get("bio", ""),
-                "profile_image": user.get("profile_image"),
-                "total_tests": user.get("total_tests", 0),
-                "average_score": round(avg_score, 1),
-                "is_premium": user.get("is_premium", False)
-            })
-        else:
-            # Fallback for unexpected user data type
-            leaderboard.append({
-                "rank": i + 1,
-                "id": "",
-                "full_name": "",
-                "bio": "",
-                "profile_image": None,
-                "total_tests": 0,
-                "average_score": 0.0,
-                "is_premium": False
-            })
-    
-    return leaderboard
+async def get_leaderboard(limit: int = 50, cursor: Optional[str] = None, images: bool = True):
+    """Ranked users, `limit` per page. The next page's cursor is returned in
+    the X-Next-Cursor header; images=false skips profile images."""
+    limit = max(1, min(limit, 100))
+    after = _decode_leaderboard_cursor(cursor) if cursor else None
+    await leaderboard_index.ensure_fresh()
+    rows, next_key = leaderboard_index.page(after, limit)
+    leaderboard = [_leaderboard_entry(rank, row) for rank, row in rows]
+
+    if images:
+        # Şəkil hash-i leaderboard sətrində saxlanır; hash-i olmayanlar üçün
+        # köhnə inline şəkillər bir sorğu ilə
+        legacy = await legacy_profile_images([row["user_id"] for _, row in rows if not row.get("profile_image_hash")])
+        for (_, row), entry in zip(rows, leaderboard):
+            entry["profile_image"] = profile_image_url(row.get("profile_image_hash")) or legacy.get(row["user_id"])
+
+    headers = {"X-Total-Count": str(len(leaderboard_index))}
+    if next_key:
+        headers["X-Next-Cursor"] = _encode_leaderboard_cursor(next_key)
+    return fast_json(leaderboard, headers=headers)
+
+@api_router.get("/leaderboard/me")
+async def get_my_rank(current_user: User = Depends(get_current_user)):
+    await leaderboard_index.ensure_fresh()
+    rank, row = leaderboard_index.rank(current_user.id)
+    return fast_json({
+        "rank": rank,
+        "total_ranked": len(leaderboard_index),
+        "entry": _leaderboard_entry(rank, row) if row else None
+    })
 
 @api_router.get("/users/{user_id}/profile")
 async def get_user_profile(user_id: str):
-    user_raw = await db.users.find_one({"id": user_id}, {"password": 0})
-    if not user_raw:
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0, "applied_sessions": 0})
+    if not user:
         raise HTTPException(status_code=404, detail="İstifadəçi tapılmadı")
+    with_profile_image(user)
     
-    user = parse_from_mongo(user_raw)
-    
-    recent_tests_cursor = db.test_results.find(
-        {"user_id": user_id}
-    ).sort("completed_at", -1).limit(5)
-    recent_tests_raw = await recent_tests_cursor.to_list(1000)
-    recent_tests = [parse_from_mongo(test) for test in recent_tests_raw]
+    # Profil yalnız xülasəni göstərir, sual-cavab siyahısı göndərilmir
+    recent_tests = await db.test_results.find(
+        {"user_id": user_id},
+        {"_id": 0, "questions_with_answers": 0, "stats_applied": 0}
+    ).sort("completed_at", -1).limit(5).to_list(5)
     
-    return {
+    return fast_json({
         "user": user,
         "recent_tests": recent_tests
-    }
+    })
+
+# Profile images
+# Images live outside the users collection in a content-addressed store
+# (GridFS by default, IMAGE_STORE=local for a directory). The key is the
+# sha256 of the uploaded bytes; every upload is rendered into IMAGE_VARIANTS
+# and users keep only profile_image_hash. Since the content behind a hash
+# never changes, /api/images/{hash} is served as immutable.
+IMAGE_VARIANTS = {"sm": 64, "md": 200}
+IMAGE_DEFAULT_SIZE = "md"
+IMAGE_BASE_URL = os.environ.get("IMAGE_BASE_URL", "").rstrip("/")
+IMAGE_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+def profile_image_url(image_hash: Optional[str], size: str = IMAGE_DEFAULT_SIZE) -> Optional[str]:
+    if not image_hash:
+        return None
+    return f"{IMAGE_BASE_URL}/api/images/{image_hash}?size={size}"
+
+def with_profile_image(user: Dict[str, Any], size: str = IMAGE_DEFAULT_SIZE) -> Dict[str, Any]:
+    """Set `profile_image` to the image URL built from the stored hash, or keep
+    the legacy inline image until migrate_profile_images.py has moved it."""
+    user["profile_image"] = profile_image_url(user.get("profile_image_hash"), size) or user.get("profile_image")
+    return user
+
+async def legacy_profile_images(user_ids: List[str]) -> Dict[str, str]:
+    """Inline images of users without profile_image_hash (not migrated yet).
+    Empty once migrate_profile_images.py has run."""
+    if not user_ids:
+        return {}
+    cursor = db.users.find({"id": {"$in": user_ids}, "profile_image": {"$type": "string"}},
+                           {"_id": 0, "id": 1, "profile_image": 1})
+    return {user["id"]: user["profile_image"] async for user in cursor}
+
+IMAGE_MAX_UPLOAD_BYTES = int(os.environ.get("IMAGE_MAX_UPLOAD_BYTES", str(5 * 1024 * 1024)))
+# Decoded size limit (width * height), checked from the header before decoding
+IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", str(24_000_000)))
+IMAGE_REJECT_MESSAGES = {
+    "too_large": f"Fayl çox böyükdür (maksimum {IMAGE_MAX_UPLOAD_BYTES // (1024 * 1024)} MB)",
+    "too_many_pixels": "Şəklin ölçüləri çox böyükdür",
+    "invalid_image": "Şəkil faylı oxuna bilmədi",
+}
+
+class ImageProcessor:
+    """Runs Pillow decode/resize/encode in a process pool.
+
+    Same admission rule as PasswordHasher: at most `max_pending` images may
+    be queued or processing, beyond that uploads get 503. Counts processed
+    images, processing/queue time and rejections by reason.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 8, max_pixels: int = IMAGE_MAX_PIXELS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_pixels = max_pixels
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self.processed = 0
+        self.rejected: Dict[str, int] = {}
+        self.process_seconds_total = 0.0
+        self.process_seconds_max = 0.0
+        self.wait_seconds_total = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use; spawn keeps the event loop and Mongo client
+        # threads out of the workers
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def reject(self, reason: str, status_code: int = 400):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        return HTTPException(status_code=status_code, detail=IMAGE_REJECT_MESSAGES.get(reason, "Şəkil qəbul edilmədi"))
+
+    async def render(self, image_data: bytes) -> Dict[str, bytes]:
+        if self._pending >= self.max_pending:
+            self.rejected["busy"] = self.rejected.get("busy", 0) + 1
+            raise HTTPException(
+                status_code=503,
+                detail="Server hazırda məşğuldur, bir az sonra yenidən cəhd edin",
+                headers={"Retry-After": "1"},
+            )
+        self._pending += 1
+        submitted = time.perf_counter()
+        try:
+            variants, took = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), render_image_variants, image_data, IMAGE_VARIANTS, self.max_pixels
+            )
+        except ImageRejected as exc:
+            raise self.reject(exc.reason)
+        except BrokenProcessPool:
+            # a worker died (e.g. OOM); start a fresh pool for the next upload
+            self._executor = None
+            raise self.reject("worker_crashed", status_code=503)
+        finally:
+            self._pending -= 1
+        self.processed += 1
+        self.process_seconds_total += took
+        self.process_seconds_max = max(self.process_seconds_max, took)
+        self.wait_seconds_total += max(0.0, time.perf_counter() - submitted - took)
+        return variants
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "processed": self.processed,
+            "rejected": dict(self.rejected),
+            "max_upload_bytes": IMAGE_MAX_UPLOAD_BYTES,
+            "max_pixels": self.max_pixels,
+            "process_ms_avg": round(self.process_seconds_total / self.processed * 1000, 2) if self.processed else 0.0,
+            "process_ms_max": round(self.process_seconds_max * 1000, 2),
+            "queue_wait_ms_avg": round(self.wait_seconds_total / self.processed * 1000, 2) if self.processed else 0.0,
+        }
+
+image_processor = ImageProcessor(
+    workers=int(os.environ.get("IMAGE_WORKERS", "2")),
+    max_pending=int(os.environ.get("IMAGE_MAX_PENDING", "8")),
+)
+
+async def read_upload(file: UploadFile, max_bytes: int, chunk_size: int = 64 * 1024) -> bytes:
+    """Read an upload in chunks, failing with 413 as soon as it passes max_bytes."""
+    chunks = []
+    total = 0
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            raise image_processor.reject("too_large", status_code=413)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+# path prefix -> requests rejected by BodySizeLimitMiddleware (runtime-stats)
+body_limit_rejections: Dict[str, int] = {}
+
+class BodySizeLimitMiddleware:
+    """Caps request bodies for the given path prefixes before the app reads
+    them: a too large Content-Length gets 413 right away, and a body that
+    streams past the limit aborts parsing with 413."""
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    def _limit_for(self, path: str):
+        for prefix, limit in self.limits.items():
+            if path.startswith(prefix):
+                return prefix, limit
+        return None, None
+
+    @staticmethod
+    def _detail(limit: int) -> str:
+        return f"Fayl çox böyükdür (maksimum {max(1, limit // (1024 * 1024))} MB)"
+
+    async def __call__(self, scope, receive, send):
+        prefix, limit = self._limit_for(scope.get("path", "")) if scope["type"] == "http" else (None, None)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope.get("headers") or []).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            body_limit_rejections[prefix] = body_limit_rejections.get(prefix, 0) + 1
+            body = json.dumps({"detail": self._detail(limit)}, ensure_ascii=False).encode()
+            await send({"type": "http.response.start", "status": 413, "headers": [
+                (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+            ]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    body_limit_rejections[prefix] = body_limit_rejections.get(prefix, 0) + 1
+                    raise HTTPException(status_code=413, detail=self._detail(limit))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+class GridFSImageStore:
+    BUCKET = "images"
+
+    def __init__(self):
+        self._bucket = None
+        self._db = None
+
+    def _get_bucket(self):
+        if self._bucket is None or self._db is not db:
+            self._db = db
+            self._bucket = AsyncIOMotorGridFSBucket(db, bucket_name=self.BUCKET)
+        return self._bucket
+
+    async def exists(self, image_hash: str) -> bool:
+        """True only when every variant is stored; a crash or a racing upload
+        between variants leaves a partial set that the next upload completes."""
+        sizes = await db[f"{self.BUCKET}.files"].distinct("metadata.size", {"metadata.hash": image_hash})
+        return set(IMAGE_VARIANTS) <= set(sizes)
+
+    async def put(self, image_hash: str, variants: Dict[str, bytes]):
+        bucket = self._get_bucket()
+        for size, data in variants.items():
+            await bucket.upload_from_stream(
+                f"{image_hash}/{size}", data,
+                metadata={"hash": image_hash, "size": size, "content_type": "image/jpeg"},
+            )
+
+    async def get(self, image_hash: str, size: str) -> Optional[bytes]:
+        try:
+            stream = await self._get_bucket().open_download_stream_by_name(f"{image_hash}/{size}")
+        except gridfs.errors.NoFile:
+            return None
+        return await stream.read()
+
+class LocalImageStore:
+    """<root>/<hash[:2]>/<hash>/<size>.jpg, written via temp file + rename."""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def _path(self, image_hash: str, size: str) -> Path:
+        return self.root / image_hash[:2] / image_hash / f"{size}.jpg"
+
+    def _exists(self, image_hash: str) -> bool:
+        return all(self._path(image_hash, size).exists() for size in IMAGE_VARIANTS)
+
+    async def exists(self, image_hash: str) -> bool:
+        """True only when every variant file is in place (see GridFSImageStore.exists)."""
+        return await asyncio.to_thread(self._exists, image_hash)
+
+    def _write(self, image_hash: str, variants: Dict[str, bytes]):
+        for size, data in variants.items():
+            path = self._path(image_hash, size)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+
+    async def put(self, image_hash: str, variants: Dict[str, bytes]):
+        await asyncio.to_thread(self._write, image_hash, variants)
+
+    def _read(self, image_hash: str, size: str) -> Optional[bytes]:
+        try:
+            return self._path(image_hash, size).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    async def get(self, image_hash: str, size: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, image_hash, size)
+
+if os.environ.get("IMAGE_STORE", "gridfs") == "local":
+    image_store = LocalImageStore(Path(os.environ.get("IMAGE_STORE_DIR", str(ROOT_DIR / "images"))))
+else:
+    image_store = GridFSImageStore()
+
+async def store_image(image_data: bytes) -> str:
+    """Store an uploaded image (all variants) and return its hash."""
+    image_hash = hashlib.sha256(image_data).hexdigest()
+    if not await image_store.exists(image_hash):
+        await image_store.put(image_hash, await image_processor.render(image_data))
+    return image_hash
+
+async def set_profile_image(user_id: str, image_hash: str):
+    await db.users.update_one(
+        {"id": user_id},
+        {"$set": {"profile_image_hash": image_hash}, "$unset": {"profile_image": ""}}
+    )
+    principal_cache.invalidate_user(user_id)
+    await record_leaderboard(user_id, {"profile_image_hash": image_hash}, upsert=False)
+
+@api_router.get("/images/{image_hash}")
+async def get_image(image_hash: str, request: Request, size: str = IMAGE_DEFAULT_SIZE):
+    if not IMAGE_HASH_RE.match(image_hash) or size not in IMAGE_VARIANTS:
+        raise HTTPException(status_code=404, detail="Şəkil tapılmadı")
+    etag = f'"{image_hash}-{size}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    data = await image_store.get(image_hash, size)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Şəkil tapılmadı")
+    return Response(content=data, media_type="image/jpeg", headers=headers)
 
 # Profile image upload
 @api_router.post("/profile/upload-image")
@@ -1231,28 +2666,12 @@ async def upload_profile_image(
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Yalnız şəkil faylları qəbul edilir")
     
-    # Read and process image
-    image_data = await file.read()
-    image = Image.open(BytesIO(image_data))
-    # JPEG yazmaq üçün şəkli uyğun moda çevir (P, RGBA və s. -> RGB)
-    if image.mode not in ("RGB",):
-        image = image.convert("RGB")
-    
-    # Resize image
-    image.thumbnail((200, 200), Image.Resampling.LANCZOS)
+    # Read (capped) and process image in the worker pool
+    image_data = await read_upload(file, IMAGE_MAX_UPLOAD_BYTES)
+    image_hash = await store_image(image_data)
+    await set_profile_image(current_user.id, image_hash)
     
-    # Convert to base64
-    buffer = BytesIO()
-    image.save(buffer, format="JPEG", quality=85)
-    image_base64 = base64.b64encode(buffer.getvalue()).decode()
-    
-    # Update user profile
-    await db.users.update_one(
-        {"id": current_user.id},
-        {"$set": {"profile_image": f"data:image/jpeg;base64,{image_base64}"}}
-    )
-    
-    return {"profile_image": f"data:image/jpeg;base64,{image_base64}"}
+    return {"profile_image": profile_image_url(image_hash), "profile_image_hash": image_hash}
 
 # Update bio
 class BioUpdate(BaseModel):
@@ -1269,6 +2688,8 @@ async def update_bio(payload: BioUpdate, current_user: User = Depends(get_curren
         {"id": current_user.id},
         {"$set": {"bio": safe_bio}}
     )
+    principal_cache.invalidate_user(current_user.id)
+    await record_leaderboard(current_user.id, {"bio": safe_bio}, upsert=False)
     return {"bio": safe_bio}
 
 # Update full name
@@ -1284,6 +2705,8 @@ async def update_name(payload: NameUpdate, current_user: User = Depends(get_curr
         {"id": current_user.id},
         {"$set": {"full_name": safe_name}}
     )
+    principal_cache.invalidate_user(current_user.id)
+    await record_leaderboard(current_user.id, {"full_name": safe_name}, upsert=False)
     return {"full_name": safe_name}
 
 # User question submission
@@ -1312,6 +2735,7 @@ async def update_notification_settings(settings: dict, current_user: User = Depe
         {"id": current_user.id},
         {"$set": {"notify_new_questions": settings.get("notify_new_questions", True)}}
     )
+    principal_cache.invalidate_user(current_user.id)
     
     # Get updated user data
     updated_user = await db.users.find_one({"id": current_user.id})
@@ -1321,20 +2745,146 @@ async def update_notification_settings(settings: dict, current_user: User = Depe
         "notify_new_questions": updated_user.get("notify_new_questions", True) if updated_user else True
     }
 
+# Broadcast notifications (fan-out on read)
+# A broadcast such as "new question" is stored once in broadcast_notifications.
+# Each user only keeps a small read state in notification_read_state:
+#   watermark - every broadcast created at or before it counts as read
+#   read_ids  - broadcasts read individually after the watermark
+NOTIFICATION_FEED_LIMIT = 20
+READ_IDS_COMPACT_AT = 50
+
+class BroadcastNotification(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    title: str
+    message: str
+    type: str = "info"
+    question_id: Optional[str] = None
+    audience: str = "notify_new_questions"  # user flag that must be on, or "all"
+    exclude_user_ids: List[str] = []
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+def _as_utc(value):
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return datetime.min.replace(tzinfo=timezone.utc)
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return datetime.min.replace(tzinfo=timezone.utc)
+
+async def notify_new_question(question_id: Optional[str], title: str, message: str, exclude_user_id: Optional[str] = None) -> str:
+    """Publish a "new question" broadcast: one write regardless of user count."""
+    broadcast = BroadcastNotification(
+        title=title,
+        message=message,
+        question_id=question_id,  # Add the question ID for single question tests
+        exclude_user_ids=[exclude_user_id] if exclude_user_id else [],
+    )
+    # created_at stays a real datetime: the feed filters on it by range
+    await db.broadcast_notifications.insert_one(broadcast.dict())
+    return broadcast.id
+
+def _broadcast_filter(current_user: User) -> Dict[str, Any]:
+    audiences = ["all"]
+    if current_user.notify_new_questions:
+        audiences.append("notify_new_questions")
+    query = {
+        "audience": {"$in": audiences},
+        "exclude_user_ids": {"$ne": current_user.id},
+        "created_at": {"$exists": True},
+    }
+    # istifadəçi qeydiyyatdan əvvəlki yayımları görmür; created_at-i olmayan
+    # köhnə hesablarda model default-u (indiki vaxt) hər şeyi gizlədərdi
+    if "created_at" in current_user.model_fields_set:
+        query["created_at"] = {"$gte": current_user.created_at}
+    return query
+
+async def _compact_read_state(current_user: User, state: Dict[str, Any]):
+    """Advance the watermark and trim read_ids below it.
+
+    Broadcasts older than the newest NOTIFICATION_FEED_LIMIT can no longer
+    appear in the feed, so they count as read: the watermark moves at least
+    to the newest of them. From there it moves over the contiguous run of
+    individually read broadcasts. Only broadcasts the user's feed shows count."""
+    read_ids = set(state.get("read_ids", []))
+    query = _broadcast_filter(current_user)
+    projection = {"_id": 0, "id": 1, "created_at": 1}
+    watermark = state.get("watermark")
+
+    # feed-in görə biləcəyi ən köhnə yayımdan əvvəlkilər artıq görünmür
+    newest = await db.broadcast_notifications.find(query, projection) \
+        .sort("created_at", -1).limit(NOTIFICATION_FEED_LIMIT + 1).to_list(NOTIFICATION_FEED_LIMIT + 1)
+    if len(newest) > NOTIFICATION_FEED_LIMIT:
+        hidden = newest[NOTIFICATION_FEED_LIMIT]["created_at"]
+        # eyni created_at-li görünən yayım da oxunmuş sayılmasın
+        if hidden < newest[NOTIFICATION_FEED_LIMIT - 1]["created_at"] and (watermark is None or hidden > watermark):
+            watermark = hidden
+
+    if watermark is not None:
+        query["created_at"] = {**query["created_at"], "$gt": watermark}
+    cursor = db.broadcast_notifications.find(query, projection).sort("created_at", 1)
+    async for broadcast in cursor.limit(len(read_ids) + 1):
+        if broadcast["id"] not in read_ids:
+            break
+        watermark = broadcast["created_at"]
+    if watermark is None:
+        return
+
+    # watermark-dan sonrakı (hələ lazım olan) id-lər qalır, qalanı silinir
+    still_needed = {
+        broadcast["id"] async for broadcast in db.broadcast_notifications.find(
+            {"id": {"$in": list(read_ids)}, "created_at": {"$gt": watermark}}, {"_id": 0, "id": 1}
+        )
+    }
+    await db.notification_read_state.update_one(
+        {"user_id": current_user.id},
+        {"$set": {"watermark": watermark}, "$pull": {"read_ids": {"$in": list(read_ids - still_needed)}}}
+    )
+
 # User notifications
 @api_router.get("/notifications")
 async def get_notifications(current_user: User = Depends(get_current_user)):
-    notifications_cursor = db.user_notifications.find({"user_id": current_user.id}).sort("created_at", -1).limit(20)
-    notifications_raw = await notifications_cursor.to_list(1000)
-    notifications = [parse_from_mongo(notif) for notif in notifications_raw]
-    return notifications
+    notifications_cursor = db.user_notifications.find({"user_id": current_user.id}, {"_id": 0}).sort("created_at", -1).limit(NOTIFICATION_FEED_LIMIT)
+    broadcasts_cursor = db.broadcast_notifications.find(
+        _broadcast_filter(current_user), {"_id": 0, "audience": 0, "exclude_user_ids": 0}
+    ).sort("created_at", -1).limit(NOTIFICATION_FEED_LIMIT)
+    personal, broadcasts, state = await asyncio.gather(
+        notifications_cursor.to_list(NOTIFICATION_FEED_LIMIT),
+        broadcasts_cursor.to_list(NOTIFICATION_FEED_LIMIT),
+        db.notification_read_state.find_one({"user_id": current_user.id}),
+    )
+
+    watermark = _as_utc(state.get("watermark")) if state and state.get("watermark") else None
+    read_ids = set(state.get("read_ids", [])) if state else set()
+    for broadcast in broadcasts:
+        broadcast["user_id"] = current_user.id
+        broadcast["broadcast"] = True
+        broadcast["read"] = broadcast["id"] in read_ids or (
+            watermark is not None and _as_utc(broadcast["created_at"]) <= watermark
+        )
+
+    feed = sorted(personal + broadcasts, key=lambda n: _as_utc(n.get("created_at")), reverse=True)
+    return fast_json(feed[:NOTIFICATION_FEED_LIMIT])
 
 @api_router.post("/notifications/{notification_id}/mark-read")
 async def mark_notification_read(notification_id: str, current_user: User = Depends(get_current_user)):
-    await db.user_notifications.update_one(
+    result = await db.user_notifications.update_one(
         {"id": notification_id, "user_id": current_user.id},
         {"$set": {"read": True}}
     )
+    if result.matched_count == 0:
+        # Şəxsi bildiriş deyilsə, yayım bildirişidir: yalnız oxunma vəziyyəti yenilənir
+        broadcast = await db.broadcast_notifications.find_one({"id": notification_id}, {"_id": 0, "id": 1})
+        if broadcast:
+            state = await db.notification_read_state.find_one_and_update(
+                {"user_id": current_user.id},
+                {"$addToSet": {"read_ids": notification_id}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            if len(state.get("read_ids", [])) >= READ_IDS_COMPACT_AT:
+                await _compact_read_state(current_user, state)
     return {"message": "Bildiriş oxundu olaraq işarələndi"}
 
 # Test endpoint to create sample notifications
@@ -1351,12 +2901,170 @@ async def create_test_notification(current_user: User = Depends(get_current_user
     return {"message": "Test bildirişi yaradıldı", "notification_id": notification.id}
 
 # Admin routes
+# Admin lists are keyset-paged on (sort field, _id): the cursor carries the
+# last row's sort value and _id, the next page is everything after it in the
+# same order. format=ndjson|csv streams every matching row straight from the
+# Motor cursor instead (no limit, constant memory).
+ADMIN_PAGE_LIMIT = 100
+ADMIN_MAX_PAGE_LIMIT = 1000
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FLUSH_ROWS = 200
+
+def _parse_sort(sort: str, allowed: Dict[str, str]):
+    """'-created_at' -> ('created_at', -1); `allowed` maps API name -> field."""
+    direction = -1 if sort.startswith("-") else 1
+    name = sort.lstrip("-+")
+    if name not in allowed:
+        raise HTTPException(status_code=400, detail=f"sort yalnız bunlardan biri ola bilər: {', '.join(allowed)}")
+    return allowed[name], direction
+
+def _date_range_filter(field: str, start: Optional[datetime], end: Optional[datetime]) -> Dict[str, Any]:
+    """Range on a field stored either as BSON date or as ISO string
+    (prepare_for_mongo); BSON compares within one type, so both are matched."""
+    if not start and not end:
+        return {}
+    if field == "_id":
+        bounds = {}
+        if start:
+            bounds["$gte"] = ObjectId.from_datetime(start)
+        if end:
+            bounds["$lt"] = ObjectId.from_datetime(end)
+        return {"_id": bounds}
+    as_date, as_text = {}, {}
+    if start:
+        start = _as_utc(start)
+        as_date["$gte"], as_text["$gte"] = start, start.isoformat()
+    if end:
+        end = _as_utc(end)
+        as_date["$lt"], as_text["$lt"] = end, end.isoformat()
+    return {"$or": [{field: as_date}, {field: as_text}]}
+
+def _encode_page_cursor(doc: Dict[str, Any], sort_field: str) -> str:
+    value = doc.get(sort_field)
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+    elif isinstance(value, ObjectId):
+        value = {"$oid": str(value)}
+    return _encode_cursor([value, str(doc["_id"])])
+
+def _decode_page_cursor(cursor: str):
+    value, oid = _decode_cursor(cursor, 2)
+    try:
+        if isinstance(value, dict) and "$date" in value:
+            value = datetime.fromisoformat(value["$date"])
+        elif isinstance(value, dict) and "$oid" in value:
+            value = ObjectId(value["$oid"])
+        return value, ObjectId(oid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Yanlış cursor")
+
+def _keyset_query(filters: Dict[str, Any], sort_field: str, direction: int, cursor: Optional[str]) -> Dict[str, Any]:
+    """Rows after the cursor in (sort_field, _id) order. Null and missing
+    values sort before every other value, and a range operator never matches
+    them, so they get their own branches."""
+    if not cursor:
+        return filters
+    value, oid = _decode_page_cursor(cursor)
+    op = "$gt" if direction > 0 else "$lt"
+    if sort_field == "_id":
+        after = {"_id": {op: oid}}
+    elif value is None:
+        # {field: None} null-u da, sahəsi olmayanı da tutur
+        after = {sort_field: None, "_id": {op: oid}}
+        if direction > 0:
+            after = {"$or": [after, {sort_field: {"$ne": None}}]}
+    else:
+        branches = [{sort_field: {op: value}}, {sort_field: value, "_id": {op: oid}}]
+        if direction < 0:
+            branches.append({sort_field: None})
+        after = {"$or": branches}
+    return {"$and": [filters, after]} if filters else after
+
+def _csv_value(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False, default=_json_default)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return "" if value is None else value
+
+async def _export_rows(cursor, transform, export_format: str, csv_fields: List[str]):
+    """Yield NDJSON lines / CSV rows from a Motor cursor, a few hundred rows per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == "csv" else None
+    if writer:
+        writer.writerow(csv_fields)
+    rows = 0
+    async for doc in cursor:
+        row = transform(doc)
+        if writer:
+            writer.writerow([_csv_value(row.get(field)) for field in csv_fields])
+        else:
+            buffer.write(json.dumps(row, ensure_ascii=False, default=_json_default))
+            buffer.write("\n")
+        rows += 1
+        if rows % EXPORT_FLUSH_ROWS == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+async def admin_list(collection, filters: Dict[str, Any], projection: Optional[Dict[str, Any]],
+                     sort_field: str, direction: int, limit: int, cursor: Optional[str], transform,
+                     export_format: str = "json", csv_fields: Optional[List[str]] = None, export_name: str = "export"):
+    sort = [(sort_field, direction)] if sort_field == "_id" else [(sort_field, direction), ("_id", direction)]
+    if export_format in ("ndjson", "csv"):
+        motor_cursor = collection.find(filters, projection).sort(sort).batch_size(EXPORT_BATCH_SIZE)
+        media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+        return StreamingResponse(
+            _export_rows(motor_cursor, transform, export_format, csv_fields or []),
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="{export_name}.{export_format}"'},
+        )
+    if export_format != "json":
+        raise HTTPException(status_code=400, detail="format json, ndjson və ya csv olmalıdır")
+
+    limit = max(1, min(limit, ADMIN_MAX_PAGE_LIMIT))
+    query = _keyset_query(filters, sort_field, direction, cursor)
+    docs = await collection.find(query, projection).sort(sort).limit(limit + 1).to_list(limit + 1)
+    headers = {}
+    if len(docs) > limit:
+        docs = docs[:limit]
+        headers["X-Next-Cursor"] = _encode_page_cursor(docs[-1], sort_field)
+    return fast_json([transform(doc) for doc in docs], headers=headers)
+
+def _without_id(doc: Dict[str, Any]) -> Dict[str, Any]:
+    # _id is read only for the page cursor; nested values need no conversion
+    doc.pop("_id", None)
+    return doc
+
+SUBMISSION_SORTS = {"submitted_at": "submitted_at", "category": "category", "status": "status"}
+SUBMISSION_CSV_FIELDS = ["id", "user_id", "user_name", "category", "question_text", "options",
+                         "correct_answer", "explanation", "status", "submitted_at", "reviewed_at", "reviewed_by"]
+
 @api_router.get("/admin/question-submissions")
-async def get_question_submissions(admin: User = Depends(get_admin_user)):
-    submissions_cursor = db.user_question_submissions.find().sort("submitted_at", -1)
-    submissions_raw = await submissions_cursor.to_list(1000)
-    submissions = [parse_from_mongo(sub) for sub in submissions_raw]
-    return submissions
+async def get_question_submissions(
+    status: Optional[str] = None,
+    category: Optional[str] = None,
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+    sort: str = "-submitted_at",
+    limit: int = ADMIN_PAGE_LIMIT,
+    cursor: Optional[str] = None,
+    format: str = "json",
+    admin: User = Depends(get_admin_user),
+):
+    filters: Dict[str, Any] = {}
+    if status:
+        filters["status"] = status
+    if category:
+        filters["category"] = category
+    filters.update(_date_range_filter("submitted_at", submitted_from, submitted_to))
+    sort_field, direction = _parse_sort(sort, SUBMISSION_SORTS)
+    return await admin_list(
+        db.user_question_submissions, filters, None, sort_field, direction, limit, cursor,
+        _without_id, format, SUBMISSION_CSV_FIELDS, "question-submissions",
+    )
 
 @api_router.post("/admin/question-submissions/{submission_id}/approve")
 async def approve_question_submission(submission_id: str, admin: User = Depends(get_admin_user)):
@@ -1373,14 +3081,17 @@ async def approve_question_submission(submission_id: str, admin: User = Depends(
         "correct_answer": submission["correct_answer"],
         "explanation": submission["explanation"],
         "is_premium": False,
+        "schema_version": QUESTION_SCHEMA_VERSION,
         "created_at": datetime.now(timezone.utc)
     }
     
     qid = str(uuid4())
     question_data["id"] = qid
+    question_data["text_hash"] = question_text_hash(question_data["question_text"])
     
     # Insert question
     await db.questions.insert_one(prepare_for_mongo(question_data))
+    await question_bank.invalidate()
     
     # Update submission status
     await db.user_question_submissions.update_one(
@@ -1401,20 +3112,15 @@ async def approve_question_submission(submission_id: str, admin: User = Depends(
     )
     await db.user_notifications.insert_one(prepare_for_mongo(notification.dict()))
     
-    # Send notification to all users who want to be notified about new questions
-    users_to_notify = db.users.find({"notify_new_questions": True})
-    async for user in users_to_notify:
-        if user["id"] != submission["user_id"]:  # Don't send to the submitter again
-            new_question_notification = UserNotification(
-                user_id=user["id"],
-                title="Yeni sual əlavə olundu! 📚",
-                message=f"Yeni sual sistemə əlavə edildi: '{submission['question_text'][:50]}...' - Kateqoriya: {submission['category']}",
-                type="info",
-                question_id=qid  # Add the question ID for single question tests
-            )
-            await db.user_notifications.insert_one(prepare_for_mongo(new_question_notification.dict()))
+    # Notify all users who want to hear about new questions (single broadcast write)
+    notification_id = await notify_new_question(
+        qid,
+        title="Yeni sual əlavə olundu! 📚",
+        message=f"Yeni sual sistemə əlavə edildi: '{submission['question_text'][:50]}...' - Kateqoriya: {submission['category']}",
+        exclude_user_id=submission["user_id"]  # Don't send to the submitter again
+    )
     
-    return {"message": "Sual təsdiqləndi və əlavə olundu", "question_id": qid}
+    return {"message": "Sual təsdiqləndi və əlavə olundu", "question_id": qid, "notification_id": notification_id}
 
 @api_router.post("/admin/question-submissions/{submission_id}/reject")
 async def reject_question_submission(submission_id: str, admin: User = Depends(get_admin_user)):
@@ -1452,10 +3158,10 @@ async def get_admin_stats(admin: User = Depends(get_admin_user)):
     
     recent_users_cursor = db.users.find(
         {},
-        {"password": 0}
+        {"_id": 0, "password": 0, "applied_sessions": 0}
     ).sort("created_at", -1).limit(10)
     recent_users_raw = await recent_users_cursor.to_list(1000)
-    recent_users = [parse_from_mongo(user) for user in recent_users_raw]
+    recent_users = [with_profile_image(user, "sm") for user in recent_users_raw]
     
     # Ensure recent_users is a list of dictionaries
     recent_users_dicts = []
@@ -1473,22 +3179,61 @@ async def get_admin_stats(admin: User = Depends(get_admin_user)):
         recent_users=recent_users_dicts
     )
 
+@api_router.get("/admin/runtime-stats")
+async def get_runtime_stats(admin: User = Depends(get_admin_user)):
+    return {
+        "principal_cache": principal_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "quiz_stats_cache": quiz_stats_cache.stats(),
+        "session_store": session_store.stats(),
+        "image_processor": image_processor.stats(),
+        "body_size_limit_rejections": dict(body_limit_rejections),
+    }
+
+USER_SORTS = {
+    "created_at": "created_at", "full_name": "full_name", "email": "email",
+    "total_tests": "total_tests", "average_score": "average_score", "xp": "xp",
+}
+USER_CSV_FIELDS = ["id", "email", "full_name", "is_admin", "is_premium", "total_tests", "average_score",
+                   "xp", "level", "streak_best", "created_at", "last_active"]
+
+def _admin_user_row(user: Dict[str, Any]) -> Dict[str, Any]:
+    return with_profile_image(_without_id(user), "sm")
+
 @api_router.get("/admin/users")
-async def get_all_users(admin: User = Depends(get_admin_user)):
-    users_cursor = db.users.find({}, {"password": 0})
-    users_raw = await users_cursor.to_list(1000)
-    users = [parse_from_mongo(user) for user in users_raw]
-    return users
+async def get_all_users(
+    premium: Optional[bool] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    sort: str = "-created_at",
+    limit: int = ADMIN_PAGE_LIMIT,
+    cursor: Optional[str] = None,
+    format: str = "json",
+    admin: User = Depends(get_admin_user),
+):
+    filters: Dict[str, Any] = {}
+    if premium is not None:
+        filters["is_premium"] = True if premium else {"$ne": True}
+    filters.update(_date_range_filter("created_at", created_from, created_to))
+    sort_field, direction = _parse_sort(sort, USER_SORTS)
+    return await admin_list(
+        db.users, filters, {"password": 0, "applied_sessions": 0}, sort_field, direction, limit, cursor,
+        _admin_user_row, format, USER_CSV_FIELDS, "users",
+    )
 
 @api_router.delete("/admin/users/{user_id}")
 async def delete_user(user_id: str, admin: User = Depends(get_admin_user)):
     result = await db.users.delete_one({"id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="İstifadəçi tapılmadı")
+    principal_cache.invalidate_user(user_id)
     
     # Also delete user's test results
     await db.test_results.delete_many({"user_id": user_id})
+    session_store.forget_user(user_id)
     await db.test_sessions.delete_many({"user_id": user_id})
+    await db.notification_read_state.delete_many({"user_id": user_id})
+    await record_leaderboard(user_id, {"deleted": True}, upsert=False)
     
     return {"message": "İstifadəçi uğurla silindi"}
 
@@ -1499,43 +3244,51 @@ async def toggle_premium(user_id: str, admin: User = Depends(get_admin_user)):
         raise HTTPException(status_code=404, detail="İstifadəçi tapılmadı")
     new_value = not bool(user.get("is_premium", False))
     await db.users.update_one({"id": user_id}, {"$set": {"is_premium": new_value}})
+    principal_cache.invalidate_user(user_id)
+    await record_leaderboard(user_id, {"is_premium": new_value}, upsert=False)
     return {"is_premium": new_value}
 
+# created = insertion order (_id), which also covers legacy documents without created_at
+QUESTION_SORTS = {"created": "_id", "category": "category", "question_text": "question_text"}
+QUESTION_CSV_FIELDS = ["id", "category", "question_text", "options", "correct_answer", "explanation", "is_premium"]
+
+def _admin_question_row(q: Dict[str, Any]) -> Dict[str, Any]:
+    if q.get("schema_version") == QUESTION_SCHEMA_VERSION:
+        return _without_id(q)
+    # Köhnə sənəd: UI üçün id/options/correct_answer normallaşdır
+    qn = parse_from_mongo(dict(q))
+    qn.update(canonical_question_fields(q))
+    del qn["schema_version"]
+    if qn["correct_answer"] is None:
+        qn["correct_answer"] = q.get("correct_answer")
+    return qn
+
 @api_router.get("/admin/questions")
-async def get_all_questions(admin: User = Depends(get_admin_user)):
-    questions_cursor = db.questions.find()
-    questions_raw = await questions_cursor.to_list(1000)
-    normalized = []
-    for q in questions_raw:
-        qn = parse_from_mongo(dict(q))
-        # Ensure id field is present
-        if 'id' not in qn and isinstance(qn, dict):
-            _id = q.get('_id')
-            if _id is not None:
-                try:
-                    qn['id'] = str(_id)
-                except Exception:
-                    pass
-        # Ensure options array exists for UI
-        if isinstance(qn, dict) and ('options' not in qn or not isinstance(qn.get('options'), list)):
-            opts = [qn.get('option_a'), qn.get('option_b'), qn.get('option_c'), qn.get('option_d')]
-            qn['options'] = [o for o in opts if o is not None]
-        # Normalize correct_answer to int index
-        if isinstance(qn, dict):
-            ca = qn.get('correct_answer')
-            if isinstance(ca, str):
-                if ca.isdigit():
-                    qn['correct_answer'] = int(ca)
-                else:
-                    letter_map = {"A": 0, "B": 1, "C": 2, "D": 3}
-                    qn['correct_answer'] = letter_map.get(ca.upper(), ca)
-        normalized.append(qn)
-    return normalized
+async def get_all_questions(
+    category: Optional[str] = None,
+    premium: Optional[bool] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    sort: str = "created",
+    limit: int = ADMIN_PAGE_LIMIT,
+    cursor: Optional[str] = None,
+    format: str = "json",
+    admin: User = Depends(get_admin_user),
+):
+    filters: Dict[str, Any] = {}
+    if category:
+        filters["category"] = category
+    if premium is not None:
+        filters["is_premium"] = True if premium else {"$ne": True}
+    filters.update(_date_range_filter("_id", created_from, created_to))
+    sort_field, direction = _parse_sort(sort, QUESTION_SORTS)
+    return await admin_list(
+        db.questions, filters, None, sort_field, direction, limit, cursor,
+        _admin_question_row, format, QUESTION_CSV_FIELDS, "questions",
+    )
 from uuid import uuid4
-@api_router.post("/admin/questions")
-async def create_question(question_data: QuestionCreate, admin: User = Depends(get_admin_user)):
-    qid = str(uuid4())
-
+def build_question_doc(question_data: QuestionCreate) -> Dict[str, Any]:
+    """Validated canonical question document (422 on bad options/answer)."""
     # options massivini formalaşdır
     if question_data.options:
         options = [opt for opt in question_data.options if opt]
@@ -1551,33 +3304,199 @@ async def create_question(question_data: QuestionCreate, admin: User = Depends(g
     if correct_index < 0 or correct_index >= len(options):
         raise HTTPException(status_code=422, detail="correct_answer variantların intervalında deyil")
 
-    question_dict = {
-        "id": qid,
+    return {
+        "id": str(uuid4()),
         "category": question_data.category,
         "question_text": question_data.question_text,
         "options": options,
         "correct_answer": correct_index,
         "explanation": question_data.explanation,
-        "is_premium": bool(question_data.is_premium)
+        "is_premium": bool(question_data.is_premium),
+        "schema_version": QUESTION_SCHEMA_VERSION,
+        "text_hash": question_text_hash(question_data.question_text),
     }
 
+@api_router.post("/admin/questions")
+async def create_question(question_data: QuestionCreate, admin: User = Depends(get_admin_user)):
+    question_dict = build_question_doc(question_data)
+    qid = question_dict["id"]
+
     insert_result = await db.questions.insert_one(question_dict)
-    created = await db.questions.find_one({"_id": insert_result.inserted_id})
-    
-    # Send notification to all users who want to be notified about new questions
-    users_to_notify = db.users.find({"notify_new_questions": True})
-    async for user in users_to_notify:
-        new_question_notification = UserNotification(
-            user_id=user["id"],
-            title="Yeni sual əlavə olundu! 📚",
-            message=f"Admin tərəfindən yeni sual əlavə edildi: '{question_data.question_text[:50]}...' - Kateqoriya: {question_data.category}",
-            type="info",
-            question_id=qid  # Add the question ID for single question tests
-        )
-        await db.user_notifications.insert_one(prepare_for_mongo(new_question_notification.dict()))
+    await question_bank.invalidate()
+    created = await db.questions.find_one({"_id": insert_result.inserted_id}, {"_id": 0})
+    
+    # Notify all users who want to hear about new questions (single broadcast write)
+    notification_id = await notify_new_question(
+        qid,
+        title="Yeni sual əlavə olundu! 📚",
+        message=f"Admin tərəfindən yeni sual əlavə edildi: '{question_data.question_text[:50]}...' - Kateqoriya: {question_data.category}"
+    )
     
-    return parse_from_mongo(created)
+    created["notification_id"] = notification_id
+    return created
+
+
+# Bulk question import
+# The upload (JSONL: one QuestionCreate object per line; CSV: a header row
+# with the same field names, options as option_a..option_d, a JSON array or
+# "a|b|c") is read from Starlette's spooled temp file and parsed/validated
+# like POST /admin/questions in a worker thread, one batch of rows at a time,
+# so the event loop stays free. Rows are deduplicated by question_text_hash
+# against the bank, the import itself and (one indexed $in per batch) rows
+# inserted since the bank was loaded, e.g. by a concurrent import; then
+# written with insert_many(ordered=False) per batch. The hash is stored as
+# `text_hash`. Single question create/approve do not deduplicate.
+# One broadcast announces the import.
+QUESTION_IMPORT_BATCH_SIZE = 500
+QUESTION_IMPORT_MAX_BYTES = int(os.environ.get("QUESTION_IMPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+QUESTION_IMPORT_MAX_ERRORS = 1000
+TRUE_STRINGS = {"1", "true", "yes", "bəli"}
+
+def _csv_question_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    data = {key.strip(): value for key, value in row.items() if key and value not in (None, "")}
+    options = data.get("options")
+    if isinstance(options, str):
+        options = options.strip()
+        data["options"] = json.loads(options) if options.startswith("[") else [opt.strip() for opt in options.split("|")]
+    if "is_premium" in data:
+        data["is_premium"] = str(data["is_premium"]).strip().lower() in TRUE_STRINGS
+    return data
 
+def _iter_import_rows(file: UploadFile, import_format: str):
+    """(row number, dict | error string) pairs, read lazily from the upload.
+    A file that is not UTF-8 ends with one error row at the bad line."""
+    text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    line_number = 0
+    try:
+        if import_format == "csv":
+            reader = csv.DictReader(text)
+            for row in reader:
+                line_number = reader.line_num
+                try:
+                    yield line_number, _csv_question_row(row)
+                except ValueError as exc:
+                    yield line_number, f"options oxuna bilmədi: {exc}"
+            return
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield line_number, f"JSON xətası: {exc}"
+                continue
+            yield line_number, row if isinstance(row, dict) else "Sətir JSON obyekt olmalıdır"
+    except UnicodeDecodeError as exc:
+        # dekoder bu nöqtədən sonra etibarlı deyil, oxuma dayanır
+        yield line_number + 1, f"Fayl UTF-8 deyil, bu sətirdən etibarən oxunmadı: {exc.reason}"
+
+def _prepare_import_chunk(rows, size: int) -> List[tuple]:
+    """Read and validate the next `size` rows: (row number, doc | error string).
+    Blocking (file reads, JSON, pydantic); called through asyncio.to_thread."""
+    chunk = []
+    for row_number, row in rows:
+        if not isinstance(row, str):
+            try:
+                row = _import_question_doc(row)
+            except ValueError as exc:
+                row = str(exc)
+        chunk.append((row_number, row))
+        if len(chunk) >= size:
+            break
+    return chunk
+
+def _import_question_doc(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate one import row; raises ValueError with a readable message."""
+    try:
+        question_data = QuestionCreate(**row)
+    except ValidationError as exc:
+        raise ValueError("; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in exc.errors()))
+    if not question_data.question_text.strip() or not question_data.category.strip():
+        raise ValueError("category və question_text boş ola bilməz")
+    try:
+        return build_question_doc(question_data)
+    except HTTPException as exc:
+        raise ValueError(exc.detail)
+
+@api_router.post("/admin/questions/import")
+async def import_questions(file: UploadFile = File(...), format: Optional[str] = None,
+                           admin: User = Depends(get_admin_user)):
+    import_format = (format or ("csv" if (file.filename or "").lower().endswith(".csv") else "jsonl")).lower()
+    if import_format not in ("jsonl", "csv"):
+        raise HTTPException(status_code=400, detail="format jsonl və ya csv olmalıdır")
+
+    await question_bank.ensure_fresh()
+    seen_hashes = set()
+    report = {"total_rows": 0, "inserted": 0, "duplicates": 0, "failed": 0, "errors": [], "errors_truncated": False}
+    categories = set()
+
+    def add_error(row_number: int, reason: str, detail: str):
+        report["duplicates" if reason == "duplicate" else "failed"] += 1
+        if len(report["errors"]) < QUESTION_IMPORT_MAX_ERRORS:
+            report["errors"].append({"row": row_number, "reason": reason, "detail": detail})
+        else:
+            report["errors_truncated"] = True
+
+    async def flush(batch: List[tuple]):
+        if not batch:
+            return
+        # bank yükləndikdən sonra (məs. paralel idxalla) əlavə olunmuş mətnlər
+        hashes = [doc["text_hash"] for _, doc in batch]
+        existing = {
+            question["text_hash"] async for question in
+            db.questions.find({"text_hash": {"$in": hashes}}, {"_id": 0, "text_hash": 1})
+        }
+        if existing:
+            for row_number, doc in batch:
+                if doc["text_hash"] in existing:
+                    add_error(row_number, "duplicate", doc["question_text"][:80])
+            batch = [(row_number, doc) for row_number, doc in batch if doc["text_hash"] not in existing]
+            if not batch:
+                return
+        failed = set()
+        try:
+            result = await db.questions.insert_many([doc for _, doc in batch], ordered=False)
+            report["inserted"] += len(result.inserted_ids)
+        except BulkWriteError as exc:
+            report["inserted"] += exc.details.get("nInserted", 0)
+            for error in exc.details.get("writeErrors", []):
+                failed.add(error["index"])
+                add_error(batch[error["index"]][0], "insert_failed", error.get("errmsg", ""))
+        # yalnız həqiqətən əlavə olunan sətirlərin kateqoriyaları
+        categories.update(doc["category"] for index, (_, doc) in enumerate(batch) if index not in failed)
+
+    rows = _iter_import_rows(file, import_format)
+    batch: List[tuple] = []
+    while True:
+        chunk = await asyncio.to_thread(_prepare_import_chunk, rows, QUESTION_IMPORT_BATCH_SIZE)
+        if not chunk:
+            break
+        for row_number, doc in chunk:
+            report["total_rows"] += 1
+            if isinstance(doc, str):
+                add_error(row_number, "invalid", doc)
+                continue
+            text_hash = doc["text_hash"]
+            if text_hash in seen_hashes or question_bank.has_text(text_hash):
+                add_error(row_number, "duplicate", doc["question_text"][:80])
+                continue
+            seen_hashes.add(text_hash)
+            batch.append((row_number, doc))
+            if len(batch) >= QUESTION_IMPORT_BATCH_SIZE:
+                await flush(batch)
+                batch = []
+    await flush(batch)
+
+    report["notification_id"] = None
+    if report["inserted"]:
+        await question_bank.invalidate()
+        # Bütün idxal üçün bir bildiriş
+        report["notification_id"] = await notify_new_question(
+            None,
+            title="Yeni suallar əlavə olundu! 📚",
+            message=f"{report['inserted']} yeni sual əlavə edildi - Kateqoriyalar: {', '.join(sorted(categories))[:200]}",
+        )
+    return report
 
 # Admin: 500 sualı 17 mövzu üzrə seed et
 class SeedRequest(BaseModel):
@@ -1626,7 +3545,9 @@ async def initialize_data():
     for question_data in topics_questions:
         question = Question(**question_data)
         question_dict = prepare_for_mongo(question.dict())
+        question_dict["text_hash"] = question_text_hash(question.question_text)
         await db.questions.insert_one(question_dict)
+    await question_bank.invalidate()
     
     # 3. Create admin user
     admin_user = User(
@@ -1637,7 +3558,7 @@ async def initialize_data():
     )
     
     admin_dict = admin_user.dict()
-    admin_dict["password"] = get_password_hash("admin123")  # plaintext -> hashed
+    admin_dict["password"] = await get_password_hash("admin123")  # plaintext -> hashed
     admin_dict = prepare_for_mongo(admin_dict)
     
     await db.users.insert_one(admin_dict)
@@ -1657,8 +3578,7 @@ async def create_user_quiz(quiz_data: UserQuizCreate, current_user: User = Depen
     result = await db.user_quizzes.insert_one(quiz_dict)
     
     # Return the created quiz with share_code
-    created_quiz = await db.user_quizzes.find_one({"id": quiz.id})
-    normalized_quiz = parse_from_mongo(created_quiz)
+    normalized_quiz = await db.user_quizzes.find_one({"id": quiz.id}, {"_id": 0})
     
     return {
         "message": "Quiz uğurla yaradıldı", 
@@ -1666,30 +3586,50 @@ async def create_user_quiz(quiz_data: UserQuizCreate, current_user: User = Depen
         "quiz": normalized_quiz
     }
 
+# Quiz list fields; question bodies stay in Mongo, only their count is sent
+QUIZ_SUMMARY_PROJECTION = {
+    "_id": 0, "id": 1, "creator_id": 1, "creator_name": 1, "title": 1, "description": 1,
+    "category": 1, "is_public": 1, "share_code": 1, "total_attempts": 1,
+    "created_at": 1, "updated_at": 1,
+    "question_count": {"$size": {"$ifNull": ["$questions", []]}},
+}
+
 @api_router.get("/user-quizzes/my-quizzes")
-async def get_my_quizzes(current_user: User = Depends(get_current_user)):
-    quizzes_cursor = db.user_quizzes.find({"creator_id": current_user.id})
-    quizzes = await quizzes_cursor.to_list(1000)
-    
-    normalized_quizzes = []
+async def get_my_quizzes(limit: int = 50, cursor: Optional[str] = None,
+                         current_user: User = Depends(get_current_user)):
+    """Newest first, `limit` per page; next page cursor in X-Next-Cursor.
+    total_attempts is the counter submit_shared_quiz maintains
+    (reconcile_quiz_attempts.py repairs it if it drifts)."""
+    limit = max(1, min(limit, 100))
+    query: Dict[str, Any] = {"creator_id": current_user.id}
+    if cursor:
+        created_at, quiz_id = _decode_cursor(cursor, 2)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": quiz_id}},
+        ]
+    quizzes = await db.user_quizzes.aggregate([
+        {"$match": query},
+        {"$sort": {"created_at": -1, "id": -1}},
+        {"$limit": limit + 1},
+        {"$project": QUIZ_SUMMARY_PROJECTION},
+    ]).to_list(limit + 1)
+
+    headers = {}
+    if len(quizzes) > limit:
+        quizzes = quizzes[:limit]
+        last = quizzes[-1]
+        headers["X-Next-Cursor"] = _encode_cursor([last.get("created_at"), last.get("id")])
     for quiz in quizzes:
-        quiz_data = parse_from_mongo(quiz)
-        # Get attempt count
-        quiz_id = quiz_data.get("id", "") if isinstance(quiz_data, dict) else ""
-        attempt_count = await db.shared_quiz_attempts.count_documents({"quiz_id": quiz_id})
-        if isinstance(quiz_data, dict):
-            quiz_data["total_attempts"] = attempt_count
-        normalized_quizzes.append(quiz_data)
-    
-    return normalized_quizzes
+        quiz["total_attempts"] = int(quiz.get("total_attempts") or 0)
+    return fast_json(quizzes, headers=headers)
 
 @api_router.get("/shared-quiz/{share_code}")
 async def get_shared_quiz(share_code: str):
-    quiz = await db.user_quizzes.find_one({"share_code": share_code})
-    if not quiz:
+    quiz_data = await db.user_quizzes.find_one({"share_code": share_code}, {"_id": 0})
+    if not quiz_data:
         raise HTTPException(status_code=404, detail="Quiz tapılmadı")
     
-    quiz_data = parse_from_mongo(quiz)
     # Don't include correct answers in the response
     if isinstance(quiz_data, dict) and "questions" in quiz_data:
         for question in quiz_data.get("questions", []):
@@ -1704,11 +3644,10 @@ async def get_shared_quiz(share_code: str):
 @api_router.post("/shared-quiz/{share_code}/submit")
 async def submit_shared_quiz(share_code: str, submission: SharedQuizSubmission):
     # Get the quiz with correct answers
-    quiz = await db.user_quizzes.find_one({"share_code": share_code})
-    if not quiz:
+    quiz_data = await db.user_quizzes.find_one({"share_code": share_code}, {"_id": 0})
+    if not quiz_data:
         raise HTTPException(status_code=404, detail="Quiz tapılmadı")
     
-    quiz_data = parse_from_mongo(quiz)
     
     # Calculate score
     total_questions = len(quiz_data.get("questions", [])) if isinstance(quiz_data, dict) else 0
@@ -1716,7 +3655,7 @@ async def submit_shared_quiz(share_code: str, submission: SharedQuizSubmission):
     
     if isinstance(quiz_data, dict) and "questions" in quiz_data:
         for question_index, user_answer in submission.answers.items():
-            if question_index < len(quiz_data["questions"]):
+            if 0 <= question_index < len(quiz_data["questions"]):
                 question = quiz_data["questions"][question_index]
                 if isinstance(question, dict) and "correct_answer" in question:
                     correct_answer = question["correct_answer"]
@@ -1741,7 +3680,7 @@ async def submit_shared_quiz(share_code: str, submission: SharedQuizSubmission):
         quiz_title=quiz_title,
         quiz_creator_id=quiz_creator_id,
         solver_name=submission.user_name,
-        answers=submission.answers,
+        answers={str(index): answer for index, answer in submission.answers.items() if 0 <= index < total_questions},
         score=score,
         percentage=score,
         total_questions=total_questions,
@@ -1768,7 +3707,7 @@ async def submit_shared_quiz(share_code: str, submission: SharedQuizSubmission):
         )
         
         notification_dict = prepare_for_mongo(notification.dict())
-        await db.notifications.insert_one(notification_dict)
+        await db.user_notifications.insert_one(notification_dict)
     
     # Return results with correct answers for review
     questions = quiz_data.get("questions", []) if isinstance(quiz_data, dict) else []
@@ -1780,47 +3719,199 @@ async def submit_shared_quiz(share_code: str, submission: SharedQuizSubmission):
         "questions_with_answers": questions
     }
 
-@api_router.get("/quiz-stats/{quiz_id}")
-async def get_quiz_stats(quiz_id: str, current_user: User = Depends(get_current_user)):
-    # Verify ownership
-    quiz = await db.user_quizzes.find_one({"id": quiz_id, "creator_id": current_user.id})
-    if not quiz:
-        raise HTTPException(status_code=404, detail="Quiz tapılmadı və ya icazəniz yoxdur")
-    
-    # Get all attempts
-    attempts_cursor = db.shared_quiz_attempts.find({"quiz_id": quiz_id})
-    attempts = await attempts_cursor.to_list(1000)
-    
-    quiz_title = quiz.get("title", "") if isinstance(quiz, dict) else ""
-    
-    if not attempts:
+# Quiz statistics
+# One aggregation over shared_quiz_attempts ($facet of $group stages): summary,
+# score distribution and per-question answer counts. Scores are ints 0..100,
+# so the distribution has at most 101 rows; median/percentiles/histogram are
+# read off it here, which works on any MongoDB version (no $median/$percentile).
+QUIZ_STATS_PERCENTILES = (25, 50, 75, 90)
+QUIZ_ATTEMPTS_PAGE_SIZE = 20
+QUIZ_ATTEMPT_FIELDS = {
+    "_id": 0, "id": 1, "solver_name": 1, "score": 1, "percentage": 1,
+    "correct_answers": 1, "total_questions": 1, "completed_at": 1,
+}
+
+def _score_at_rank(distribution: List[tuple], rank: int):
+    """Score of the rank-th (1-based) attempt in ascending score order."""
+    seen = 0
+    for score, count in distribution:
+        seen += count
+        if seen >= rank:
+            return score
+    return distribution[-1][0] if distribution else 0
+
+def summarize_score_distribution(distribution: List[tuple]) -> Dict[str, Any]:
+    """Median, nearest-rank percentiles and a 10-point histogram from
+    sorted (score, count) pairs."""
+    total = sum(count for _, count in distribution)
+    if not total:
         return {
-            "quiz_title": quiz_title,
-            "total_attempts": 0,
-            "average_score": 0,
-            "attempts": []
+            "median_score": 0,
+            "percentiles": {f"p{p}": 0 for p in QUIZ_STATS_PERCENTILES},
+            "histogram": [{"from": low, "to": min(low + 9, 100), "count": 0} for low in range(0, 100, 10)],
         }
-    
-    # Calculate statistics
-    total_attempts = len(attempts)
-    total_score = 0
-    for attempt in attempts:
-        if isinstance(attempt, dict) and "score" in attempt:
-            total_score += attempt["score"]
-    average_score = total_score / total_attempts if total_attempts > 0 else 0
-    
-    normalized_attempts = []
-    for attempt in attempts:
-        attempt_data = parse_from_mongo(attempt)
-        normalized_attempts.append(attempt_data)
-    
+    if total % 2:
+        median = _score_at_rank(distribution, total // 2 + 1)
+    else:
+        median = (_score_at_rank(distribution, total // 2) + _score_at_rank(distribution, total // 2 + 1)) / 2
+    percentiles = {
+        f"p{p}": _score_at_rank(distribution, max(1, math.ceil(p / 100 * total)))
+        for p in QUIZ_STATS_PERCENTILES
+    }
+    # 0-9, 10-19, ..., 90-100 (100 goes to the last bucket)
+    buckets = [0] * 10
+    for score, count in distribution:
+        buckets[min(max(int(score), 0) // 10, 9)] += count
+    histogram = [{"from": low * 10, "to": 100 if low == 9 else low * 10 + 9, "count": buckets[low]} for low in range(10)]
+    return {"median_score": median, "percentiles": percentiles, "histogram": histogram}
+
+async def compute_quiz_stats(quiz_id: str, questions: List[Any]) -> Dict[str, Any]:
+    correct = [q.get("correct_answer") if isinstance(q, dict) else None for q in questions]
+    facets = await db.shared_quiz_attempts.aggregate([
+        {"$match": {"quiz_id": quiz_id}},
+        {"$facet": {
+            "summary": [{"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "average": {"$avg": "$score"},
+                "max": {"$max": "$score"},
+                "min": {"$min": "$score"},
+            }}],
+            "scores": [{"$group": {"_id": "$score", "count": {"$sum": 1}}}, {"$sort": {"_id": 1}}],
+            "questions": [
+                {"$project": {"answers": {"$objectToArray": {"$ifNull": ["$answers", {}]}}}},
+                {"$unwind": "$answers"},
+                {"$group": {
+                    "_id": "$answers.k",
+                    "answered": {"$sum": 1},
+                    "correct": {"$sum": {"$cond": [
+                        # $literal: "$..." kimi dəyərlər sahə yolu/ifadə sayılmasın
+                        {"$eq": ["$answers.v", {"$arrayElemAt": [{"$literal": correct}, {"$toInt": "$answers.k"}]}]}, 1, 0,
+                    ]}},
+                }},
+            ],
+        }},
+    ]).to_list(1)
+    facet = facets[0] if facets else {}
+    summary = (facet.get("summary") or [{}])[0]
+    total_attempts = int(summary.get("count") or 0)
+    distribution = [(row["_id"], row["count"]) for row in facet.get("scores", []) if isinstance(row.get("_id"), (int, float))]
+
+    per_question = {}
+    for row in facet.get("questions", []):
+        try:
+            per_question[int(row["_id"])] = row
+        except (TypeError, ValueError):
+            continue
+    question_stats = []
+    for index in range(len(questions)):
+        row = per_question.get(index, {})
+        correct_count = int(row.get("correct", 0))
+        question_stats.append({
+            "index": index,
+            "answered": int(row.get("answered", 0)),
+            "correct": correct_count,
+            # unanswered counts as wrong
+            "correct_rate": round(correct_count / total_attempts * 100, 1) if total_attempts else 0,
+        })
+
     return {
-        "quiz_title": quiz_title,
         "total_attempts": total_attempts,
-        "average_score": round(average_score, 1),
-        "attempts": normalized_attempts
+        "average_score": round(summary.get("average") or 0, 1),
+        "max_score": summary.get("max") or 0,
+        "min_score": summary.get("min") or 0,
+        **summarize_score_distribution(distribution),
+        "question_stats": question_stats,
     }
 
+class QuizStatsCache:
+    """LRU of computed quiz stats.
+
+    An entry is tagged with the quiz's total_attempts when it was computed;
+    submit_shared_quiz increments that counter, so the next stats request
+    (in any worker) sees a different value and recomputes.
+    """
+
+    def __init__(self, maxsize: int = 1000):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, quiz_id: str, version) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(quiz_id)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(quiz_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, quiz_id: str, version, stats: Dict[str, Any]):
+        self._entries[quiz_id] = (version, stats)
+        self._entries.move_to_end(quiz_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, quiz_id: str):
+        self._entries.pop(quiz_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+quiz_stats_cache = QuizStatsCache(maxsize=int(os.environ.get("QUIZ_STATS_CACHE_SIZE", "1000")))
+
+async def _quiz_attempts_page(quiz_id: str, limit: int, cursor: Optional[str]):
+    """Newest attempts first, keyset-paged on (completed_at, id)."""
+    query: Dict[str, Any] = {"quiz_id": quiz_id}
+    if cursor:
+        completed_at, attempt_id = _decode_cursor(cursor, 2)
+        query["$or"] = [
+            {"completed_at": {"$lt": completed_at}},
+            {"completed_at": completed_at, "id": {"$lt": attempt_id}},
+        ]
+    attempts = await db.shared_quiz_attempts.find(query, QUIZ_ATTEMPT_FIELDS) \
+        .sort([("completed_at", -1), ("id", -1)]).limit(limit + 1).to_list(limit + 1)
+    next_cursor = None
+    if len(attempts) > limit:
+        attempts = attempts[:limit]
+        next_cursor = _encode_cursor([attempts[-1].get("completed_at"), attempts[-1].get("id")])
+    return attempts, next_cursor
+
+@api_router.get("/quiz-stats/{quiz_id}")
+async def get_quiz_stats(quiz_id: str, current_user: User = Depends(get_current_user)):
+    """Aggregate stats plus the first page of attempts; further pages come
+    from /quiz-stats/{quiz_id}/attempts with the X-Next-Cursor value."""
+    # Verify ownership
+    quiz = await db.user_quizzes.find_one(
+        {"id": quiz_id, "creator_id": current_user.id},
+        {"_id": 0, "title": 1, "total_attempts": 1, "questions.correct_answer": 1},
+    )
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz tapılmadı və ya icazəniz yoxdur")
+
+    version = quiz.get("total_attempts")
+    stats = quiz_stats_cache.get(quiz_id, version)
+    if stats is None:
+        stats = await compute_quiz_stats(quiz_id, quiz.get("questions") or [])
+        quiz_stats_cache.put(quiz_id, version, stats)
+
+    attempts, next_cursor = await _quiz_attempts_page(quiz_id, QUIZ_ATTEMPTS_PAGE_SIZE, None)
+    return fast_json({
+        "quiz_title": quiz.get("title", ""),
+        **stats,
+        "attempts": attempts,
+    }, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+@api_router.get("/quiz-stats/{quiz_id}/attempts")
+async def get_quiz_attempts(quiz_id: str, limit: int = QUIZ_ATTEMPTS_PAGE_SIZE,
+                            cursor: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    quiz = await db.user_quizzes.find_one({"id": quiz_id, "creator_id": current_user.id}, {"_id": 1})
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz tapılmadı və ya icazəniz yoxdur")
+    attempts, next_cursor = await _quiz_attempts_page(quiz_id, max(1, min(limit, 100)), cursor)
+    return fast_json(attempts, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
 @api_router.delete("/user-quizzes/{quiz_id}")
 async def delete_user_quiz(quiz_id: str, current_user: User = Depends(get_current_user)):
     # Verify ownership
@@ -1830,12 +3921,258 @@ async def delete_user_quiz(quiz_id: str, current_user: User = Depends(get_curren
     
     # Also delete related attempts
     await db.shared_quiz_attempts.delete_many({"quiz_id": quiz_id})
+    quiz_stats_cache.invalidate(quiz_id)
     
     return {"message": "Quiz uğurla silindi"}
 
 
+# Indexes
+# Every hot-path filter/sort is declared here; they are created at start-up
+# (idempotent) and compared against what the server actually has. Names are
+# explicit so drift is detected by name. check_indexes.py explains the hot
+# queries against a seeded mongod and fails CI on any COLLSCAN.
+def _index(keys, name, **options):
+    return IndexModel(keys, name=name, **options)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        _index([("email", ASCENDING)], "email_unique", unique=True),
+        _index([("id", ASCENDING)], "id_unique", unique=True),
+        # admin list keyset order (also serves recent users)
+        _index([("created_at", DESCENDING), ("_id", DESCENDING)], "created_at_id"),
+    ],
+    "questions": [
+        _index([("id", ASCENDING)], "id_unique", unique=True,
+               partialFilterExpression={"id": {"$exists": True}}),
+        _index([("category", ASCENDING), ("_id", ASCENDING)], "category_id"),
+        # import dedupe against rows inserted since the bank was loaded
+        _index([("text_hash", ASCENDING)], "text_hash"),
+    ],
+    "test_sessions": [
+        _index([("id", ASCENDING)], "id_unique", unique=True),
+        _index([("user_id", ASCENDING)], "user_id"),
+    ],
+    "test_results": [
+        _index([("user_id", ASCENDING), ("completed_at", DESCENDING)], "user_id_completed_at"),
+        _index([("session_id", ASCENDING)], "session_id_unique", unique=True,
+               partialFilterExpression={"session_id": {"$exists": True}}),
+    ],
+    "user_notifications": [
+        _index([("user_id", ASCENDING), ("created_at", DESCENDING)], "user_id_created_at"),
+        _index([("id", ASCENDING)], "id"),
+    ],
+    "broadcast_notifications": [
+        _index([("id", ASCENDING)], "id_unique", unique=True),
+        _index([("created_at", DESCENDING)], "created_at_desc"),
+    ],
+    "notification_read_state": [
+        _index([("user_id", ASCENDING)], "user_id_unique", unique=True),
+    ],
+    "metrics_snapshots": [
+        # dead workers' snapshots stay summed until they expire
+        _index([("updated_at", ASCENDING)], "updated_at_ttl", expireAfterSeconds=METRICS_RETENTION_SECONDS),
+    ],
+    "leaderboard": [
+        _index([("user_id", ASCENDING)], "user_id_unique", unique=True),
+        _index([("seq", ASCENDING)], "seq"),
+    ],
+    "user_question_submissions": [
+        _index([("id", ASCENDING)], "id_unique", unique=True),
+        _index([("submitted_at", DESCENDING), ("_id", DESCENDING)], "submitted_at_id"),
+        _index([("status", ASCENDING), ("submitted_at", DESCENDING), ("_id", DESCENDING)], "status_submitted_at_id"),
+    ],
+    "user_quizzes": [
+        _index([("id", ASCENDING)], "id_unique", unique=True),
+        _index([("share_code", ASCENDING)], "share_code_unique", unique=True),
+        _index([("creator_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], "creator_id_created_at"),
+    ],
+    "images.files": [
+        _index([("metadata.hash", ASCENDING)], "metadata_hash"),
+    ],
+    "shared_quiz_attempts": [
+        _index([("quiz_id", ASCENDING), ("completed_at", DESCENDING), ("id", DESCENDING)], "quiz_id_completed_at"),
+    ],
+}
+
+index_report: Dict[str, Any] = {}
+
+INDEX_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+def _index_spec(index: Dict[str, Any]) -> Dict[str, Any]:
+    """Keys plus the options we declare, comparable between an IndexModel
+    document and an index_information() entry."""
+    spec = {"key": [(field, direction) for field, direction in dict(index["key"]).items()]}
+    for option in INDEX_OPTIONS:
+        value = index.get(option)
+        if option in ("unique", "sparse"):
+            value = bool(value)
+        elif isinstance(value, float) and value.is_integer():
+            value = int(value)
+        spec[option] = value
+    return spec
+
+async def ensure_indexes() -> Dict[str, Any]:
+    """Create declared indexes and report drift per collection:
+    missing (could not be created), conflicting (same name, other keys or
+    options) and extra (present on the server but not declared)."""
+    report = {}
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        entry = {"ok": [], "failed": {}, "conflicting": {}, "extra": []}
+        for model in models:
+            name = model.document["name"]
+            try:
+                await collection.create_indexes([model])
+                entry["ok"].append(name)
+            except Exception as exc:  # duplicate data, option conflict, ...
+                entry["failed"][name] = str(exc)
+        declared = {model.document["name"] for model in models}
+        existing = await collection.index_information()
+        for model in models:
+            name = model.document["name"]
+            if name not in existing:
+                continue
+            wanted, actual = _index_spec(model.document), _index_spec(existing[name])
+            if wanted != actual:
+                # create_indexes xəta versə də (85/86), bu konfliktdir, "failed" deyil
+                entry["failed"].pop(name, None)
+                if name in entry["ok"]:
+                    entry["ok"].remove(name)
+                entry["conflicting"][name] = {
+                    "declared": wanted,
+                    "existing": actual,
+                }
+                logger.error("Index %s.%s differs from its declaration: %s != %s",
+                             collection_name, name, actual, wanted)
+        for name, error in entry["failed"].items():
+            logger.error("Index %s.%s could not be created: %s", collection_name, name, error)
+        entry["extra"] = sorted(name for name in existing if name != "_id_" and name not in declared)
+        if entry["extra"]:
+            logger.warning("Undeclared indexes on %s: %s", collection_name, entry["extra"])
+        report[collection_name] = entry
+    index_report.clear()
+    index_report.update(report)
+    return report
+
+@api_router.get("/admin/indexes")
+async def get_index_report(admin: User = Depends(get_admin_user)):
+    return index_report
+
+@api_router.post("/admin/indexes/ensure")
+async def run_ensure_indexes(admin: User = Depends(get_admin_user)):
+    return await ensure_indexes()
+
+# Metrics endpoint and cross-worker aggregation (registry: see "Metrics" at the top)
+# endpoint -> path template, filled on the first request (all routes are registered by then)
+_route_templates: Dict[Any, str] = {}
+
+def route_label(scope) -> str:
+    """Path template ("/api/tests/{session_id}/answer") so ids do not become labels."""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    if not _route_templates:
+        for route in app.routes:
+            _route_templates.setdefault(getattr(route, "endpoint", None), getattr(route, "path", "unmatched"))
+    return _route_templates.get(endpoint, "unmatched")
+
+class MetricsMiddleware:
+    """Outermost middleware: latency and status per route, plus the Mongo
+    commands the request issued (collected by MongoCommandMetrics)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        commands: list = []
+        token = current_request_commands.set(commands)
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request_commands.reset(token)
+            route = route_label(scope)
+            method = scope.get("method", "")
+            metrics.inc("http_requests_total", method=method, route=route, status=str(status))
+            metrics.observe("http_request_duration_seconds", elapsed, method=method, route=route)
+            metrics.observe("http_request_db_commands", len(commands), route=route)
+            for command, outcome, seconds in commands:
+                record_mongo_command(route, command, outcome, seconds)
+
+async def flush_metrics():
+    """Write this worker's cumulative series; old workers' documents expire by TTL."""
+    await db.metrics_snapshots.replace_one(
+        {"_id": WORKER_ID},
+        {"host": socket.gethostname(), "pid": os.getpid(),
+         "updated_at": datetime.now(timezone.utc), "series": metrics.snapshot()},
+        upsert=True,
+    )
+
+async def _metrics_flush_loop():
+    while True:
+        await asyncio.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            await flush_metrics()
+        except PyMongoError as exc:
+            logger.warning("Metrics flush failed: %s", exc)
+
+metrics_flush_task: Optional[asyncio.Task] = None
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """Prometheus scrape target. Sums every worker's latest snapshot; counters
+    of a restarted worker stay in until they expire, so totals never drop."""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("authorization", "").encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="İcazə yoxdur")
+    snapshots = [metrics.snapshot()]
+    workers = 1
+    if METRICS_FLUSH_SECONDS > 0:
+        try:
+            await flush_metrics()
+            docs = await db.metrics_snapshots.find({}, {"series": 1, "updated_at": 1}).to_list(None)
+            snapshots = [doc.get("series", []) for doc in docs]
+            live_after = datetime.now(timezone.utc) - timedelta(seconds=3 * METRICS_FLUSH_SECONDS)
+            workers = sum(1 for doc in docs if _as_utc(doc.get("updated_at")) and _as_utc(doc["updated_at"]) >= live_after)
+        except PyMongoError as exc:
+            logger.warning("Metrics aggregation failed, serving this worker only: %s", exc)
+    gauges = {"metrics_workers": ("Workers that reported within the last three flush intervals", workers)}
+    return Response(
+        render_prometheus(merge_metric_series(snapshots), gauges),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+@app.on_event("startup")
+async def start_metrics_flush():
+    global metrics_flush_task
+    if METRICS_FLUSH_SECONDS > 0:
+        metrics_flush_task = asyncio.create_task(_metrics_flush_loop())
+
+@app.on_event("startup")
+async def start_session_store():
+    await session_store.start()
+
+@app.on_event("startup")
+async def startup_indexes():
+    if os.environ.get("ENSURE_INDEXES", "true").lower() in ("1", "true", "yes"):
+        await ensure_indexes()
+
 # Include the router in the main app
-app.include_router(api_router)
+app.include_router(api_router, default_response_class=FastJSONResponse)
 
 cors_env = os.environ.get('CORS_ORIGINS')
 if not cors_env or cors_env.strip() == '*' or cors_env.strip() == '"*"':
@@ -1846,6 +4183,11 @@ if not cors_env or cors_env.strip() == '*' or cors_env.strip() == '"*"':
 else:
     allowed_origins = [o.strip() for o in cors_env.split(',') if o.strip()]
 
+# multipart overhead on top of the image itself (added first so CORS headers wrap the 413)
+app.add_middleware(BodySizeLimitMiddleware, limits={
+    "/api/profile/upload-image": IMAGE_MAX_UPLOAD_BYTES + 64 * 1024,
+    "/api/admin/questions/import": QUESTION_IMPORT_MAX_BYTES,
+})
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1853,7 +4195,10 @@ app.add_middleware(
     allow_origin_regex=r"https?://(localhost|127\.0\.0\.1)(:\d+)?",
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
+# added last = outermost, so CORS preflights and 413s are counted too
+app.add_middleware(MetricsMiddleware)
 
 # Configure logging
 logging.basicConfig(
@@ -1864,4 +4209,13 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    if metrics_flush_task is not None:
+        metrics_flush_task.cancel()
+        try:
+            await flush_metrics()
+        except PyMongoError as exc:
+            logger.warning("Final metrics flush failed: %s", exc)
+    await session_store.stop()
+    client.close()
+    password_hasher._executor.shutdown(wait=False)
+    image_processor.shutdown()
\ No newline at end of file
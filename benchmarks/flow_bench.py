@@ -0,0 +1,306 @@
+"""Latency, Mongo round trips and allocations per endpoint for the test-taking flow.
+
+Drives server.app in-process through httpx's ASGI transport against a local
+mongod (scratch database, dropped afterwards). Each flow replays what the
+frontend does: register -> tests/start -> question pages and answer batches
+(--per-question: N x (question, answer)) -> complete -> result (and a revalidation
+with If-None-Match) -> leaderboard -> profile. Requests run one at a time, so every Mongo command
+counted between two requests belongs to the request in between.
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/flow_bench.py --flows 50 --save baseline.json
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/flow_bench.py --flows 50 --compare baseline.json
+
+Registration pays the real bcrypt cost; run with BCRYPT_ROUNDS=4 to keep it
+from dominating the wall time (its row is then not representative).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+from pymongo import monitoring
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+# never the app database: the bench drops it
+os.environ["DB_NAME"] = os.environ.get("BENCH_DB", "bench_flow")
+os.environ.setdefault("DEBUG_LOG_SAMPLE_RATE", "0")
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name not in ("hello", "isMaster", "ismaster", "ping", "endSessions"):
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# registered before server creates its client, so the app's own client reports here
+counter = CommandCounter()
+monitoring.register(counter)
+
+import server  # noqa: E402
+
+# one INFO line per request would bury the report
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+CATEGORIES = ["python_syntax", "algorithms", "oop", "data_structures"]
+# column -> table width
+METRIC_KEYS = {"p50_ms": 9, "p95_ms": 9, "p99_ms": 9, "mongo_ops": 6, "alloc_kib": 8}
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an unsorted list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+async def seed(users: int, questions: int, results: int):
+    db = server.db
+    now = datetime.now(timezone.utc)
+    question_docs = [
+        server.prepare_for_mongo(server.Question(
+            category=CATEGORIES[i % len(CATEGORIES)],
+            question_text=f"Benchmark sualı {i}: print(len(range({i})))",
+            options=[str(i), str(i + 1), "Xəta", "None"],
+            correct_answer=0,
+            explanation="range(n) n element verir.",
+        ).dict())
+        for i in range(questions)
+    ]
+    if question_docs:
+        await db.questions.insert_many(question_docs)
+
+    password = server.pwd_context.hash("benchmark")
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    user_docs = []
+    for i, user_id in enumerate(user_ids):
+        user = server.User(id=user_id, email=f"seed{i}@bench.az", full_name=f"Seed {i}").dict()
+        user["password"] = password
+        user_docs.append(server.prepare_for_mongo(user))
+    if user_docs:
+        await db.users.insert_many(user_docs)
+
+    # history for profiles and the leaderboard; stats are replayed by complete_test's rules
+    stats = {}
+    result_docs = []
+    for i in range(results if user_ids else 0):
+        user_id = random.choice(user_ids)
+        correct = random.randint(0, 10)
+        completed_at = now - timedelta(minutes=results - i)
+        stats[user_id] = server.apply_test_to_stats(stats.get(user_id, {}), correct * 10, correct, completed_at)
+        result_docs.append({
+            "id": str(uuid.uuid4()), "session_id": str(uuid.uuid4()),
+            "user_id": user_id, "user_name": "Seed", "score": correct, "percentage": correct * 10,
+            "total_questions": 10, "correct_answers": correct, "questions_with_answers": [],
+            "completed_at": completed_at,
+        })
+    if result_docs:
+        await db.test_results.insert_many(result_docs)
+    for user_id, user_stats in stats.items():
+        await db.users.update_one({"id": user_id}, {"$set": user_stats})
+
+    await server.question_bank.invalidate()
+    await server.rebuild_leaderboard()
+
+
+class Recorder:
+    """Per endpoint: latencies, Mongo commands and (alloc pass) peak bytes."""
+
+    def __init__(self):
+        self.samples = {}
+        self.trace_allocations = False
+
+    async def call(self, client, name, method, url, expected=200, **kwargs):
+        before = counter.count
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - started
+        if response.status_code != expected:
+            raise RuntimeError(f"{method} {url}: {response.status_code} {response.text[:200]}")
+        entry = self.samples.setdefault(name, {"latency": [], "mongo_ops": [], "alloc": []})
+        if self.trace_allocations:
+            entry["alloc"].append(tracemalloc.get_traced_memory()[1] - base)
+        else:
+            entry["latency"].append(elapsed)
+            entry["mongo_ops"].append(counter.count - before)
+        return response
+
+    def report(self):
+        report = {}
+        for name, entry in self.samples.items():
+            latency = entry["latency"]
+            report[name] = {
+                "count": len(latency),
+                "p50_ms": round(percentile(latency, 50) * 1000, 3) if latency else None,
+                "p95_ms": round(percentile(latency, 95) * 1000, 3) if latency else None,
+                "p99_ms": round(percentile(latency, 99) * 1000, 3) if latency else None,
+                "mongo_ops": round(sum(entry["mongo_ops"]) / len(entry["mongo_ops"]), 2) if entry["mongo_ops"] else None,
+                "alloc_kib": round(percentile(entry["alloc"], 50) / 1024, 1) if entry["alloc"] else None,
+            }
+        return report
+
+
+async def run_flow(client, recorder: Recorder, answers: int, per_question: bool):
+    email = f"flow-{uuid.uuid4().hex[:12]}@bench.az"
+    response = await recorder.call(client, "POST /api/auth/register", "POST", "/api/auth/register",
+                                   json={"email": email, "password": "benchmark", "full_name": "Flow"})
+    body = response.json()
+    headers = {"Authorization": f"Bearer {body['access_token']}"}
+    user_id = body["user"]["id"]
+
+    response = await recorder.call(client, "POST /api/tests/start", "POST", "/api/tests/start",
+                                   json={"limit": answers}, headers=headers)
+    session = response.json()
+    session_id = session["session_id"]
+    if per_question:
+        for index in range(session["total_questions"]):
+            response = await recorder.call(client, "GET /api/tests/{session_id}/question/{question_index}", "GET",
+                                           f"/api/tests/{session_id}/question/{index}", headers=headers)
+            question = response.json()["question"]
+            await recorder.call(client, "POST /api/tests/{session_id}/answer", "POST",
+                                f"/api/tests/{session_id}/answer", headers=headers,
+                                json={"question_id": question["id"], "selected_option": random.randint(0, 3)})
+    else:
+        # TestPage: pages of 10 questions, answers flushed 5 at a time
+        for start in range(0, session["total_questions"], 10):
+            response = await recorder.call(client, "GET /api/tests/{session_id}/questions", "GET",
+                                           f"/api/tests/{session_id}/questions?start={start}&count=10", headers=headers)
+            answers = [{"question_id": item["question"]["id"], "selected_option": random.randint(0, 3)}
+                       for item in response.json()["questions"]]
+            for batch_start in range(0, len(answers), 5):
+                await recorder.call(client, "POST /api/tests/{session_id}/answers", "POST",
+                                    f"/api/tests/{session_id}/answers", headers=headers,
+                                    json={"answers": answers[batch_start:batch_start + 5]})
+    await recorder.call(client, "POST /api/tests/{session_id}/complete", "POST",
+                        f"/api/tests/{session_id}/complete", headers=headers)
+    # ResultPage, then the browser revalidating its cached copy
+    response = await recorder.call(client, "GET /api/tests/{session_id}/result", "GET",
+                                   f"/api/tests/{session_id}/result", headers=headers)
+    await recorder.call(client, "GET /api/tests/{session_id}/result (304)", "GET",
+                        f"/api/tests/{session_id}/result", expected=304,
+                        headers={**headers, "If-None-Match": response.headers["etag"]})
+    await recorder.call(client, "GET /api/leaderboard", "GET", "/api/leaderboard", headers=headers)
+    await recorder.call(client, "GET /api/users/{user_id}/profile", "GET", f"/api/users/{user_id}/profile", headers=headers)
+
+
+def print_report(report, baseline=None, tolerance=0.2):
+    """Table of the run; with a baseline, % change per metric. Returns regressions."""
+    regressions = []
+    print(f"{'endpoint':<56} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mongo':>6} {'KiB':>8}")
+    for name, row in report.items():
+        cells = [f"{'-' if row[key] is None else row[key]:>{width}}" for key, width in METRIC_KEYS.items()]
+        print(f"{name:<56} {row['count']:>5} " + " ".join(cells))
+        old = (baseline or {}).get(name)
+        if not old:
+            continue
+        changes = []
+        for key in METRIC_KEYS:
+            if row[key] is None or old.get(key) is None:
+                continue
+            if key == "mongo_ops":
+                # latency is noisy, round trips are not: any extra one counts
+                changes.append(f"mongo_ops {old[key]} -> {row[key]}")
+                if row[key] > old[key]:
+                    regressions.append(f"{name}: mongo_ops {old[key]} -> {row[key]}")
+                continue
+            if not old[key]:
+                continue
+            change = (row[key] - old[key]) / old[key]
+            changes.append(f"{key} {change:+.0%}")
+            if key in ("p95_ms", "alloc_kib") and change > tolerance:
+                regressions.append(f"{name}: {key} {old[key]} -> {row[key]}")
+        print(f"{'':<56} vs baseline: " + ", ".join(changes))
+    return regressions
+
+
+async def main(args) -> int:
+    random.seed(args.seed)
+    await server.client.drop_database(os.environ["DB_NAME"])
+    await server.ensure_indexes()
+    started = time.perf_counter()
+    await seed(args.users, args.questions, args.results)
+    print(f"Seeded {args.users} users, {args.questions} questions, {args.results} results "
+          f"in {time.perf_counter() - started:.1f}s\n")
+
+    recorder = Recorder()
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for _ in range(args.warmup):
+                await run_flow(client, recorder, args.answers, args.per_question)
+            recorder.samples.clear()
+            for _ in range(args.flows):
+                await run_flow(client, recorder, args.answers, args.per_question)
+            if args.alloc_flows:
+                recorder.trace_allocations = True
+                tracemalloc.start()
+                for _ in range(args.alloc_flows):
+                    await run_flow(client, recorder, args.answers, args.per_question)
+                tracemalloc.stop()
+    finally:
+        if not args.keep:
+            await server.client.drop_database(os.environ["DB_NAME"])
+
+    report = recorder.report()
+    baseline = None
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())["endpoints"]
+    regressions = print_report(report, baseline, args.tolerance)
+    if args.save:
+        Path(args.save).write_text(json.dumps({
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "json_encoder": "orjson" if server.orjson is not None else "json",
+            "args": {key: value for key, value in vars(args).items() if key not in ("save", "compare")},
+            "endpoints": report,
+        }, indent=2))
+        print(f"\nBaseline saved to {args.save}")
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000, help="seeded users")
+    parser.add_argument("--questions", type=int, default=500, help="seeded questions")
+    parser.add_argument("--results", type=int, default=5000, help="seeded test results")
+    parser.add_argument("--flows", type=int, default=30, help="measured flows")
+    parser.add_argument("--warmup", type=int, default=3, help="flows run before measuring")
+    parser.add_argument("--answers", type=int, default=10, help="questions per test")
+    parser.add_argument("--per-question", action="store_true",
+                        help="old runner: GET question + POST answer per question")
+    parser.add_argument("--alloc-flows", type=int, default=5, help="extra flows traced with tracemalloc (0: skip)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the report as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to diff against; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95/allocation growth")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    args = parser.parse_args()
+    try:
+        sys.exit(asyncio.run(main(args)))
+    finally:
+        server.client.close()
@@ -0,0 +1,111 @@
+"""Round trips per test completion: per-question find_one loop vs hydrate_questions.
+
+Runs against a local mongod in a scratch database (BENCH_DB, default
+bench_hydration; DB_NAME is ignored), whose collections are dropped:
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/hydration_bench.py --questions 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+# never the app database: the bench drops collections in it
+os.environ["DB_NAME"] = os.environ.get("BENCH_DB", "bench_hydration")
+if not os.environ["DB_NAME"].startswith("bench_"):
+    sys.exit(f"BENCH_DB must start with bench_ (got {os.environ['DB_NAME']!r})")
+
+import server  # noqa: E402
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name not in ("hello", "isMaster", "ping", "endSessions"):
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def legacy_completion(question_ids):
+    """What complete_test did before: one find_one per session question."""
+    found = 0
+    for qid in question_ids:
+        try:
+            q_obj_id = ObjectId(qid)
+        except Exception:
+            q_obj_id = qid
+        if await server.db.questions.find_one({"_id": q_obj_id}):
+            found += 1
+    return found
+
+
+async def measure(name, counter, coro_factory, repeat):
+    counter.count = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await coro_factory()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"{name:<28} {counter.count / repeat:>8.1f} round trips  {elapsed * 1000:>8.2f} ms")
+
+
+async def main(args):
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], event_listeners=[counter])
+    server.db = client[os.environ["DB_NAME"]]
+    db = server.db
+    await db.questions.drop()
+    await db.collection_versions.drop()
+
+    docs = [
+        {
+            "id": f"bench-{i}",
+            "category": "bench",
+            "question_text": f"Benchmark sualı {i}",
+            "options": ["A", "B", "C", "D"],
+            "correct_answer": i % 4,
+            "explanation": "",
+        }
+        for i in range(args.questions)
+    ]
+    result = await db.questions.insert_many(docs)
+    # Sessions store str(_id); mix in a few string ids like legacy sessions
+    question_ids = [str(_id) for _id in result.inserted_ids]
+    question_ids[::5] = [doc["id"] for doc in docs[::5]]
+
+    print(f"{args.questions} questions per completion, {args.repeat} repetitions\n")
+    await measure("before: find_one per question", counter, lambda: legacy_completion(question_ids), args.repeat)
+
+    server.question_bank = server.QuestionBank(refresh_interval=3600)
+    server.question_bank._version = -1  # bank knows nothing: pure $in path
+    server.question_bank._checked_at = time.monotonic()
+    await measure("after: single $in (cold bank)", counter, lambda: server.hydrate_questions(question_ids), args.repeat)
+
+    server.question_bank = server.QuestionBank(refresh_interval=3600)
+    await server.question_bank.ensure_fresh()
+    await measure("after: warm QuestionBank", counter, lambda: server.hydrate_questions(question_ids), args.repeat)
+
+    await db.questions.drop()
+    await db.collection_versions.drop()
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,116 @@
+"""Response serialization: parse_from_mongo + jsonable_encoder + JSONResponse vs FastJSONResponse.
+
+No database needed; documents are built in memory to look like what the
+endpoints read (a test result with its questions, a leaderboard page):
+
+    python benchmarks/json_bench.py --questions 20 --entries 100
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench_json")
+
+import server  # noqa: E402
+
+
+def test_result_doc(questions: int):
+    now = datetime.now(timezone.utc)
+    return {
+        "_id": ObjectId(),
+        "id": str(uuid.uuid4()),
+        "user_id": str(uuid.uuid4()),
+        "session_id": str(uuid.uuid4()),
+        "total_questions": questions,
+        "correct_answers": questions // 2,
+        "percentage": 50.0,
+        "completed_at": now,
+        "questions_with_answers": [
+            # score_answers() shape
+            {
+                "question": f"Aşağıdakı kodun nəticəsi nədir? print(sum(range({i})))",
+                "options": ["0", "1", "Xəta", "None"],
+                "user_answer": (i + 1) % 4,
+                "correct_answer": i % 4,
+                "is_correct": False,
+                "explanation": "range(n) 0-dan n-1-ə qədər ədədlər verir.",
+                "category": "Python əsasları",
+            }
+            for i in range(questions)
+        ],
+    }
+
+
+def leaderboard_page(entries: int):
+    return [
+        {
+            "rank": i + 1,
+            "user_id": str(uuid.uuid4()),
+            "full_name": f"İstifadəçi {i}",
+            "xp": 10_000 - i * 37,
+            "level": 20 - i // 10,
+            "total_tests": 100 - i // 2,
+            "average_score": 87.5 - i * 0.1,
+            "profile_image": f"/api/images/{uuid.uuid4().hex}?size=sm",
+        }
+        for i in range(entries)
+    ]
+
+
+def before(doc):
+    return JSONResponse(jsonable_encoder(server.parse_from_mongo(doc))).body
+
+
+def after(doc):
+    return server.FastJSONResponse(doc).body
+
+
+def measure(name, doc, repeat):
+    # parse_from_mongo mutates in place; give both sides a fresh copy each run
+    for label, fn in (("before", before), ("after", after)):
+        timer = timeit.Timer(lambda: fn(doc_copy(doc)))
+        elapsed = min(timer.repeat(repeat=5, number=repeat)) / repeat
+        print(f"{name:<22} {label:<7} {elapsed * 1e6:>9.1f} µs")
+
+
+def doc_copy(doc):
+    if isinstance(doc, dict):
+        return {key: doc_copy(value) for key, value in doc.items()}
+    if isinstance(doc, list):
+        return [doc_copy(value) for value in doc]
+    return doc
+
+
+def main(args):
+    encoder = "orjson" if server.orjson is not None else "json (orjson not installed)"
+    print(f"FastJSONResponse encoder: {encoder}, {args.repeat} renders per sample\n")
+    result = test_result_doc(args.questions)
+    # after: endpoints read with {"_id": 0}
+    result_projected = doc_copy(result)
+    result_projected.pop("_id")
+    copy_only = min(timeit.repeat(lambda: doc_copy(result), repeat=5, number=args.repeat)) / args.repeat
+    print(f"{'copy only (baseline)':<22} {'':<7} {copy_only * 1e6:>9.1f} µs")
+    measure(f"test result ({args.questions} q)", result, args.repeat)
+    measure("test result, no _id", result_projected, args.repeat)
+    measure(f"leaderboard ({args.entries})", leaderboard_page(args.entries), args.repeat)
+    # both sides must produce the same JSON
+    assert json.loads(before(doc_copy(result))) == json.loads(after(doc_copy(result_projected)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--entries", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    main(parser.parse_args())
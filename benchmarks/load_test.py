@@ -0,0 +1,360 @@
+"""Virtual students running the exam flow concurrently, with an SLO report per route.
+
+The flow is backend_test.py's (PythonTestPlatformTester: register ->
+tests/start -> answer every question -> complete -> leaderboard -> profile),
+made asynchronous so thousands of students can share one event loop.
+Questions are read in pages and answers sent in batches like the frontend's
+TestPage (--per-question replays the old one-request-per-click runner).
+Students think between clicks, browse a weighted mix of read endpoints
+between exams and start according to a ramp-up profile:
+
+    linear  start evenly over --ramp seconds
+    step    start in --steps equal groups spread over --ramp
+    spike   everyone at once (the exam bell)
+
+Against a running server:
+
+    python benchmarks/load_test.py --base-url http://127.0.0.1:8001/api --users 500 --ramp 60 --duration 300
+
+or let it start uvicorn with N workers first (MONGO_URL/DB_NAME from the environment):
+
+    python benchmarks/load_test.py --start-server --workers 4 --users 2000 --profile spike --duration 120
+
+Exit status is 1 when a route misses --slo-p95-ms or --slo-error-rate.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# same as frontend/src/pages/TestPage.js
+PREFETCH_COUNT = 10
+ANSWER_FLUSH_SIZE = 5
+
+# read endpoints a student opens between exams -> weight
+BROWSE_MIX = {
+    "GET /leaderboard": 4,
+    "GET /users/{user_id}/profile": 2,
+    "GET /gamification/summary": 2,
+    "GET /notifications": 2,
+    "GET /auth/me": 1,
+}
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an unsorted list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def start_offsets(profile: str, users: int, ramp: float, steps: int):
+    """Seconds after the start at which each student begins."""
+    if profile == "spike" or users <= 1:
+        return [0.0] * users
+    if profile == "step":
+        group = math.ceil(users / steps)
+        interval = ramp / max(1, steps - 1) if steps > 1 else 0
+        return [(i // group) * interval for i in range(users)]
+    return [i * ramp / users for i in range(users)]
+
+
+class RouteStats:
+    """Latencies and errors per route template, plus the steady-state window."""
+
+    def __init__(self, steady_from: float):
+        self.steady_from = steady_from
+        self.latencies = {}
+        self.errors = {}
+        self.steady_requests = {}
+        self.completed_exams = 0
+        self.in_flight = 0
+
+    def record(self, route: str, seconds: float, error=None):
+        self.latencies.setdefault(route, []).append(seconds)
+        if error:
+            route_errors = self.errors.setdefault(route, {})
+            route_errors[error] = route_errors.get(error, 0) + 1
+        if time.monotonic() >= self.steady_from:
+            self.steady_requests[route] = self.steady_requests.get(route, 0) + 1
+
+    @property
+    def total(self):
+        return sum(len(values) for values in self.latencies.values())
+
+    @property
+    def total_errors(self):
+        return sum(sum(kinds.values()) for kinds in self.errors.values())
+
+
+class RequestFailed(Exception):
+    pass
+
+
+class VirtualStudent:
+    """One student: PythonTestPlatformTester's flow on an async client."""
+
+    def __init__(self, client: httpx.AsyncClient, stats: RouteStats, args, deadline: float):
+        self.client = client
+        self.stats = stats
+        self.args = args
+        self.deadline = deadline
+        self.token = None
+        self.user_id = None
+
+    async def run_test(self, route: str, method: str, endpoint: str, data=None):
+        """Timed request; raises RequestFailed (after recording it) unless 2xx."""
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, endpoint, json=data, headers=headers)
+        except httpx.HTTPError as exc:
+            self.stats.record(route, time.perf_counter() - started, type(exc).__name__)
+            raise RequestFailed(route) from exc
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            self.stats.record(route, elapsed, f"HTTP {response.status_code}")
+            raise RequestFailed(route)
+        self.stats.record(route, elapsed)
+        return response.json() if response.content else {}
+
+    async def think(self, scale: float = 1.0):
+        if self.args.think_mean > 0:
+            pause = min(random.expovariate(1 / (self.args.think_mean * scale)), self.args.think_mean * scale * 5)
+            await asyncio.sleep(max(0.0, min(pause, self.deadline - time.monotonic())))
+
+    def time_left(self) -> bool:
+        return time.monotonic() < self.deadline
+
+    async def register(self):
+        email = f"load-{uuid.uuid4().hex[:16]}@loadtest.az"
+        response = await self.run_test("POST /auth/register", "POST", "auth/register", {
+            "email": email, "password": "loadtest123", "full_name": "Load Test Student",
+        })
+        self.token = response["access_token"]
+        self.user_id = response["user"]["id"]
+
+    @staticmethod
+    def pick_option(question) -> int:
+        return random.randint(0, len(question.get("options") or [0]) - 1)
+
+    async def answer_per_question(self, session_id: str, total: int):
+        """The old runner: one GET and one POST per question."""
+        for index in range(total):
+            if not self.time_left():
+                return False
+            question = await self.run_test("GET /tests/{session_id}/question/{question_index}", "GET",
+                                           f"tests/{session_id}/question/{index}")
+            await self.think()
+            await self.run_test("POST /tests/{session_id}/answer", "POST", f"tests/{session_id}/answer", {
+                "question_id": question["question"]["id"], "selected_option": self.pick_option(question["question"]),
+            })
+        return True
+
+    async def answer_batched(self, session_id: str, total: int):
+        """TestPage's runner: questions in pages of PREFETCH_COUNT, answers flushed every ANSWER_FLUSH_SIZE."""
+        pending = []
+        for start in range(0, total, PREFETCH_COUNT):
+            page = await self.run_test("GET /tests/{session_id}/questions", "GET",
+                                       f"tests/{session_id}/questions?start={start}&count={PREFETCH_COUNT}")
+            for item in page["questions"]:
+                if not self.time_left():
+                    return False
+                await self.think()
+                pending.append({"question_id": item["question"]["id"], "selected_option": self.pick_option(item["question"])})
+                if len(pending) >= ANSWER_FLUSH_SIZE:
+                    await self.run_test("POST /tests/{session_id}/answers", "POST", f"tests/{session_id}/answers", {"answers": pending})
+                    pending = []
+        if pending:
+            await self.run_test("POST /tests/{session_id}/answers", "POST", f"tests/{session_id}/answers", {"answers": pending})
+        return True
+
+    async def take_exam(self):
+        session = await self.run_test("POST /tests/start", "POST", "tests/start", {"limit": self.args.questions})
+        session_id = session["session_id"]
+        answer = self.answer_per_question if self.args.per_question else self.answer_batched
+        if not await answer(session_id, session["total_questions"]):
+            return
+        await self.run_test("POST /tests/{session_id}/complete", "POST", f"tests/{session_id}/complete")
+        self.stats.completed_exams += 1
+        await self.think(0.5)
+        await self.run_test("GET /tests/{session_id}/result", "GET", f"tests/{session_id}/result")
+
+    async def browse(self):
+        routes = list(BROWSE_MIX)
+        for route in random.choices(routes, weights=[BROWSE_MIX[r] for r in routes], k=self.args.browse):
+            if not self.time_left():
+                return
+            endpoint = route.split(" ", 1)[1].lstrip("/").replace("{user_id}", self.user_id)
+            await self.run_test(route, "GET", endpoint)
+            await self.think(0.5)
+
+    async def run(self, delay: float):
+        await asyncio.sleep(delay)
+        self.stats.in_flight += 1
+        try:
+            while self.time_left() and self.token is None:
+                try:
+                    await self.register()
+                except RequestFailed:
+                    await asyncio.sleep(1)
+            while self.time_left():
+                try:
+                    await self.take_exam()
+                    await self.browse()
+                except RequestFailed:
+                    # a failed step abandons the exam, like a student reloading the page
+                    await self.think()
+        finally:
+            self.stats.in_flight -= 1
+
+
+def slo_report(stats: RouteStats, elapsed: float, steady_seconds: float, args):
+    routes = {}
+    for route, latencies in sorted(stats.latencies.items()):
+        errors = stats.errors.get(route, {})
+        error_count = sum(errors.values())
+        p95_ms = percentile(latencies, 95) * 1000
+        error_rate = error_count / len(latencies)
+        routes[route] = {
+            "requests": len(latencies),
+            "rps": round(len(latencies) / elapsed, 2),
+            "steady_rps": round(stats.steady_requests.get(route, 0) / steady_seconds, 2) if steady_seconds > 0 else None,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(p95_ms, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "max_ms": round(max(latencies) * 1000, 1),
+            "error_rate": round(error_rate, 4),
+            "errors": errors,
+            "slo_ok": p95_ms <= args.slo_p95_ms and error_rate <= args.slo_error_rate,
+        }
+    return {
+        "users": args.users,
+        "profile": args.profile,
+        "workers": args.workers if args.start_server else None,
+        "elapsed_seconds": round(elapsed, 1),
+        "requests": stats.total,
+        "errors": stats.total_errors,
+        "rps": round(stats.total / elapsed, 2) if elapsed else 0,
+        "completed_exams": stats.completed_exams,
+        "slo": {"p95_ms": args.slo_p95_ms, "error_rate": args.slo_error_rate},
+        "routes": routes,
+    }
+
+
+def print_report(report):
+    print(f"\n{report['users']} students ({report['profile']}), {report['elapsed_seconds']}s: "
+          f"{report['requests']} requests, {report['rps']} req/s, {report['completed_exams']} exams completed, "
+          f"{report['errors']} errors")
+    print(f"SLO: p95 <= {report['slo']['p95_ms']} ms, error rate <= {report['slo']['error_rate']:.2%}\n")
+    print(f"{'route':<52} {'n':>7} {'rps':>7} {'steady':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'err%':>6}  SLO")
+    for route, row in report["routes"].items():
+        steady = "-" if row["steady_rps"] is None else row["steady_rps"]
+        print(f"{route:<52} {row['requests']:>7} {row['rps']:>7} {steady:>7} {row['p50_ms']:>8} {row['p95_ms']:>8} "
+              f"{row['p99_ms']:>8} {row['error_rate'] * 100:>6.2f}  {'ok' if row['slo_ok'] else 'MISS'}")
+        for kind, count in sorted(row["errors"].items(), key=lambda item: -item[1]):
+            print(f"{'':<54}{kind}: {count}")
+
+
+def start_server(args):
+    command = [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+               "--port", str(args.port), "--workers", str(args.workers), "--no-access-log"]
+    print(f"Starting: {' '.join(command[1:])}")
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env={**os.environ, "DEBUG_LOG_SAMPLE_RATE": "0"})
+
+
+async def wait_until_ready(base_url: str, timeout: float = 60):
+    started = time.monotonic()
+    async with httpx.AsyncClient(base_url=base_url, timeout=2) as client:
+        while time.monotonic() - started < timeout:
+            try:
+                if (await client.get("leaderboard", params={"limit": 1})).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} did not come up in {timeout:.0f}s")
+
+
+async def progress(stats: RouteStats, started: float, every: float = 10):
+    last_total = 0
+    while True:
+        await asyncio.sleep(every)
+        total = stats.total
+        print(f"[{time.monotonic() - started:>6.0f}s] active {stats.in_flight:>5}  requests {total:>8}  "
+              f"{(total - last_total) / every:>7.1f} req/s  errors {stats.total_errors}  exams {stats.completed_exams}")
+        last_total = total
+
+
+async def main(args) -> int:
+    base_url = args.base_url.rstrip("/") + "/"
+    await wait_until_ready(base_url)
+
+    offsets = start_offsets(args.profile, args.users, args.ramp, args.steps)
+    started = time.monotonic()
+    ramp_end = started + (max(offsets) if offsets else 0)
+    deadline = ramp_end + args.duration
+    stats = RouteStats(steady_from=ramp_end)
+    limits = httpx.Limits(max_connections=args.connections or args.users, max_keepalive_connections=args.connections or args.users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        students = [VirtualStudent(client, stats, args, deadline) for _ in range(args.users)]
+        reporter = asyncio.create_task(progress(stats, started))
+        try:
+            await asyncio.gather(*(student.run(offset) for student, offset in zip(students, offsets)))
+        finally:
+            reporter.cancel()
+    elapsed = time.monotonic() - started
+
+    report = slo_report(stats, elapsed, args.duration, args)
+    print_report(report)
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"\nReport saved to {args.out}")
+    missed = [route for route, row in report["routes"].items() if not row["slo_ok"]]
+    return 1 if missed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", help="API root, e.g. http://127.0.0.1:8001/api (default: the started server)")
+    parser.add_argument("--start-server", action="store_true", help="start uvicorn from backend/ first")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers with --start-server")
+    parser.add_argument("--port", type=int, default=8765, help="port for --start-server")
+    parser.add_argument("--users", type=int, default=200, help="concurrent students")
+    parser.add_argument("--profile", choices=["linear", "step", "spike"], default="linear")
+    parser.add_argument("--ramp", type=float, default=30, help="seconds until every student has started")
+    parser.add_argument("--steps", type=int, default=5, help="groups for --profile step")
+    parser.add_argument("--duration", type=float, default=120, help="seconds of steady load after the ramp")
+    parser.add_argument("--questions", type=int, default=10, help="questions per exam")
+    parser.add_argument("--per-question", action="store_true",
+                        help="old runner: GET question + POST answer per question instead of pages and batches")
+    parser.add_argument("--think-mean", type=float, default=3.0, help="mean think time in seconds (0: none)")
+    parser.add_argument("--browse", type=int, default=3, help="read requests between exams")
+    parser.add_argument("--connections", type=int, default=0, help="HTTP connection pool size (default: one per student)")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--slo-p95-ms", type=float, default=500)
+    parser.add_argument("--slo-error-rate", type=float, default=0.01)
+    parser.add_argument("--out", help="write the report as JSON")
+    args = parser.parse_args()
+    if not args.base_url:
+        if not args.start_server:
+            parser.error("--base-url or --start-server is required")
+        args.base_url = f"http://127.0.0.1:{args.port}/api"
+
+    server_process = start_server(args) if args.start_server else None
+    try:
+        sys.exit(asyncio.run(main(args)))
+    finally:
+        if server_process:
+            server_process.terminate()
+            server_process.wait(timeout=30)
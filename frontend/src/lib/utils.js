@@ -4,3 +4,9 @@ import { twMerge } from "tailwind-merge"
 export function cn(...inputs) {
   return twMerge(clsx(inputs));
 }
+
+// Backend returns image paths like /api/images/<hash>; older data URLs pass through
+export function assetUrl(src) {
+  if (!src || !src.startsWith("/")) return src;
+  return process.env.REACT_APP_BACKEND_URL + src;
+}
@@ -7,6 +7,7 @@ import { Label } from '../components/ui/label';
 import { Textarea } from '../components/ui/textarea';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../components/ui/select';
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogTrigger } from '../components/ui/dialog';
+import { assetUrl } from '../lib/utils';
 import { useAuth } from '../App';
 import { toast } from 'sonner';
 import {
@@ -147,30 +148,35 @@ const AdminPage = () => {
         setStats(statsData);
       }
 
+      // Admin lists are paged; follow X-Next-Cursor until the last page
+      const fetchAllPages = async (path) => {
+        let rows = [];
+        let cursor = null;
+        do {
+          const url = `${API_BASE}${path}?limit=1000${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`;
+          const res = await fetch(url, { headers: { 'Authorization': `Bearer ${token}` } });
+          if (!res.ok) return null;
+          rows = rows.concat(await res.json());
+          cursor = res.headers.get('X-Next-Cursor');
+        } while (cursor);
+        return rows;
+      };
+
       // Fetch users
-      const usersResponse = await fetch(`${API_BASE}/admin/users`, {
-        headers: { 'Authorization': `Bearer ${token}` }
-      });
-      if (usersResponse.ok) {
-        const usersData = await usersResponse.json();
+      const usersData = await fetchAllPages('/admin/users');
+      if (usersData) {
         setUsers(usersData);
       }
 
       // Fetch questions
-      const questionsResponse = await fetch(`${API_BASE}/admin/questions`, {
-        headers: { 'Authorization': `Bearer ${token}` }
-      });
-      if (questionsResponse.ok) {
-        const questionsData = await questionsResponse.json();
+      const questionsData = await fetchAllPages('/admin/questions');
+      if (questionsData) {
         setQuestions(questionsData);
       }
 
       // Fetch question submissions
-      const submissionsResponse = await fetch(`${API_BASE}/admin/question-submissions`, {
-        headers: { 'Authorization': `Bearer ${token}` }
-      });
-      if (submissionsResponse.ok) {
-        const submissionsData = await submissionsResponse.json();
+      const submissionsData = await fetchAllPages('/admin/question-submissions');
+      if (submissionsData) {
         setQuestionSubmissions(submissionsData);
       }
 
@@ -494,7 +500,7 @@ const AdminPage = () => {
                     <div className="flex items-center space-x-4">
                       <div className="w-12 h-12 bg-gray-200 rounded-full overflow-hidden">
                         {user.profile_image ? (
-                          <img src={user.profile_image} alt={user.full_name} className="w-full h-full object-cover" />
+                          <img src={assetUrl(user.profile_image)} alt={user.full_name} className="w-full h-full object-cover" />
                         ) : (
                           <div className="w-full h-full flex items-center justify-center bg-indigo-100">
                             <User className="w-6 h-6 text-indigo-600" />
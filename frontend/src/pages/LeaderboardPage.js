@@ -3,6 +3,7 @@ import { useNavigate, Link } from 'react-router-dom';
 import { Button } from '../components/ui/button';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
 import { Avatar } from '../components/ui/avatar';
+import { assetUrl } from '../lib/utils';
 import { useAuth } from '../App';
 import { toast } from 'sonner';
 import { 
@@ -142,7 +143,7 @@ const LeaderboardPage = () => {
                     }`}>
                       {leaderboard[1].profile_image ? (
                         <img
-                          src={leaderboard[1].profile_image}
+                          src={assetUrl(leaderboard[1].profile_image)}
                           alt={leaderboard[1].full_name}
                           className="w-18 h-18 rounded-full object-cover"
                         />
@@ -172,7 +173,7 @@ const LeaderboardPage = () => {
                     }`}>
                       {leaderboard[0].profile_image ? (
                         <img
-                          src={leaderboard[0].profile_image}
+                          src={assetUrl(leaderboard[0].profile_image)}
                           alt={leaderboard[0].full_name}
                           className="w-22 h-22 rounded-full object-cover"
                         />
@@ -202,7 +203,7 @@ const LeaderboardPage = () => {
                     }`}>
                       {leaderboard[2].profile_image ? (
                         <img
-                          src={leaderboard[2].profile_image}
+                          src={assetUrl(leaderboard[2].profile_image)}
                           alt={leaderboard[2].full_name}
                           className="w-18 h-18 rounded-full object-cover"
                         />
@@ -261,7 +262,7 @@ const LeaderboardPage = () => {
                           }`}>
                             {entry.profile_image ? (
                               <img
-                                src={entry.profile_image}
+                                src={assetUrl(entry.profile_image)}
                                 alt={entry.full_name}
                                 className="w-full h-full object-cover"
                               />
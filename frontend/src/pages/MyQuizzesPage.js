@@ -28,6 +28,8 @@ const MyQuizzesPage = () => {
   const navigate = useNavigate();
   const [quizzes, setQuizzes] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [shareModal, setShareModal] = useState(null);
   const [copied, setCopied] = useState(false);
 
@@ -35,10 +37,13 @@ const MyQuizzesPage = () => {
     fetchMyQuizzes();
   }, []);
 
-  const fetchMyQuizzes = async () => {
+  // Server səhifə-səhifə qaytarır; növbəti səhifənin cursor-u X-Next-Cursor header-indədir
+  const fetchMyQuizzes = async (cursor = null) => {
+    if (cursor) setLoadingMore(true);
     try {
       const token = localStorage.getItem('token');
-      const response = await fetch(`${API_BASE}/user-quizzes/my-quizzes`, {
+      const url = `${API_BASE}/user-quizzes/my-quizzes${cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''}`;
+      const response = await fetch(url, {
         headers: {
           'Authorization': `Bearer ${token}`
         }
@@ -46,13 +51,15 @@ const MyQuizzesPage = () => {
 
       if (response.ok) {
         const data = await response.json();
-        setQuizzes(data);
+        setQuizzes(prev => (cursor ? prev.concat(data) : data));
+        setNextCursor(response.headers.get('X-Next-Cursor'));
       }
     } catch (error) {
       console.error('Error fetching quizzes:', error);
       toast.error('Quizlər yüklənə bilmədi');
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -227,7 +234,7 @@ const MyQuizzesPage = () => {
                           {quiz.is_public ? 'Açıq' : 'Gizli'}
                         </span>
                         <span>•</span>
-                        <span>{quiz.questions?.length || 0} sual</span>
+                        <span>{quiz.question_count ?? quiz.questions?.length ?? 0} sual</span>
                       </div>
                     </div>
                   </div>
@@ -298,6 +305,18 @@ const MyQuizzesPage = () => {
             ))}
           </div>
         )}
+
+        {nextCursor && (
+          <div className="text-center mt-8">
+            <Button
+              onClick={() => fetchMyQuizzes(nextCursor)}
+              disabled={loadingMore}
+              variant="outline"
+            >
+              {loadingMore ? 'Yüklənir...' : 'Daha çox göstər'}
+            </Button>
+          </div>
+        )}
       </div>
 
       {/* Share Modal */}
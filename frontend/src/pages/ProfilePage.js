@@ -3,6 +3,7 @@ import { useParams, useNavigate } from 'react-router-dom';
 import { Button } from '../components/ui/button';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
 import { Avatar } from '../components/ui/avatar';
+import { assetUrl } from '../lib/utils';
 import { useAuth } from '../App';
 import { toast } from 'sonner';
 import { 
@@ -241,7 +242,7 @@ const ProfilePage = () => {
                 <div className={`w-32 h-32 rounded-full overflow-hidden bg-gray-200 shadow-xl ${profile.is_premium ? 'ring-4 ring-yellow-400 ring-offset-4 ring-offset-white animate-pulse' : ''}`}>
                   {profile.profile_image ? (
                     <img
-                      src={profile.profile_image}
+                      src={assetUrl(profile.profile_image)}
                       alt={profile.full_name}
                       className="w-full h-full object-cover"
                     />
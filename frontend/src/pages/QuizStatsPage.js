@@ -24,6 +24,9 @@ const QuizStatsPage = () => {
   const { user } = useAuth();
   const navigate = useNavigate();
   const [stats, setStats] = useState(null);
+  const [attempts, setAttempts] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -42,6 +45,8 @@ const QuizStatsPage = () => {
       if (response.ok) {
         const data = await response.json();
         setStats(data);
+        setAttempts(data.attempts);
+        setNextCursor(response.headers.get('X-Next-Cursor'));
       } else {
         throw new Error('İstatistikalar yüklənə bilmədi');
       }
@@ -53,6 +58,34 @@ const QuizStatsPage = () => {
     }
   };
 
+  // Cavabda yalnız ilk səhifə gəlir; qalanları X-Next-Cursor ilə /attempts-dən
+  const fetchMoreAttempts = async () => {
+    setLoadingMore(true);
+    try {
+      const token = localStorage.getItem('token');
+      const response = await fetch(
+        `${API_BASE}/quiz-stats/${quizId}/attempts?cursor=${encodeURIComponent(nextCursor)}`,
+        {
+          headers: {
+            'Authorization': `Bearer ${token}`
+          }
+        }
+      );
+
+      if (response.ok) {
+        const data = await response.json();
+        setAttempts(prev => prev.concat(data));
+        setNextCursor(response.headers.get('X-Next-Cursor'));
+      } else {
+        throw new Error('Həlledənlər yüklənə bilmədi');
+      }
+    } catch (error) {
+      toast.error(error.message);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const formatDate = (dateString) => {
     return new Date(dateString).toLocaleString('az-AZ');
   };
@@ -115,7 +148,7 @@ const QuizStatsPage = () => {
               <div className="bg-white/60 backdrop-blur-sm p-6 rounded-xl text-center">
                 <Trophy className="w-8 h-8 text-yellow-600 mx-auto mb-2" />
                 <div className="text-2xl font-bold text-gray-800">
-                  {stats.attempts.length > 0 ? Math.max(...stats.attempts.map(a => a.score)) : 0}%
+                  {stats.max_score}%
                 </div>
                 <div className="text-gray-600">Ən yüksək nəticə</div>
               </div>
@@ -128,11 +161,11 @@ const QuizStatsPage = () => {
           <CardHeader>
             <CardTitle className="flex items-center">
               <Clock className="w-6 h-6 mr-3" />
-              Son Həlledənlər ({stats.attempts.length})
+              Son Həlledənlər ({stats.total_attempts})
             </CardTitle>
           </CardHeader>
           <CardContent>
-            {stats.attempts.length === 0 ? (
+            {attempts.length === 0 ? (
               <div className="text-center py-8 text-gray-500">
                 <Users className="w-12 h-12 mx-auto mb-4 text-gray-300" />
                 <p>Hələ heç kim bu quizi həll etməyib</p>
@@ -140,48 +173,58 @@ const QuizStatsPage = () => {
               </div>
             ) : (
               <div className="space-y-4 max-h-[600px] overflow-y-auto">
-                {stats.attempts
-                  .sort((a, b) => new Date(b.completed_at) - new Date(a.completed_at))
-                  .map((attempt, index) => (
-                    <div 
-                      key={attempt.id || index} 
-                      className="bg-white p-4 rounded-lg border border-gray-200 flex items-center justify-between"
-                    >
-                      <div className="flex items-center space-x-4">
-                        <div className="w-10 h-10 bg-indigo-100 rounded-full flex items-center justify-center">
-                          <User className="w-5 h-5 text-indigo-600" />
+                {attempts.map((attempt, index) => (
+                  <div 
+                    key={attempt.id || index} 
+                    className="bg-white p-4 rounded-lg border border-gray-200 flex items-center justify-between"
+                  >
+                    <div className="flex items-center space-x-4">
+                      <div className="w-10 h-10 bg-indigo-100 rounded-full flex items-center justify-center">
+                        <User className="w-5 h-5 text-indigo-600" />
+                      </div>
+                      <div>
+                        <div className="font-medium text-gray-800">
+                          {attempt.solver_name}
                         </div>
-                        <div>
-                          <div className="font-medium text-gray-800">
-                            {attempt.solver_name}
-                          </div>
-                          <div className="text-sm text-gray-500 flex items-center">
-                            <Calendar className="w-4 h-4 mr-1" />
-                            {formatDate(attempt.completed_at)}
-                          </div>
+                        <div className="text-sm text-gray-500 flex items-center">
+                          <Calendar className="w-4 h-4 mr-1" />
+                          {formatDate(attempt.completed_at)}
                         </div>
                       </div>
-                      
-                      <div className="flex items-center space-x-4">
-                        <div className="text-center">
-                          <div className={`text-lg font-bold ${
-                            attempt.score >= 80 ? 'text-green-600' : 
-                            attempt.score >= 60 ? 'text-yellow-600' : 'text-red-600'
-                          }`}>
-                            {attempt.score}%
-                          </div>
-                          <div className="text-xs text-gray-500">
-                            {attempt.correct_answers}/{attempt.total_questions}
-                          </div>
+                    </div>
+                    
+                    <div className="flex items-center space-x-4">
+                      <div className="text-center">
+                        <div className={`text-lg font-bold ${
+                          attempt.score >= 80 ? 'text-green-600' : 
+                          attempt.score >= 60 ? 'text-yellow-600' : 'text-red-600'
+                        }`}>
+                          {attempt.score}%
+                        </div>
+                        <div className="text-xs text-gray-500">
+                          {attempt.correct_answers}/{attempt.total_questions}
                         </div>
-                        
-                        <div className={`w-3 h-3 rounded-full ${
-                          attempt.score >= 80 ? 'bg-green-500' : 
-                          attempt.score >= 60 ? 'bg-yellow-500' : 'bg-red-500'
-                        }`}></div>
                       </div>
+                      
+                      <div className={`w-3 h-3 rounded-full ${
+                        attempt.score >= 80 ? 'bg-green-500' : 
+                        attempt.score >= 60 ? 'bg-yellow-500' : 'bg-red-500'
+                      }`}></div>
                     </div>
-                  ))}
+                  </div>
+                ))}
+
+                {nextCursor && (
+                  <div className="text-center pt-2">
+                    <Button
+                      onClick={fetchMoreAttempts}
+                      disabled={loadingMore}
+                      variant="outline"
+                    >
+                      {loadingMore ? 'Yüklənir...' : 'Daha çox göstər'}
+                    </Button>
+                  </div>
+                )}
               </div>
             )}
           </CardContent>
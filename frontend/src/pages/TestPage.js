@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate, useLocation } from 'react-router-dom';
 import { Button } from '../components/ui/button';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
@@ -17,6 +17,9 @@ import {
 } from 'lucide-react';
 
 const API_BASE = process.env.REACT_APP_BACKEND_URL + '/api';
+// Suallar səhifə-səhifə yüklənir, cavablar toplu göndərilir
+const PREFETCH_COUNT = 10;
+const ANSWER_FLUSH_SIZE = 5;
 
 const TestPage = () => {
   const { sessionId } = useParams();
@@ -33,6 +36,10 @@ const TestPage = () => {
   const [hardLimit, setHardLimit] = useState(null);
   const [timeUp, setTimeUp] = useState(false);
   const [answeredByIndex, setAnsweredByIndex] = useState({});
+  const questionCache = useRef({});    // index -> { question, user_answer }
+  const pendingAnswers = useRef({});   // question_id -> seçilmiş variant (hələ göndərilməyib)
+  const totalQuestions = useRef(null);
+  const prefetching = useRef(false);
 
   useEffect(() => {
     // Read query params for quick modes
@@ -47,9 +54,22 @@ const TestPage = () => {
       const t = parseInt(timeParam, 10);
       if (!isNaN(t) && t > 0) setTotalTimeLeft(t);
     }
+    questionCache.current = {};
     loadQuestion(0);
   }, [sessionId]);
 
+  // Səhifədən çıxanda göndərilməmiş cavablar itməsin
+  useEffect(() => {
+    const handleUnload = () => {
+      flushAnswers({ keepalive: true });
+    };
+    window.addEventListener('beforeunload', handleUnload);
+    return () => {
+      window.removeEventListener('beforeunload', handleUnload);
+      flushAnswers({ keepalive: true });
+    };
+  }, [sessionId]);
+
   // Reset and start 30s timer on question change
   useEffect(() => {
     if (!testData) return;
@@ -87,64 +107,127 @@ const TestPage = () => {
     return () => clearInterval(interval);
   }, [totalTimeLeft, timeUp]);
 
+  const fetchQuestions = async (start) => {
+    const token = localStorage.getItem('token');
+    const response = await fetch(`${API_BASE}/tests/${sessionId}/questions?start=${start}&count=${PREFETCH_COUNT}`, {
+      headers: {
+        'Authorization': `Bearer ${token}`
+      }
+    });
+
+    if (!response.ok) {
+      throw new Error('Sual yüklənə bilmədi');
+    }
+
+    const data = await response.json();
+    totalQuestions.current = data.total_questions;
+    data.questions.forEach((item) => {
+      questionCache.current[item.index] = item;
+    });
+  };
+
+  // Növbəti səhifəni arxa planda yüklə ki, keçid gözləmədən olsun
+  const prefetchAhead = (questionIndex) => {
+    const total = totalQuestions.current || 0;
+    const ahead = Math.min(questionIndex + Math.ceil(PREFETCH_COUNT / 2), total - 1);
+    for (let index = questionIndex + 1; index <= ahead; index++) {
+      if (!questionCache.current[index]) {
+        if (prefetching.current) return;
+        prefetching.current = true;
+        fetchQuestions(index)
+          .catch(() => {})
+          .finally(() => { prefetching.current = false; });
+        return;
+      }
+    }
+  };
+
   const loadQuestion = async (questionIndex) => {
     try {
-      const token = localStorage.getItem('token');
-      const response = await fetch(`${API_BASE}/tests/${sessionId}/question/${questionIndex}`, {
-        headers: {
-          'Authorization': `Bearer ${token}`
-        }
-      });
-
-      if (!response.ok) {
+      if (!questionCache.current[questionIndex]) {
+        await fetchQuestions(questionIndex);
+      }
+      const item = questionCache.current[questionIndex];
+      if (!item || !item.question) {
         throw new Error('Sual yüklənə bilmədi');
       }
 
-      const data = await response.json();
-      setTestData(data);
+      setTestData({
+        session_id: sessionId,
+        total_questions: totalQuestions.current,
+        current_question: questionIndex,
+        question: item.question,
+        user_answer: item.user_answer
+      });
       setCurrentQuestion(questionIndex);
-      setSelectedOption(data.user_answer !== undefined ? data.user_answer : null);
-      if (data.user_answer !== undefined) {
-        setAnsweredByIndex(prev => ({ ...prev, [questionIndex]: data.user_answer }));
+      setSelectedOption(item.user_answer !== undefined ? item.user_answer : null);
+      if (item.user_answer !== undefined) {
+        setAnsweredByIndex(prev => ({ ...prev, [questionIndex]: item.user_answer }));
       }
       setLoading(false);
+      prefetchAhead(questionIndex);
     } catch (error) {
       toast.error(error.message);
       navigate('/dashboard');
     }
   };
 
-  const submitAnswer = async () => {
-    if (selectedOption === null) return;
+  // Gözləyən cavabları bir sorğuda göndər; alınmasa növbəti dəfə yenidən cəhd olunur
+  const flushAnswers = async ({ keepalive = false } = {}) => {
+    const pending = pendingAnswers.current;
+    const questionIds = Object.keys(pending);
+    if (questionIds.length === 0) return true;
+    pendingAnswers.current = {};
 
     try {
       const token = localStorage.getItem('token');
 
-      const response = await fetch(`${API_BASE}/tests/${sessionId}/answer`, {
+      const response = await fetch(`${API_BASE}/tests/${sessionId}/answers`, {
         method: 'POST',
+        keepalive,
         headers: {
           'Authorization': `Bearer ${token}`,
           'Content-Type': 'application/json'
         },
         body: JSON.stringify({
-          question_id: String(testData.question.id || testData.question._id),
-          selected_option: selectedOption
+          answers: questionIds.map((questionId) => ({
+            question_id: questionId,
+            selected_option: pending[questionId]
+          }))
         })
-
       });
 
       if (!response.ok) {
         throw new Error('Server cavabı uğursuz oldu');
       }
+      return true;
+    } catch (error) {
+      // sonradan seçilən cavablar köhnələrini əvəz edir
+      pendingAnswers.current = { ...pending, ...pendingAnswers.current };
+      if (!keepalive) {
+        toast.error('Cavab saxlanıla bilmədi');
+      }
+      return false;
+    }
+  };
+
+  const submitAnswer = async () => {
+    if (selectedOption === null) return;
+
+    const questionId = String(testData.question.id || testData.question._id);
+    pendingAnswers.current[questionId] = selectedOption;
+    if (questionCache.current[currentQuestion]) {
+      questionCache.current[currentQuestion].user_answer = selectedOption;
+    }
 
-      setAnswers(prev => ({
-        ...prev,
-        [testData.question.id || testData.question._id]: selectedOption
-      }));
-      setAnsweredByIndex(prev => ({ ...prev, [currentQuestion]: selectedOption }));
+    setAnswers(prev => ({
+      ...prev,
+      [questionId]: selectedOption
+    }));
+    setAnsweredByIndex(prev => ({ ...prev, [currentQuestion]: selectedOption }));
 
-    } catch (error) {
-      toast.error('Cavab saxlanıla bilmədi');
+    if (Object.keys(pendingAnswers.current).length >= ANSWER_FLUSH_SIZE) {
+      await flushAnswers();
     }
   };
 
@@ -192,6 +275,7 @@ const TestPage = () => {
 
   const handleFinishTest = async () => {
     await submitAnswer();
+    if (!(await flushAnswers())) return;
 
     try {
       const token = localStorage.getItem('token');
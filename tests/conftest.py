@@ -0,0 +1,60 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+# never the app database (backend/.env): tests drop what they create
+os.environ["DB_NAME"] = os.environ.get("TEST_DB", "test_suite")
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+_mongod_up = None
+
+
+async def _ping_mongod():
+    global _mongod_up
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo.errors import PyMongoError
+
+    if _mongod_up is None:
+        probe = AsyncIOMotorClient(os.environ["MONGO_URL"], serverSelectionTimeoutMS=500)
+        try:
+            await probe.admin.command("ping")
+            _mongod_up = True
+        except PyMongoError:
+            _mongod_up = False
+        probe.close()
+    return _mongod_up
+
+
+@pytest.fixture
+async def mongod():
+    """Skip unless a real mongod answers on MONGO_URL (explain, partial indexes)."""
+    if not await _ping_mongod():
+        pytest.skip("no mongod on MONGO_URL")
+
+
+@pytest.fixture
+async def mongo_db():
+    """Scratch database on MONGO_URL; mongomock_motor when no mongod answers,
+    skipped when neither is available."""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    if await _ping_mongod():
+        client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    else:
+        mongomock_motor = pytest.importorskip("mongomock_motor", reason="no mongod on MONGO_URL")
+        client = mongomock_motor.AsyncMongoMockClient()
+    db = client[os.environ["DB_NAME"]]
+    yield db
+    await client.drop_database(os.environ["DB_NAME"])
+    client.close()
@@ -0,0 +1,15 @@
+import importlib
+
+import pytest
+
+import server
+
+
+@pytest.mark.anyio
+async def test_hot_queries_use_an_index(mongod, monkeypatch, capsys):
+    # check_indexes picks its scratch database at import; keep it on the test one
+    monkeypatch.setenv("INDEX_CHECK_DB", server.db.name)
+    check_indexes = importlib.import_module("check_indexes")
+
+    status = await check_indexes.main()
+    assert status == 0, capsys.readouterr().out
@@ -0,0 +1,52 @@
+from server import LeaderboardIndex
+
+
+def _row(user_id, average, tests, seq=1, **fields):
+    return {"user_id": user_id, "average_score": average, "total_tests": tests, "seq": seq, **fields}
+
+
+def _index(*rows):
+    index = LeaderboardIndex()
+    for row in rows:
+        index.apply(row)
+    return index
+
+
+def _ids(rows):
+    return [(rank, row["user_id"]) for rank, row in rows]
+
+
+def test_orders_by_average_then_tests_then_id():
+    index = _index(_row("c", 80, 5), _row("a", 90, 1), _row("b", 80, 7), _row("d", 80, 5))
+    rows, next_key = index.page(None, 10)
+    assert _ids(rows) == [(1, "a"), (2, "b"), (3, "c"), (4, "d")]
+    assert next_key is None
+
+
+def test_pages_continue_after_the_key():
+    index = _index(*[_row(f"u{i}", 100 - i, 1) for i in range(5)])
+    first, next_key = index.page(None, 2)
+    second, next_key = index.page(next_key, 2)
+    third, last_key = index.page(next_key, 2)
+    assert _ids(first + second + third) == [(i + 1, f"u{i}") for i in range(5)]
+    assert last_key is None
+
+
+def test_update_moves_row_and_old_seq_is_ignored():
+    index = _index(_row("a", 50, 1, seq=1), _row("b", 70, 1, seq=2))
+    index.apply(_row("a", 90, 2, seq=3))
+    index.apply(_row("a", 10, 1, seq=2))  # late write of an older version
+
+    assert index.rank("a") == (1, _row("a", 90, 2, seq=3))
+    assert index.rank("b")[0] == 2
+    assert len(index) == 2
+
+
+def test_deleted_and_zero_test_rows_are_not_ranked():
+    index = _index(_row("a", 90, 3), _row("b", 80, 3), _row("c", 70, 0))
+    index.apply(_row("a", 90, 3, seq=2, deleted=True))
+
+    assert _ids(index.page(None, 10)[0]) == [(1, "b")]
+    assert index.rank("a") == (None, None)
+    assert index.rank("c") == (None, None)
+    assert index.rank("unknown") == (None, None)
@@ -0,0 +1,48 @@
+from server import HTTP_LATENCY_BUCKETS, MetricsRegistry, merge_metric_series, render_prometheus
+
+ROUTE = (("method", "GET"), ("route", "/api/leaderboard"), ("status", "200"))
+
+
+def _worker(requests, latencies):
+    registry = MetricsRegistry()
+    registry.inc("http_requests_total", requests, **dict(ROUTE))
+    for seconds in latencies:
+        registry.observe("http_request_duration_seconds", seconds, route="/api/leaderboard")
+    return registry.snapshot()
+
+
+def test_merge_sums_counters_and_buckets():
+    merged = merge_metric_series([_worker(2, [0.003, 0.2]), _worker(3, [0.2, 30.0])])
+
+    assert merged[("http_requests_total", ROUTE)] == 5
+    buckets, total = merged[("http_request_duration_seconds", (("route", "/api/leaderboard"),))]
+    assert sum(buckets) == 4
+    assert buckets[0] == 1  # <= 5ms
+    assert buckets[HTTP_LATENCY_BUCKETS.index(0.25)] == 2
+    assert buckets[-1] == 1  # +Inf
+    assert total == 0.003 + 0.2 + 0.2 + 30.0
+
+
+def test_merge_skips_changed_bucket_layout():
+    old = [{"name": "http_request_duration_seconds", "labels": [["route", "/x"]], "buckets": [1, 2], "sum": 1.0}]
+    new = [{"name": "http_request_duration_seconds", "labels": [["route", "/x"]], "buckets": [1, 0, 0], "sum": 0.5}]
+    assert merge_metric_series([old, new])[("http_request_duration_seconds", (("route", "/x"),))] == [[1, 2], 1.0]
+
+
+def test_render_prometheus_text_format():
+    merged = merge_metric_series([_worker(5, [0.003, 0.2])])
+    merged[("http_requests_total", (("route", 'a"b\\c'),))] = 1.0
+    text = render_prometheus(merged, {"metrics_workers": ("Workers", 2)})
+    lines = text.splitlines()
+
+    assert "# TYPE http_requests_total counter" in lines
+    assert 'http_requests_total{method="GET",route="/api/leaderboard",status="200"} 5' in lines
+    assert 'http_requests_total{route="a\\"b\\\\c"} 1' in lines
+    # buckets are cumulative and end with +Inf == _count
+    assert 'http_request_duration_seconds_bucket{route="/api/leaderboard",le="0.005"} 1' in lines
+    assert 'http_request_duration_seconds_bucket{route="/api/leaderboard",le="0.25"} 2' in lines
+    assert 'http_request_duration_seconds_bucket{route="/api/leaderboard",le="+Inf"} 2' in lines
+    assert 'http_request_duration_seconds_count{route="/api/leaderboard"} 2' in lines
+    assert "http_request_duration_seconds_sum{route=\"/api/leaderboard\"} 0.203" in lines
+    assert lines[-1] == "metrics_workers 2"
+    assert text.endswith("\n")
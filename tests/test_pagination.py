@@ -0,0 +1,52 @@
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from server import _decode_page_cursor, _encode_page_cursor, _keyset_query
+
+
+@pytest.mark.parametrize("value", [
+    datetime(2024, 5, 15, 10, 30, 1, 250000, tzinfo=timezone.utc),
+    ObjectId(),
+    "Zəhra",
+    42,
+    None,
+])
+def test_cursor_round_trip(value):
+    oid = ObjectId()
+    assert _decode_page_cursor(_encode_page_cursor({"_id": oid, "field": value}, "field")) == (value, oid)
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "W10=", "WyJhIiwgIm5vdC1hbi1vaWQiXQ=="])
+def test_bad_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as exc:
+        _decode_page_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+def test_no_cursor_keeps_filters():
+    assert _keyset_query({"is_premium": True}, "created_at", -1, None) == {"is_premium": True}
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("direction", [1, -1])
+@pytest.mark.parametrize("limit", [1, 3])
+async def test_pages_cover_every_row_once(mongo_db, direction, limit):
+    # null, missing and duplicate sort values included
+    docs = [{"n": i, "score": None if i % 4 == 0 else i % 3} for i in range(14)]
+    docs += [{"n": 100 + i} for i in range(3)]
+    await mongo_db.rows.insert_many(docs)
+    sort = [("score", direction), ("_id", direction)]
+
+    seen, cursor = [], None
+    while True:
+        query = _keyset_query({}, "score", direction, cursor)
+        page = await mongo_db.rows.find(query).sort(sort).limit(limit + 1).to_list(limit + 1)
+        seen += [doc["n"] for doc in page[:limit]]
+        if len(page) <= limit:
+            break
+        cursor = _encode_page_cursor(page[limit - 1], "score")
+
+    assert seen == [doc["n"] async for doc in mongo_db.rows.find().sort(sort)]
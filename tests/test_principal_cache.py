@@ -0,0 +1,59 @@
+import pytest
+
+import server
+from server import PrincipalCache, User
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(server.time, "monotonic", clock)
+    return clock
+
+
+def _user(n):
+    return User(id=f"u{n}", email=f"u{n}@example.com", full_name=f"User {n}")
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = PrincipalCache(maxsize=10, ttl=60)
+    cache.put("u1@example.com", _user(1))
+
+    clock.now += 59
+    assert cache.get("u1@example.com").id == "u1"
+    clock.now += 2
+    assert cache.get("u1@example.com") is None
+    assert cache.stats()["size"] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = PrincipalCache(maxsize=2, ttl=60)
+    cache.put("u1@example.com", _user(1))
+    cache.put("u2@example.com", _user(2))
+    cache.get("u1@example.com")  # u2 is now the oldest
+    cache.put("u3@example.com", _user(3))
+
+    assert cache.get("u2@example.com") is None
+    assert cache.get("u1@example.com") is not None
+    assert cache.get("u3@example.com") is not None
+
+
+def test_invalidate_user_by_id(clock):
+    cache = PrincipalCache(maxsize=10, ttl=60)
+    cache.put("u1@example.com", _user(1))
+    cache.put("u2@example.com", _user(2))
+
+    cache.invalidate_user("u1")
+    cache.invalidate_user("unknown")
+
+    assert cache.get("u1@example.com") is None
+    assert cache.get("u2@example.com") is not None
@@ -0,0 +1,33 @@
+from server import score_answers
+
+
+def _question(text, correct):
+    return {
+        "question_text": text, "options": ["a", "b", "c", "d"], "correct_answer": correct,
+        "explanation": "", "category": "c",
+    }
+
+
+def test_scores_against_correct_answer():
+    questions = [_question("q1", 1), _question("q2", 2), _question("q3", 0)]
+    answers = {"id1": 1, "id2": "2", "id3": 3}  # "2": answers stored as strings in old sessions
+
+    scored, correct = score_answers(questions, ["id1", "id2", "id3"], answers)
+
+    assert correct == 2
+    assert [row["is_correct"] for row in scored] == [True, True, False]
+    assert [row["user_answer"] for row in scored] == [1, 2, 3]
+    assert scored[0]["question"] == "q1"
+
+
+def test_unanswered_counts_as_wrong():
+    scored, correct = score_answers([_question("q1", 0)], ["id1"], {})
+    assert correct == 0
+    assert scored[0]["user_answer"] is None
+    assert scored[0]["is_correct"] is False
+
+
+def test_missing_question_is_skipped():
+    scored, correct = score_answers([None, _question("q2", 1)], ["gone", "id2"], {"gone": 0, "id2": 1})
+    assert correct == 1
+    assert [row["question"] for row in scored] == ["q2"]
@@ -0,0 +1,93 @@
+"""apply_test_to_stats (reference rules) against user_stats_pipeline (what
+complete_test runs): same stats from the same user document."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from server import _as_utc, apply_test_to_stats, user_stats_pipeline
+
+# Wednesday; Mongo keeps milliseconds, so none here
+NOW = datetime(2024, 5, 15, 10, 30, tzinfo=timezone.utc)
+MONDAY = datetime(2024, 5, 13, tzinfo=timezone.utc)
+
+STAT_FIELDS = ["total_tests", "xp", "level", "streak_current", "streak_best", "last_active",
+               "activity_day", "activity_day_count", "activity_week", "activity_week_count"]
+
+CASES = {
+    "new user": {},
+    "same day keeps streak": {
+        "total_tests": 3, "average_score": 70.0, "xp": 40, "streak_current": 2, "streak_best": 5,
+        "last_active": NOW - timedelta(hours=2),
+        "activity_day": datetime(2024, 5, 15, tzinfo=timezone.utc), "activity_day_count": 2,
+        "activity_week": MONDAY, "activity_week_count": 4,
+    },
+    "yesterday extends streak": {
+        "total_tests": 1, "average_score": 100.0, "xp": 95, "streak_current": 4, "streak_best": 4,
+        "last_active": NOW - timedelta(days=1),
+        "activity_day": datetime(2024, 5, 14, tzinfo=timezone.utc), "activity_day_count": 3,
+        "activity_week": MONDAY, "activity_week_count": 3,
+    },
+    "gap resets streak and week": {
+        "total_tests": 10, "average_score": 55.5, "xp": 310, "streak_current": 7, "streak_best": 7,
+        "last_active": NOW - timedelta(days=9),
+        "activity_day": datetime(2024, 5, 6, tzinfo=timezone.utc), "activity_day_count": 1,
+        "activity_week": MONDAY - timedelta(days=7), "activity_week_count": 6,
+    },
+    "legacy string last_active": {
+        "total_tests": 2, "average_score": 30.0, "xp": 6, "streak_current": 2,
+        "last_active": "2024-05-14T09:00:00+00:00",
+    },
+}
+
+
+def _normalized(doc):
+    values = {field: doc.get(field) for field in STAT_FIELDS}
+    for field in ("last_active", "activity_day", "activity_week"):
+        values[field] = _as_utc(values[field])
+    return values
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("percentage,correct", [(0, 0), (65, 13), (90, 18)])
+@pytest.mark.parametrize("case", list(CASES))
+async def test_pipeline_matches_reference(mongo_db, case, percentage, correct):
+    stats = CASES[case]
+    expected = apply_test_to_stats(stats, percentage, correct, NOW)
+
+    await mongo_db.users.insert_one({"id": "u", **stats})
+    doc = await mongo_db.users.find_one_and_update(
+        {"id": "u"}, user_stats_pipeline(percentage, correct, NOW), return_document=True,
+    )
+
+    assert _normalized(doc) == _normalized(expected)
+    assert doc["average_score"] == pytest.approx(expected["average_score"])
+
+
+def test_running_average_and_level():
+    stats = {}
+    for percentage, correct in [(100, 20), (50, 10), (75, 15)]:
+        stats = {**stats, **apply_test_to_stats(stats, percentage, correct, NOW)}
+    assert stats["total_tests"] == 3
+    assert stats["average_score"] == pytest.approx(75.0)
+    # 20+10 bonus, 10, 15+5 bonus
+    assert stats["xp"] == 60
+    assert stats["level"] == 1
+    assert stats["activity_day_count"] == 3
+
+
+def test_day_and_week_rollover():
+    stats = apply_test_to_stats({}, 80, 8, NOW)
+    next_day = apply_test_to_stats(stats, 80, 8, NOW + timedelta(days=1))
+    assert next_day["streak_current"] == 2
+    assert next_day["activity_day_count"] == 1
+    assert next_day["activity_week_count"] == 2
+
+    # Sunday -> Monday: new week, counters restart
+    sunday = datetime(2024, 5, 19, 23, 0, tzinfo=timezone.utc)
+    stats = apply_test_to_stats(stats, 80, 8, sunday)
+    monday = apply_test_to_stats(stats, 80, 8, sunday + timedelta(hours=2))
+    assert monday["activity_week"] == datetime(2024, 5, 20, tzinfo=timezone.utc)
+    assert monday["activity_week_count"] == 1
+    # Wednesday -> Sunday broke the streak, Sunday -> Monday continues it
+    assert stats["streak_current"] == 1
+    assert monday["streak_current"] == 2